@@ -1,56 +1,224 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials, HTTPBearer
 from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select, update
 
 from .config import get_settings
+from .database import engine
+from .models import AdminAccount
 
-security = HTTPBasic()
+security = HTTPBasic(auto_error=False)
+bearer = HTTPBearer(auto_error=False)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 class AdminUser:
-    def __init__(self, username: str, password_hash: str, must_reset: bool):
+    def __init__(self, username: str, password_hash: str, must_reset: bool, version: int = 0):
         self.username = username
         self.password_hash = password_hash
         self.must_reset = must_reset
+        self.version = version
+
+
+class VerifiedCredentialCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(username: str, password: str, password_hash: str) -> bytes:
+        # The stored hash is part of the key so a password change orphans every old entry.
+        return hashlib.sha256(f"{username}\0{password}\0{password_hash}".encode()).digest()
+
+    def hit(self, username: str, password: str, password_hash: str) -> bool:
+        key = self._key(username, password, password_hash)
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if expires <= now:
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, username: str, password: str, password_hash: str) -> None:
+        key = self._key(username, password, password_hash)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
 
 
 _admin_cache: Optional[AdminUser] = None
+_admin_checked_at = 0.0
+_credential_cache = VerifiedCredentialCache(get_settings().auth_cache_size, get_settings().auth_cache_ttl_seconds)
 
 
-def get_admin_user() -> AdminUser:
-    global _admin_cache
+def _bootstrap_admin(db: Session) -> AdminAccount:
     settings = get_settings()
-    if _admin_cache:
-        return _admin_cache
-    _admin_cache = AdminUser(
+    account = AdminAccount(
+        id=1,
         username=settings.admin_username,
         password_hash=pwd_context.hash(settings.admin_password),
         must_reset=True,
     )
+    db.add(account)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker bootstrapped the row first; use theirs.
+        db.rollback()
+        return db.get(AdminAccount, 1)
+    db.refresh(account)
+    return account
+
+
+def get_admin_user() -> AdminUser:
+    global _admin_cache, _admin_checked_at
+    settings = get_settings()
+    now = time.monotonic()
+    if _admin_cache and now - _admin_checked_at < settings.auth_admin_refresh_seconds:
+        return _admin_cache
+    with Session(engine) as db:
+        version = db.exec(select(AdminAccount.version).where(AdminAccount.id == 1)).first()
+        if _admin_cache and version == _admin_cache.version:
+            _admin_checked_at = now
+            return _admin_cache
+        account = db.get(AdminAccount, 1) if version is not None else _bootstrap_admin(db)
+        _admin_cache = AdminUser(
+            username=account.username,
+            password_hash=account.password_hash,
+            must_reset=account.must_reset,
+            version=account.version,
+        )
+    _admin_checked_at = now
     return _admin_cache
 
 
-def authenticate(credentials: HTTPBasicCredentials = Depends(security)) -> AdminUser:
+@lru_cache()
+def token_secret() -> str:
+    # Without AUTH_TOKEN_SECRET a random secret is generated once and kept under DATA_DIR, so
+    # every worker signs with the same key and database access alone cannot mint tokens.
+    settings = get_settings()
+    if settings.auth_token_secret:
+        return settings.auth_token_secret
+    path = Path(settings.data_dir) / "secrets" / "auth_token_secret"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        staged = path.with_name(f"{path.name}.{os.getpid()}")
+        with os.fdopen(os.open(staged, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as fh:
+            fh.write(secrets.token_urlsafe(48))
+        try:
+            # Linking is atomic and fails if the file exists: the first worker's secret wins.
+            os.link(staged, path)
+        except FileExistsError:
+            pass
+        finally:
+            staged.unlink()
+    secret = path.read_text().strip()
+    if not secret:
+        raise RuntimeError(f"{path} is empty; remove it or set AUTH_TOKEN_SECRET")
+    return secret
+
+
+def _token_key(admin: AdminUser) -> bytes:
+    # Tokens are signed with a key derived from the current password hash, so changing
+    # the password revokes every token issued before it.
+    secret = token_secret()
+    return hashlib.sha256(f"{secret}\0{admin.password_hash}".encode()).digest()
+
+
+def _sign(admin: AdminUser, payload: str) -> str:
+    digest = hmac.new(_token_key(admin), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def issue_token(admin: AdminUser) -> dict:
+    expires = int(time.time()) + get_settings().auth_token_ttl_seconds
+    payload = f"{expires}.{secrets.token_urlsafe(16)}"
+    return {
+        "access_token": f"{payload}.{_sign(admin, payload)}",
+        "token_type": "bearer",
+        "expires_at": datetime.utcfromtimestamp(expires),
+    }
+
+
+def verify_token(admin: AdminUser, token: str) -> bool:
+    payload, _, signature = token.rpartition(".")
+    expires, _, _nonce = payload.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign(admin, payload))
+
+
+def verify_credentials(admin: AdminUser, username: str, password: str) -> bool:
+    if not hmac.compare_digest(username.encode(), admin.username.encode()):
+        return False
+    if _credential_cache.hit(username, password, admin.password_hash):
+        return True
+    if not pwd_context.verify(password, admin.password_hash):
+        return False
+    _credential_cache.add(username, password, admin.password_hash)
+    return True
+
+
+def authenticate(
+    credentials: Optional[HTTPBasicCredentials] = Depends(security),
+    token: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+) -> AdminUser:
     admin = get_admin_user()
-    correct_username = credentials.username == admin.username
-    correct_password = pwd_context.verify(credentials.password, admin.password_hash)
-    if not (correct_username and correct_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid credentials",
-            headers={"WWW-Authenticate": "Basic"},
-        )
-    return admin
+    if token and verify_token(admin, token.credentials):
+        return admin
+    if credentials and verify_credentials(admin, credentials.username, credentials.password):
+        return admin
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid credentials",
+        headers={"WWW-Authenticate": "Basic"},
+    )
 
 
 def update_password(new_password: str) -> None:
-    admin = get_admin_user()
-    admin.password_hash = pwd_context.hash(new_password)
-    admin.must_reset = False
+    global _admin_checked_at
+    get_admin_user()
+    with Session(engine) as db:
+        db.execute(
+            update(AdminAccount)
+            .where(AdminAccount.id == 1)
+            .values(
+                password_hash=pwd_context.hash(new_password),
+                must_reset=False,
+                version=AdminAccount.version + 1,
+                updated_at=datetime.utcnow(),
+            )
+        )
+        db.commit()
+    _credential_cache.clear()
+    _admin_checked_at = 0.0
+    get_admin_user()
 
 
 def require_password_reset(admin: AdminUser = Depends(authenticate)) -> AdminUser:
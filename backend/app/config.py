@@ -8,9 +8,48 @@ class Settings(BaseSettings):
     database_url: str = "postgresql+psycopg2://zenstream:zenstream@db:5432/zenstream"
     admin_username: str = "admin"
     admin_password: str = "changeme"
+    auth_token_secret: str = ""
+    auth_token_ttl_seconds: int = 12 * 3600
+    auth_cache_size: int = 256
+    auth_cache_ttl_seconds: int = 300
+    auth_admin_refresh_seconds: int = 5
     data_dir: str = "/data"
     safety_cap_default: bool = True
     runner_heartbeat_seconds: int = 30
+    runner_notify_poll_seconds: float = 1.0
+    runner_materialize_batch: int = 500
+    runner_capacity: int = 0
+    runner_capabilities: str = "copy,audio_transcode,full_transcode"
+    runner_lease_seconds: int = 6
+    runner_stop_grace_seconds: int = 5
+    runner_restart_backoff_seconds: int = 5
+    ffmpeg_path: str = "ffmpeg"
+    ffprobe_path: str = "ffprobe"
+    probe_workers: int = 0
+    probe_queue_size: int = 64
+    probe_timeout_seconds: int = 120
+    runner_maintenance_seconds: int = 3600
+    metrics_ring_size: int = 600
+    metrics_bucket_seconds: int = 10
+    metrics_retention_days: int = 90
+    log_segment_bytes: int = 16 * 1024 * 1024
+    log_keep_segments: int = 64
+    rendition_cache_bytes: int = 50 * 1024**3
+    rendition_crossfade_seconds: float = 2.0
+    rendition_build_concurrency: int = 1
+    upload_expiry_hours: int = 72
+    event_buffer_size: int = 10000
+    event_batch_size: int = 1000
+    event_flush_seconds: float = 1.0
+    event_debug_sample_rate: float = 0.1
+    history_retention_days: int = 0
+    history_archive_batch: int = 5000
+    stream_poll_seconds: float = 1.0
+    stream_client_queue: int = 1000
+    stream_keepalive_seconds: float = 15.0
+    license_cache_seconds: int = 60
+    license_renew_seconds: int = 300
+    license_renew_margin_seconds: int = 900
     license_endpoint: str = "https://example.com/activation"
 
     class Config:
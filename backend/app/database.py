@@ -1,22 +1,53 @@
 from contextlib import asynccontextmanager
+from pathlib import Path
 
-from sqlmodel import SQLModel, create_engine
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine
 
 from .config import get_settings
 
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(dialect, scheme)}{sep}{rest}"
+
+
 settings = get_settings()
 engine = create_engine(settings.database_url, pool_pre_ping=True)
+async_engine = create_async_engine(async_database_url(settings.database_url), pool_pre_ping=True)
 
 
-def init_db() -> None:
-    SQLModel.metadata.create_all(engine)
+def check_schema() -> None:
+    # Migrations run out of band (`alembic upgrade head`); API and runner only confirm the revision.
+    head = ScriptDirectory(str(MIGRATIONS_DIR)).get_current_head()
+    with engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+    if current != head:
+        raise RuntimeError(
+            f"Database schema is at revision {current or 'none'} but this build expects {head}; "
+            "run `alembic upgrade head` from the backend directory"
+        )
 
 
 def get_engine():
     return engine
 
 
+def get_async_engine():
+    return async_engine
+
+
 @asynccontextmanager
 async def lifespan(app):
-    init_db()
+    check_schema()
     yield
+    await async_engine.dispose()
@@ -1,12 +1,16 @@
-from contextlib import contextmanager
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from .database import engine
+from .database import async_engine, engine
 
 
-@contextmanager
 def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
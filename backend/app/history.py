@@ -0,0 +1,107 @@
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from .config import get_settings
+from .models import JobDailyRollup
+
+# Sessions in these states never change again and can leave the hot table.
+ARCHIVED_STATES = ("stopped", "failed")
+RESTART_CODE = "ffmpeg_restart"
+
+
+@dataclass
+class DayTally:
+    sessions: int = 0
+    uptime_s: int = 0
+    restarts: int = 0
+    errors: Counter = field(default_factory=Counter)
+
+    def add(self, other: "DayTally") -> "DayTally":
+        self.sessions += other.sessions
+        self.uptime_s += other.uptime_s
+        self.restarts += other.restarts
+        self.errors.update(other.errors)
+        return self
+
+
+Tallies = Dict[Tuple[int, date], DayTally]
+
+
+def new_tallies() -> Tallies:
+    return defaultdict(DayTally)
+
+
+def session_day(row) -> date:
+    return (row.actual_start_at or row.planned_start_at).date()
+
+
+def tally_sessions(tallies: Tallies, rows: Iterable, now: Optional[datetime] = None) -> None:
+    # Uptime is credited to the day the session started; running sessions count up to `now`.
+    for row in rows:
+        tally = tallies[(row.job_id, session_day(row))]
+        tally.sessions += 1
+        end = row.actual_end_at or (now if row.state not in ARCHIVED_STATES else None)
+        if row.actual_start_at and end:
+            tally.uptime_s += max(0, int((end - row.actual_start_at).total_seconds()))
+
+
+def tally_events(tallies: Tallies, rows: Iterable) -> None:
+    for row in rows:
+        if row.code == RESTART_CODE:
+            tallies[(row.job_id, row.ts.date())].restarts += 1
+        elif row.level == "error":
+            tallies[(row.job_id, row.ts.date())].errors[row.code] += 1
+
+
+def merge_rollup(rollup: Optional[JobDailyRollup], job_id: int, day: date, tally: DayTally) -> JobDailyRollup:
+    rollup = rollup or JobDailyRollup(job_id=job_id, day=day)
+    counts = Counter(json.loads(rollup.error_counts_json or "{}"))
+    counts.update(tally.errors)
+    rollup.sessions += tally.sessions
+    rollup.uptime_s += tally.uptime_s
+    rollup.restarts += tally.restarts
+    rollup.errors = sum(counts.values())
+    rollup.error_counts_json = json.dumps(dict(counts), sort_keys=True) if counts else None
+    rollup.updated_at = datetime.utcnow()
+    return rollup
+
+
+def report_day(day: date, tally: DayTally) -> Dict:
+    return {
+        "day": day,
+        "sessions": tally.sessions,
+        "uptime_s": tally.uptime_s,
+        "restarts": tally.restarts,
+        "errors": sum(tally.errors.values()),
+        "error_counts": dict(tally.errors),
+    }
+
+
+def rollup_tally(rollup: JobDailyRollup) -> DayTally:
+    errors = Counter(json.loads(rollup.error_counts_json or "{}"))
+    return DayTally(rollup.sessions, rollup.uptime_s, rollup.restarts, errors)
+
+
+def archive_path(table: str, day: date) -> Path:
+    return Path(get_settings().data_dir) / "archive" / table / f"{day.isoformat()}.ndjson.gz"
+
+
+def write_archive(table: str, rows: List[Dict], day_of: Callable[[Dict], date]) -> None:
+    # One gzip member is appended per batch; gzip readers stream concatenated members as one file.
+    by_day: Dict[date, List[Dict]] = defaultdict(list)
+    for row in rows:
+        by_day[day_of(row)].append(row)
+    for day, day_rows in by_day.items():
+        path = archive_path(table, day)
+        os.makedirs(path.parent, exist_ok=True)
+        with gzip.open(path, "at", encoding="utf-8") as fh:
+            for row in day_rows:
+                fh.write(json.dumps(jsonable_encoder(row), separators=(",", ":")) + "\n")
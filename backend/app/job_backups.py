@@ -0,0 +1,146 @@
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import Text, bindparam, case, func, insert, literal, or_, true, update
+from sqlmodel import Session, select
+
+from .models import Job, JobBackup, JobBase
+from .pipeline import preload_references
+
+BACKUP_CHUNK = 1000
+# Job fields a downgrade to Basic resets.
+BASIC_VALUES = {
+    "tier_required": "Basic",
+    "audio_mode": "none",
+    "auto_recovery": False,
+    "hot_swap_mode": "immediate",
+    "scenes_enabled": False,
+    "swap_rules_json": None,
+    "scene_overrides_json": None,
+}
+
+
+class JobSnapshot(JobBase):
+    # Validates a backup (table models skip validation); ids and timestamps in it are ignored.
+    pipeline: Optional[str] = None
+    pipeline_reason: Optional[str] = None
+    cpu_cost_estimate: Optional[float] = None
+
+
+RESTORED_FIELDS = [name for name in JobSnapshot.model_fields if name not in ("status", "invalid_reasons")]
+
+
+def job_json(session: Session):
+    # The row as a JSON object, built by the database so backups need no round trip through Python.
+    table = Job.__table__
+    pairs = [arg for column in table.columns for arg in (literal(column.name), column)]
+    if session.get_bind().dialect.name == "postgresql":
+        return func.json_build_object(*pairs).cast(Text)
+    return func.json_object(*pairs)
+
+
+def downgrade_jobs(session: Session, reason: str) -> int:
+    # Chunks of jobs are backed up with one INSERT ... SELECT and reset with one UPDATE, each chunk
+    # committed on its own so no lock is held for the whole install.
+    table = Job.__table__
+    now, last_id, downgraded = datetime.utcnow(), 0, 0
+    while True:
+        ids = session.exec(
+            select(table.c.id)
+            .where(table.c.tier_required != "Basic", table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BACKUP_CHUNK)
+        ).all()
+        if not ids:
+            return downgraded
+        chosen = table.c.id.in_(ids)
+        session.execute(
+            insert(JobBackup.__table__).from_select(
+                ["job_id", "previous_tier", "backup_json", "created_at", "disabled_copy"],
+                select(table.c.id, table.c.tier_required, job_json(session), literal(now), true()).where(chosen),
+            )
+        )
+        session.execute(
+            update(table)
+            .where(chosen)
+            .values(
+                **BASIC_VALUES,
+                status="invalid",
+                invalid_reasons=case(
+                    (or_(table.c.invalid_reasons.is_(None), table.c.invalid_reasons == ""), reason),
+                    else_=table.c.invalid_reasons + f"; {reason}",
+                ),
+                updated_at=now,
+            )
+        )
+        session.commit()
+        downgraded += len(ids)
+        last_id = ids[-1]
+
+
+def restore_values(backup_json: str) -> dict:
+    snapshot = JobSnapshot.model_validate_json(backup_json)
+    return {name: getattr(snapshot, name) for name in RESTORED_FIELDS}
+
+
+def restore_jobs(
+    session: Session,
+    validate: Callable[[JobSnapshot, Session], List[str]],
+    job_ids: Optional[List[int]] = None,
+    since: Optional[datetime] = None,
+) -> int:
+    # Each job goes back to its newest backup (taken at or after `since`), a chunk per statement.
+    # `validate` re-checks every restored job against the current license, so a backup of a higher
+    # tier comes back invalid until the install is licensed for it again.
+    backups = JobBackup.__table__
+    table = Job.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("_id"))
+        .values(
+            {
+                **{name: bindparam(f"_{name}") for name in RESTORED_FIELDS},
+                "status": bindparam("_status"),
+                "invalid_reasons": bindparam("_invalid_reasons"),
+                "updated_at": bindparam("_now"),
+            }
+        )
+    )
+    last_id, restored = 0, 0
+    while True:
+        newest = select(backups.c.job_id, func.max(backups.c.id)).where(backups.c.job_id > last_id)
+        if job_ids is not None:
+            newest = newest.where(backups.c.job_id.in_(job_ids))
+        if since is not None:
+            newest = newest.where(backups.c.created_at >= since)
+        chunk = session.exec(newest.group_by(backups.c.job_id).order_by(backups.c.job_id).limit(BACKUP_CHUNK)).all()
+        if not chunk:
+            return restored
+        last_id = chunk[-1][0]
+        # Backups of jobs deleted since are skipped.
+        rows = session.exec(
+            select(JobBackup.job_id, JobBackup.backup_json)
+            .join(Job, Job.id == JobBackup.job_id)
+            .where(JobBackup.id.in_([row[1] for row in chunk]))
+        ).all()
+        if not rows:
+            continue
+        now = datetime.utcnow()
+        snapshots = [(job_id, JobSnapshot.model_validate_json(backup_json)) for job_id, backup_json in rows]
+        loaded = preload_references(session, [snapshot for _, snapshot in snapshots])
+        params = []
+        for job_id, snapshot in snapshots:
+            reasons = validate(snapshot, session)
+            params.append(
+                {
+                    "_id": job_id,
+                    "_now": now,
+                    "_status": "invalid" if reasons else "valid",
+                    "_invalid_reasons": ", ".join(reasons) if reasons else None,
+                    **{f"_{name}": getattr(snapshot, name) for name in RESTORED_FIELDS},
+                }
+            )
+        session.execute(statement, params)
+        session.commit()
+        restored += len(rows)
+        del loaded
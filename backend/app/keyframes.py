@@ -0,0 +1,69 @@
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Iterable, List, Optional, Tuple
+
+from .models import Asset, KeyframeIndex
+
+# Stored little-endian so every runner reads the same bytes the same way.
+TIME_TYPE = "d"
+OFFSET_TYPE = "q"
+
+
+def _pack(typecode: str, values: Iterable) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def parse_packets(text: str) -> List[Tuple[float, int]]:
+    # ffprobe -show_entries packet=pts_time,pos,flags -of csv=p=0: "12.345000,98765,K__"
+    keyframes = []
+    for line in text.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 3 or "K" not in parts[2]:
+            continue
+        try:
+            keyframes.append((float(parts[0]), int(parts[1])))
+        except ValueError:
+            continue
+    return sorted(keyframes)
+
+
+def build_index(asset_id: int, asset_hash: Optional[str], keyframes: List[Tuple[float, int]]) -> KeyframeIndex:
+    return KeyframeIndex(
+        asset_id=asset_id,
+        asset_hash=asset_hash,
+        count=len(keyframes),
+        times=_pack(TIME_TYPE, (time for time, _ in keyframes)),
+        offsets=_pack(OFFSET_TYPE, (offset for _, offset in keyframes)),
+    )
+
+
+class Keyframes:
+    def __init__(self, index: KeyframeIndex):
+        self.times = _unpack(TIME_TYPE, index.times)
+        self.offsets = _unpack(OFFSET_TYPE, index.offsets)
+
+    def at_or_before(self, position: float) -> Tuple[float, int]:
+        # The keyframe FFmpeg can start from without decoding anything before `position`.
+        if not self.times:
+            return 0.0, 0
+        idx = max(0, bisect_right(self.times, position) - 1)
+        return self.times[idx], self.offsets[idx]
+
+
+def usable_keyframes(index: Optional[KeyframeIndex], asset: Asset) -> Optional[Keyframes]:
+    # An index built from other content (the asset hash changed since) is ignored until re-probed.
+    if index is None or not index.count or index.asset_hash != asset.hash:
+        return None
+    return Keyframes(index)
@@ -0,0 +1,239 @@
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .config import get_settings
+from .database import async_engine
+from .job_backups import downgrade_jobs
+from .models import LicenseActivity, LicenseState, LicenseTierCount, MemberLicense
+
+TIERS = ("Basic", "Premium", "Ultimate")
+SWEEP_BATCH = 1000
+LEASE_DURATION = timedelta(hours=1)
+# Without a successful check for this long the install enters grace, and drops to Basic after it.
+OFFLINE_TOLERANCE = timedelta(minutes=30)
+GRACE_PERIOD = timedelta(hours=6)
+
+settings = get_settings()
+
+
+def tier_covers(licensed: str, required: str) -> bool:
+    rank = {tier: index for index, tier in enumerate(TIERS)}
+    return rank.get(licensed, 0) >= rank.get(required, 0)
+
+
+@dataclass(frozen=True)
+class LeaseView:
+    tier: str = "Basic"
+    lease_expires_at: Optional[datetime] = None
+    last_check_at: Optional[datetime] = None
+    grace_started_at: Optional[datetime] = None
+    member_expires_at: Optional[datetime] = None
+
+    @classmethod
+    def of(cls, state: Optional[LicenseState], member: Optional[MemberLicense] = None) -> "LeaseView":
+        if state is None:
+            return cls()
+        tier = state.activated_tier if member is None or member.active else "Basic"
+        expires_at = member.expires_at if member else None
+        return cls(tier, state.lease_expires_at, state.last_check_at, state.grace_started_at, expires_at)
+
+    def effective_tier(self, now: Optional[datetime] = None) -> str:
+        # Applies the outage policy and the member's expiry to the cached copy, so a lapse shows
+        # before anyone writes it back.
+        now = now or datetime.utcnow()
+        if self.last_check_at and now - self.last_check_at > OFFLINE_TOLERANCE + GRACE_PERIOD:
+            return "Basic"
+        if self.member_expires_at and self.member_expires_at <= now:
+            return "Basic"
+        return self.tier
+
+
+class LeaseCache:
+    # Process-local view of the license state for hot paths (job validation, the runner). Entries live
+    # LICENSE_CACHE_SECONDS; writers in this process replace or drop it as soon as they commit.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._view: Optional[LeaseView] = None
+        self._loaded_at = 0.0
+
+    def _fresh(self) -> Optional[LeaseView]:
+        with self._lock:
+            if self._view is not None and time.monotonic() - self._loaded_at < settings.license_cache_seconds:
+                return self._view
+        return None
+
+    def put(self, state: Optional[LicenseState], member: Optional[MemberLicense] = None) -> LeaseView:
+        view = LeaseView.of(state, member)
+        with self._lock:
+            self._view, self._loaded_at = view, time.monotonic()
+        return view
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._view = None
+
+    def view(self, session: Session) -> LeaseView:
+        view = self._fresh()
+        if view is None:
+            state = session.exec(select(LicenseState)).first()
+            view = self.put(state, current_member(session, state) if state else None)
+        return view
+
+    async def view_async(self) -> LeaseView:
+        view = self._fresh()
+        if view is None:
+            async with AsyncSession(async_engine) as db:
+                state = (await db.exec(select(LicenseState))).first()
+                member = None
+                if state:
+                    member = (await db.exec(select(MemberLicense).where(MemberLicense.install_id == state.install_id))).first()
+                view = self.put(state, member)
+        return view
+
+    def tier(self, session: Session) -> str:
+        return self.view(session).effective_tier()
+
+    async def tier_async(self) -> str:
+        return (await self.view_async()).effective_tier()
+
+
+lease_cache = LeaseCache()
+
+
+def record_activity(session: Session, install_id: str, action: str, message: Optional[str] = None) -> None:
+    session.add(LicenseActivity(install_id=install_id, action=action, message=message))
+    session.commit()
+
+
+def current_member(session: Session, state: LicenseState) -> Optional[MemberLicense]:
+    return session.exec(select(MemberLicense).where(MemberLicense.install_id == state.install_id)).first()
+
+
+def enforce_outage_policy(state: LicenseState, session: Session) -> LicenseState:
+    now = datetime.utcnow()
+    member = current_member(session, state)
+    if state.last_check_at is None:
+        lease_cache.put(state, member)
+        return state
+    offline_for = now - state.last_check_at
+    if offline_for > OFFLINE_TOLERANCE and state.grace_started_at is None:
+        state.grace_started_at = state.last_check_at + OFFLINE_TOLERANCE
+    if state.grace_started_at and now - state.grace_started_at > GRACE_PERIOD:
+        if state.activated_tier != "Basic":
+            state.activated_tier = "Basic"
+            state.grace_started_at = None
+            session.add(state)
+            downgrade_jobs(session, "License grace period expired")
+            record_activity(session, state.install_id, "downgraded", "Grace exhausted; restricted to Basic")
+    session.commit()
+    lease_cache.put(state, member)
+    return state
+
+
+def renew_lease(session: Session) -> Optional[LicenseState]:
+    state = session.exec(select(LicenseState)).first()
+    if not state:
+        return None
+    member = current_member(session, state)
+    expired = member and member.expires_at and member.expires_at <= datetime.utcnow()
+    if member and (expired or not member.active):
+        # Repeated renewals of a lapsed license leave it at Basic without downgrading again.
+        if state.activated_tier != "Basic":
+            state.activated_tier = "Basic"
+            session.add(state)
+            if expired:
+                downgrade_jobs(session, "License expired; downgraded to Basic")
+                record_activity(session, state.install_id, "expired", "Premium/Ultimate features removed")
+            else:
+                downgrade_jobs(session, "License revoked; downgraded to Basic")
+                record_activity(session, state.install_id, "downgraded", "License revoked; restricted to Basic")
+    else:
+        state.lease_expires_at = datetime.utcnow() + LEASE_DURATION
+        state.last_check_at = datetime.utcnow()
+        state.grace_started_at = None
+        session.add(state)
+        session.commit()
+        record_activity(session, state.install_id, "renewed", "Lease extended 1h")
+    return enforce_outage_policy(state, session)
+
+
+def renew_if_due(session: Session) -> bool:
+    state = session.exec(select(LicenseState)).first()
+    margin = timedelta(seconds=settings.license_renew_margin_seconds)
+    if not state or (state.lease_expires_at and state.lease_expires_at - datetime.utcnow() > margin):
+        return False
+    renew_lease(session)
+    return True
+
+
+def counted_tier(member: MemberLicense, now: datetime) -> Optional[str]:
+    if member.active and (member.expires_at is None or member.expires_at > now):
+        return member.tier
+    return None
+
+
+def _bump(session: Session, tier: Optional[str], delta: int) -> None:
+    if tier is None or not delta:
+        return
+    # One upsert, so concurrent first issues of a tier cannot both try to insert its row.
+    upsert = postgresql.insert if session.get_bind().dialect.name == "postgresql" else sqlite.insert
+    session.execute(
+        upsert(LicenseTierCount)
+        .values(tier=tier, members=delta)
+        .on_conflict_do_update(index_elements=["tier"], set_={"members": LicenseTierCount.members + delta})
+    )
+
+
+def recount_member(session: Session, member: MemberLicense) -> None:
+    # Call with the member row locked, after changing its tier, active flag or expiry.
+    tier = counted_tier(member, datetime.utcnow())
+    if tier != member.counted_tier:
+        _bump(session, member.counted_tier, -1)
+        _bump(session, tier, 1)
+        member.counted_tier = tier
+        session.add(member)
+
+
+def sweep_expired(session: Session) -> int:
+    # Members drop out of the counts when they expire; the partial index keeps this to the newly expired.
+    now, swept = datetime.utcnow(), 0
+    while True:
+        rows = session.exec(
+            select(MemberLicense.id, MemberLicense.counted_tier)
+            .where(MemberLicense.counted_tier.is_not(None), MemberLicense.expires_at <= now)
+            .limit(SWEEP_BATCH)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            return swept
+        session.execute(update(MemberLicense).where(MemberLicense.id.in_([row.id for row in rows])).values(counted_tier=None))
+        expired: Dict[str, int] = {}
+        for row in rows:
+            expired[row.counted_tier] = expired.get(row.counted_tier, 0) + 1
+        for tier, count in expired.items():
+            _bump(session, tier, -count)
+        swept += len(rows)
+        if len(rows) < SWEEP_BATCH:
+            return swept
+
+
+def tier_counts(session: Session) -> Dict[str, int]:
+    counts = dict.fromkeys(TIERS, 0)
+    counts.update({row.tier: row.members for row in session.exec(select(LicenseTierCount)).all()})
+    # Read-only: members expired since the last sweep are subtracted here rather than swept.
+    expired = session.exec(
+        select(MemberLicense.counted_tier, func.count())
+        .where(MemberLicense.counted_tier.is_not(None), MemberLicense.expires_at <= datetime.utcnow())
+        .group_by(MemberLicense.counted_tier)
+    ).all()
+    for tier, members in expired:
+        counts[tier] -= members
+    return {"total": sum(counts.values()), **counts}
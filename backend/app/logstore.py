@@ -0,0 +1,93 @@
+import gzip
+import os
+import struct
+from bisect import bisect_right
+from pathlib import Path
+from typing import List, Tuple
+
+from .config import get_settings
+
+# Segments are named by the byte offset of their first byte in the session's whole log, so
+# any offset maps to one file without reading the ones before it.
+ACTIVE_SUFFIX = ".log"
+PACKED_SUFFIX = ".log.gz"
+
+
+def session_log_dir(session_id: int) -> Path:
+    return Path(get_settings().data_dir) / "logs" / f"session-{session_id}"
+
+
+def segment_name(offset: int, packed: bool = False) -> str:
+    return f"{offset:016d}{PACKED_SUFFIX if packed else ACTIVE_SUFFIX}"
+
+
+def list_segments(directory: Path) -> List[Tuple[int, Path]]:
+    segments = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        stem, _, suffix = name.partition(".")
+        if not stem.isdigit() or "." + suffix not in (ACTIVE_SUFFIX, PACKED_SUFFIX):
+            continue
+        offset = int(stem)
+        # While a finished segment is being compressed both files exist; the plain one is authoritative.
+        if offset not in segments or name.endswith(ACTIVE_SUFFIX):
+            segments[offset] = directory / name
+    return sorted(segments.items())
+
+
+def segment_size(path: Path) -> int:
+    if path.name.endswith(PACKED_SUFFIX):
+        # The gzip trailer stores the uncompressed length (mod 2**32; segments stay far below that).
+        with open(path, "rb") as fh:
+            fh.seek(-4, os.SEEK_END)
+            return struct.unpack("<I", fh.read(4))[0]
+    return path.stat().st_size
+
+
+def log_extent(segments: List[Tuple[int, Path]]) -> Tuple[int, int]:
+    if not segments:
+        return 0, 0
+    last_offset, last_path = segments[-1]
+    return segments[0][0], last_offset + segment_size(last_path)
+
+
+def _open(path: Path):
+    return gzip.open(path, "rb") if path.name.endswith(PACKED_SUFFIX) else open(path, "rb")
+
+
+def read_range(directory: Path, start: int, length: int) -> Tuple[int, int, bytes]:
+    segments = list_segments(directory)
+    first, end = log_extent(segments)
+    start = min(max(start, first), end)
+    length = max(0, min(length, end - start))
+    offsets = [offset for offset, _ in segments]
+    idx = max(0, bisect_right(offsets, start) - 1)
+    chunks = []
+    position = start
+    remaining = length
+    while remaining > 0 and idx < len(segments):
+        offset, path = segments[idx]
+        try:
+            fh = _open(path)
+        except FileNotFoundError:
+            # Compressed between listing and opening: re-list. A pruned segment ends the read.
+            if path.name.endswith(ACTIVE_SUFFIX):
+                return read_range(directory, start, length)
+            break
+        with fh:
+            # Plain segments seek directly; gzip seeks by streaming, bounded by the segment size.
+            fh.seek(position - offset)
+            data = fh.read(remaining)
+        chunks.append(data)
+        position += len(data)
+        remaining -= len(data)
+        idx += 1
+    return start, end, b"".join(chunks)
+
+
+def read_tail(directory: Path, length: int) -> Tuple[int, int, bytes]:
+    _, end = log_extent(list_segments(directory))
+    return read_range(directory, end - length, length)
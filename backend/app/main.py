@@ -4,7 +4,7 @@ from pathlib import Path
 from fastapi import Depends, FastAPI, HTTPException
 from fastapi.responses import HTMLResponse
 
-from .auth import authenticate, require_password_reset, update_password
+from .auth import authenticate, issue_token, require_password_reset, token_secret, update_password
 from .config import get_settings
 from .database import lifespan
 from .routers import assets, configuration, destinations, jobs, license, presets, schedules, sessions
@@ -12,6 +12,8 @@ from .storage import ensure_data_folders
 
 settings = get_settings()
 ensure_data_folders()
+# Fails here, before serving, if no secret is set and none can be stored under DATA_DIR.
+token_secret()
 app = FastAPI(title=settings.app_name, lifespan=lifespan)
 
 app.include_router(assets.router)
@@ -35,6 +37,11 @@ def change_password(new_password: str, admin=Depends(authenticate)):
     return {"status": "updated"}
 
 
+@app.post("/auth/token")
+def create_token(admin=Depends(require_password_reset)):
+    return issue_token(admin)
+
+
 @app.get("/wizard", response_class=HTMLResponse)
 def wizard():
     html = Path(__file__).parent / "static" / "wizard.html"
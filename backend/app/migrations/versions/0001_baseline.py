@@ -0,0 +1,198 @@
+"""baseline
+
+The schema older builds created with `create_all` on startup. Databases from those builds are
+stamped at this revision and upgraded from here.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 23:57:00.280680
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('asset',
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('size_bytes', sa.Integer(), nullable=False),
+    sa.Column('duration_s', sa.Integer(), nullable=True),
+    sa.Column('video_codec', sa.String(), nullable=True),
+    sa.Column('audio_codec', sa.String(), nullable=True),
+    sa.Column('width', sa.Integer(), nullable=True),
+    sa.Column('height', sa.Integer(), nullable=True),
+    sa.Column('fps', sa.Float(), nullable=True),
+    sa.Column('hash', sa.String(), nullable=True),
+    sa.Column('thumbnail_path', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('destination',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('rtmp_url', sa.String(), nullable=False),
+    sa.Column('stream_key_encrypted', sa.String(), nullable=False),
+    sa.Column('rtmp_mode', sa.String(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('preset',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('mode', sa.String(), nullable=False),
+    sa.Column('video_bitrate', sa.Integer(), nullable=True),
+    sa.Column('audio_bitrate', sa.Integer(), nullable=True),
+    sa.Column('gop', sa.Integer(), nullable=True),
+    sa.Column('preset', sa.String(), nullable=True),
+    sa.Column('profile', sa.String(), nullable=True),
+    sa.Column('tune', sa.String(), nullable=True),
+    sa.Column('scale', sa.String(), nullable=True),
+    sa.Column('fps', sa.Float(), nullable=True),
+    sa.Column('audio_channels', sa.Integer(), nullable=True),
+    sa.Column('audio_rate', sa.Integer(), nullable=True),
+    sa.Column('use_safety_cap', sa.Boolean(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('job',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('tier_required', sa.String(), nullable=False),
+    sa.Column('destination_id', sa.Integer(), nullable=False),
+    sa.Column('video_asset_id', sa.Integer(), nullable=False),
+    sa.Column('loop_enabled', sa.Boolean(), nullable=False),
+    sa.Column('crossfade_enabled', sa.Boolean(), nullable=False),
+    sa.Column('audio_mode', sa.String(), nullable=False),
+    sa.Column('audio_asset_id', sa.Integer(), nullable=True),
+    sa.Column('auto_recovery', sa.Boolean(), nullable=False),
+    sa.Column('hot_swap_mode', sa.String(), nullable=False),
+    sa.Column('scenes_enabled', sa.Boolean(), nullable=False),
+    sa.Column('scene_overrides_json', sa.String(), nullable=True),
+    sa.Column('swap_rules_json', sa.String(), nullable=True),
+    sa.Column('preset_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('invalid_reasons', sa.String(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('schedule',
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('start_at', sa.DateTime(), nullable=False),
+    sa.Column('end_at', sa.DateTime(), nullable=True),
+    sa.Column('duration_s', sa.Integer(), nullable=True),
+    sa.Column('retry_policy_json', sa.String(), nullable=True),
+    sa.Column('enabled', sa.Boolean(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('session',
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('schedule_id', sa.Integer(), nullable=True),
+    sa.Column('trigger', sa.String(), nullable=False),
+    sa.Column('planned_start_at', sa.DateTime(), nullable=True),
+    sa.Column('planned_end_at', sa.DateTime(), nullable=True),
+    sa.Column('actual_start_at', sa.DateTime(), nullable=True),
+    sa.Column('actual_end_at', sa.DateTime(), nullable=True),
+    sa.Column('state', sa.String(), nullable=False),
+    sa.Column('runner_id', sa.String(), nullable=True),
+    sa.Column('ffmpeg_pid', sa.Integer(), nullable=True),
+    sa.Column('last_heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('current_loop_index', sa.Integer(), nullable=True),
+    sa.Column('next_loop_eta_s', sa.Integer(), nullable=True),
+    sa.Column('stop_reason', sa.String(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('event',
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('level', sa.String(), nullable=False),
+    sa.Column('code', sa.String(), nullable=False),
+    sa.Column('message', sa.String(), nullable=False),
+    sa.Column('ts', sa.DateTime(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('ffmpeglog',
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('bytes', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('ended_at', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('licensestate',
+    sa.Column('install_id', sa.String(), nullable=False),
+    sa.Column('install_secret_hash', sa.String(), nullable=False),
+    sa.Column('activated_tier', sa.String(), nullable=False),
+    sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+    sa.Column('last_check_at', sa.DateTime(), nullable=True),
+    sa.Column('grace_started_at', sa.DateTime(), nullable=True),
+    sa.Column('member_license_id', sa.Integer(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('memberlicense',
+    sa.Column('install_id', sa.String(), nullable=False),
+    sa.Column('install_secret_hash', sa.String(), nullable=False),
+    sa.Column('tier', sa.String(), nullable=False),
+    sa.Column('notes', sa.String(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=False),
+    sa.Column('issued_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('last_check_at', sa.DateTime(), nullable=True),
+    sa.Column('grace_started_at', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('licenseactivity',
+    sa.Column('install_id', sa.String(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('message', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('jobbackup',
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('previous_tier', sa.String(), nullable=False),
+    sa.Column('backup_json', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('disabled_copy', sa.Boolean(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('runnerlock',
+    sa.Column('lock_id', sa.Integer(), nullable=False),
+    sa.Column('runner_id', sa.String(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('lock_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('runnerlock')
+    op.drop_table('jobbackup')
+    op.drop_table('licenseactivity')
+    op.drop_table('memberlicense')
+    op.drop_table('licensestate')
+    op.drop_table('ffmpeglog')
+    op.drop_table('event')
+    op.drop_table('session')
+    op.drop_table('schedule')
+    op.drop_table('job')
+    op.drop_table('preset')
+    op.drop_table('destination')
+    op.drop_table('asset')
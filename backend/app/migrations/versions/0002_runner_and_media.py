@@ -0,0 +1,259 @@
+"""runner and media schema
+
+Columns and tables added on top of the baseline before migrations were introduced: admin
+accounts, change notices, runner nodes with fenced session leases, the due-schedule queue and
+recurrences, asset probing, uploads, keyframe indexes, renditions, job pipelines and session
+metrics. Existing sessions start at fencing token 0, existing assets are queued for probing, and
+enabled schedules that never fired get their start time as the next fire time.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:40:12.480512
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('adminaccount',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('password_hash', sa.String(), nullable=False),
+    sa.Column('must_reset', sa.Boolean(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('changenotice',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(), nullable=False),
+    sa.Column('payload', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_changenotice_channel', 'changenotice', ['channel'])
+    op.create_table('mediaprobe',
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('mtime_ns', sa.BigInteger(), nullable=False),
+    sa.Column('result_json', sa.String(), nullable=False),
+    sa.Column('probed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('path')
+    )
+    op.create_table('runnernode',
+    sa.Column('runner_id', sa.String(), nullable=False),
+    sa.Column('capacity', sa.Integer(), nullable=False),
+    sa.Column('capabilities_json', sa.String(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('runner_id')
+    )
+    # Replaced by runnernode and per-session leases.
+    op.drop_table('runnerlock')
+
+    with op.batch_alter_table('asset') as batch_op:
+        batch_op.alter_column('size_bytes', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False)
+        batch_op.add_column(sa.Column('probe_status', sa.String(), nullable=False, server_default='pending'))
+        batch_op.add_column(sa.Column('probe_runner_id', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('probe_error', sa.String(), nullable=True))
+        batch_op.create_index('ix_asset_hash', ['hash'])
+        batch_op.create_index('ix_asset_probe_status', ['probe_status'])
+        batch_op.create_index('ix_asset_status_id', ['status', 'id'])
+        batch_op.create_index('ix_asset_type_id', ['type', 'id'])
+
+    op.create_table('assetupload',
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=False),
+    sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('on_duplicate', sa.String(), nullable=False),
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('received_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('asset_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['asset_id'], ['asset.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('keyframeindex',
+    sa.Column('asset_id', sa.Integer(), nullable=False),
+    sa.Column('asset_hash', sa.String(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('times', sa.LargeBinary(), nullable=False),
+    sa.Column('offsets', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['asset_id'], ['asset.id'], ),
+    sa.PrimaryKeyConstraint('asset_id')
+    )
+    op.create_table('rendition',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cache_key', sa.String(), nullable=False),
+    sa.Column('asset_id', sa.Integer(), nullable=False),
+    sa.Column('preset_id', sa.Integer(), nullable=True),
+    sa.Column('crossfade_s', sa.Float(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('runner_id', sa.String(), nullable=True),
+    sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['asset_id'], ['asset.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_rendition_asset_id', 'rendition', ['asset_id'])
+    op.create_index('ix_rendition_cache_key', 'rendition', ['cache_key'], unique=True)
+    op.create_index('ix_rendition_preset_id', 'rendition', ['preset_id'])
+    op.create_index('ix_rendition_status', 'rendition', ['status'])
+
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('pipeline', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('pipeline_reason', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('cpu_cost_estimate', sa.Float(), nullable=True))
+        batch_op.create_foreign_key('fk_job_destination_id', 'destination', ['destination_id'], ['id'])
+        batch_op.create_foreign_key('fk_job_video_asset_id', 'asset', ['video_asset_id'], ['id'])
+        batch_op.create_foreign_key('fk_job_audio_asset_id', 'asset', ['audio_asset_id'], ['id'])
+        batch_op.create_foreign_key('fk_job_preset_id', 'preset', ['preset_id'], ['id'])
+        batch_op.create_index('ix_job_destination_id_id', ['destination_id', 'id'])
+        batch_op.create_index('ix_job_status_id', ['status', 'id'])
+
+    with op.batch_alter_table('schedule') as batch_op:
+        batch_op.add_column(sa.Column('recurrence', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('next_fire_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('last_fired_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key('fk_schedule_job_id', 'job', ['job_id'], ['id'])
+        batch_op.create_index('ix_schedule_job_id_id', ['job_id', 'id'])
+        batch_op.create_index('ix_schedule_next_fire_at', ['next_fire_at'])
+
+    with op.batch_alter_table('session') as batch_op:
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('fencing_token', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('position_s', sa.Float(), nullable=True))
+        batch_op.create_foreign_key('fk_session_job_id', 'job', ['job_id'], ['id'])
+        batch_op.create_foreign_key('fk_session_schedule_id', 'schedule', ['schedule_id'], ['id'])
+        batch_op.create_index('ix_session_job_id_id', ['job_id', 'id'])
+        batch_op.create_index('ix_session_planned_start_at', ['planned_start_at'])
+        batch_op.create_index('ix_session_runner_id', ['runner_id'])
+        batch_op.create_index('ix_session_state_id', ['state', 'id'])
+
+    # The baseline runner fired every enabled schedule whose start had passed and that had no
+    # live session; schedules it already ran are left without a next fire time.
+    schedule = sa.table(
+        'schedule',
+        sa.column('id', sa.Integer()),
+        sa.column('start_at', sa.DateTime()),
+        sa.column('enabled', sa.Boolean()),
+        sa.column('next_fire_at', sa.DateTime()),
+    )
+    session = sa.table('session', sa.column('schedule_id', sa.Integer()))
+    op.execute(
+        schedule.update()
+        .where(schedule.c.enabled == sa.true())
+        .where(~sa.exists().where(session.c.schedule_id == schedule.c.id))
+        .values(next_fire_at=schedule.c.start_at)
+    )
+
+    with op.batch_alter_table('event') as batch_op:
+        batch_op.create_foreign_key('fk_event_session_id', 'session', ['session_id'], ['id'])
+
+    with op.batch_alter_table('ffmpeglog') as batch_op:
+        batch_op.alter_column('bytes', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False)
+        batch_op.create_foreign_key('fk_ffmpeglog_session_id', 'session', ['session_id'], ['id'])
+
+    op.create_table('sessionmetric',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_ts', sa.Integer(), nullable=False),
+    sa.Column('resolution_s', sa.Integer(), nullable=False),
+    sa.Column('bitrate_kbps', sa.Float(), nullable=True),
+    sa.Column('fps', sa.Float(), nullable=True),
+    sa.Column('speed', sa.Float(), nullable=True),
+    sa.Column('drop_frames', sa.Integer(), nullable=True),
+    sa.Column('dup_frames', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['session_id'], ['session.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sessionmetric_session_bucket', 'sessionmetric', ['session_id', 'bucket_ts'])
+
+    op.create_index('ix_memberlicense_tier_id', 'memberlicense', ['tier', 'id'])
+    op.create_index('ix_licenseactivity_created_at_id', 'licenseactivity', ['created_at', 'id'])
+    op.create_index('ix_licenseactivity_install_id_created_at_id', 'licenseactivity', ['install_id', 'created_at', 'id'])
+    op.create_index('ix_jobbackup_created_at_id', 'jobbackup', ['created_at', 'id'])
+    op.create_index('ix_jobbackup_job_id_created_at_id', 'jobbackup', ['job_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobbackup_job_id_created_at_id', table_name='jobbackup')
+    op.drop_index('ix_jobbackup_created_at_id', table_name='jobbackup')
+    op.drop_index('ix_licenseactivity_install_id_created_at_id', table_name='licenseactivity')
+    op.drop_index('ix_licenseactivity_created_at_id', table_name='licenseactivity')
+    op.drop_index('ix_memberlicense_tier_id', table_name='memberlicense')
+    op.drop_index('ix_sessionmetric_session_bucket', table_name='sessionmetric')
+    op.drop_table('sessionmetric')
+    with op.batch_alter_table('ffmpeglog') as batch_op:
+        batch_op.drop_constraint('fk_ffmpeglog_session_id', type_='foreignkey')
+        batch_op.alter_column('bytes', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False)
+    with op.batch_alter_table('event') as batch_op:
+        batch_op.drop_constraint('fk_event_session_id', type_='foreignkey')
+    with op.batch_alter_table('session') as batch_op:
+        batch_op.drop_index('ix_session_state_id')
+        batch_op.drop_index('ix_session_runner_id')
+        batch_op.drop_index('ix_session_planned_start_at')
+        batch_op.drop_index('ix_session_job_id_id')
+        batch_op.drop_constraint('fk_session_schedule_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_session_job_id', type_='foreignkey')
+        batch_op.drop_column('position_s')
+        batch_op.drop_column('fencing_token')
+        batch_op.drop_column('lease_expires_at')
+    with op.batch_alter_table('schedule') as batch_op:
+        batch_op.drop_index('ix_schedule_next_fire_at')
+        batch_op.drop_index('ix_schedule_job_id_id')
+        batch_op.drop_constraint('fk_schedule_job_id', type_='foreignkey')
+        batch_op.drop_column('last_fired_at')
+        batch_op.drop_column('next_fire_at')
+        batch_op.drop_column('recurrence')
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_index('ix_job_status_id')
+        batch_op.drop_index('ix_job_destination_id_id')
+        batch_op.drop_constraint('fk_job_preset_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_job_audio_asset_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_job_video_asset_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_job_destination_id', type_='foreignkey')
+        batch_op.drop_column('cpu_cost_estimate')
+        batch_op.drop_column('pipeline_reason')
+        batch_op.drop_column('pipeline')
+    op.drop_index('ix_rendition_status', table_name='rendition')
+    op.drop_index('ix_rendition_preset_id', table_name='rendition')
+    op.drop_index('ix_rendition_cache_key', table_name='rendition')
+    op.drop_index('ix_rendition_asset_id', table_name='rendition')
+    op.drop_table('rendition')
+    op.drop_table('keyframeindex')
+    op.drop_table('assetupload')
+    with op.batch_alter_table('asset') as batch_op:
+        batch_op.drop_index('ix_asset_type_id')
+        batch_op.drop_index('ix_asset_status_id')
+        batch_op.drop_index('ix_asset_probe_status')
+        batch_op.drop_index('ix_asset_hash')
+        batch_op.drop_column('probe_error')
+        batch_op.drop_column('probe_runner_id')
+        batch_op.drop_column('probe_status')
+        batch_op.alter_column('size_bytes', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False)
+    op.create_table('runnerlock',
+    sa.Column('lock_id', sa.Integer(), nullable=False),
+    sa.Column('runner_id', sa.String(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('lock_id')
+    )
+    op.drop_table('runnernode')
+    op.drop_table('mediaprobe')
+    op.drop_index('ix_changenotice_channel', table_name='changenotice')
+    op.drop_table('changenotice')
+    op.drop_table('adminaccount')
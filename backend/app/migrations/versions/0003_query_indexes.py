@@ -0,0 +1,51 @@
+"""query indexes
+
+Composite indexes ordered like the runner's claim/materialize scans and the routers' filtered
+pages, replacing single-column indexes those queries could only half use.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 23:57:25.298540
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SCHEDULE_DUE_WHERE = {"postgresql_where": sa.text("enabled"), "sqlite_where": sa.text("enabled = 1")}
+
+
+def upgrade() -> None:
+    op.drop_index('ix_asset_probe_status', table_name='asset')
+    op.create_index('ix_asset_probe_status_id', 'asset', ['probe_status', 'id'])
+    op.drop_index('ix_changenotice_channel', table_name='changenotice')
+    op.create_index('ix_changenotice_channel_id', 'changenotice', ['channel', 'id'])
+    op.create_index('ix_event_session_id_ts', 'event', ['session_id', 'ts'])
+    op.create_index('ix_memberlicense_install_id', 'memberlicense', ['install_id'])
+    op.drop_index('ix_rendition_status', table_name='rendition')
+    op.create_index('ix_rendition_status_created_at', 'rendition', ['status', 'created_at'])
+    op.drop_index('ix_schedule_next_fire_at', table_name='schedule')
+    op.create_index('ix_schedule_due', 'schedule', ['next_fire_at'], **SCHEDULE_DUE_WHERE)
+    op.create_index('ix_session_schedule_id_state', 'session', ['schedule_id', 'state'])
+    op.create_index('ix_session_state_planned_start_at', 'session', ['state', 'planned_start_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_session_state_planned_start_at', table_name='session')
+    op.drop_index('ix_session_schedule_id_state', table_name='session')
+    op.drop_index('ix_schedule_due', table_name='schedule')
+    op.create_index('ix_schedule_next_fire_at', 'schedule', ['next_fire_at'])
+    op.drop_index('ix_rendition_status_created_at', table_name='rendition')
+    op.create_index('ix_rendition_status', 'rendition', ['status'])
+    op.drop_index('ix_memberlicense_install_id', table_name='memberlicense')
+    op.drop_index('ix_event_session_id_ts', table_name='event')
+    op.drop_index('ix_changenotice_channel_id', table_name='changenotice')
+    op.create_index('ix_changenotice_channel', 'changenotice', ['channel'])
+    op.drop_index('ix_asset_probe_status_id', table_name='asset')
+    op.create_index('ix_asset_probe_status', 'asset', ['probe_status'])
@@ -0,0 +1,40 @@
+"""job daily rollups
+
+Per-job daily totals that survive archiving of sessions and events, plus the event timestamp
+index the archiver scans.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:01:11.551646
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'jobdailyrollup',
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('sessions', sa.Integer(), nullable=False),
+        sa.Column('uptime_s', sa.Integer(), nullable=False),
+        sa.Column('restarts', sa.Integer(), nullable=False),
+        sa.Column('errors', sa.Integer(), nullable=False),
+        sa.Column('error_counts_json', sa.String(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('job_id', 'day'),
+    )
+    op.create_index('ix_event_ts', 'event', ['ts'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_event_ts', table_name='event')
+    op.drop_table('jobdailyrollup')
@@ -0,0 +1,31 @@
+"""natural key indexes
+
+Indexes on the keys configuration imports match existing rows on.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:07:37.894864
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_asset_path', 'asset', ['path'])
+    op.create_index('ix_destination_name', 'destination', ['name'])
+    op.create_index('ix_preset_name', 'preset', ['name'])
+    op.create_index('ix_job_name', 'job', ['name'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_name', table_name='job')
+    op.drop_index('ix_preset_name', table_name='preset')
+    op.drop_index('ix_destination_name', table_name='destination')
+    op.drop_index('ix_asset_path', table_name='asset')
@@ -0,0 +1,62 @@
+"""license tier counts
+
+Per-tier member counters for the license metrics, the tier each member is counted under, and
+the partial index the expiry sweep reads. Existing members are counted as of the upgrade.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:12:02.118094
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTED_WHERE = {"postgresql_where": sa.text("counted_tier IS NOT NULL"), "sqlite_where": sa.text("counted_tier IS NOT NULL")}
+
+
+def upgrade() -> None:
+    op.create_table(
+        'licensetiercount',
+        sa.Column('tier', sa.String(), nullable=False),
+        sa.Column('members', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('tier'),
+    )
+    op.add_column('memberlicense', sa.Column('counted_tier', sa.String(), nullable=True))
+    op.create_index('ix_memberlicense_counted_expires_at', 'memberlicense', ['expires_at'], **COUNTED_WHERE)
+    member = sa.table(
+        'memberlicense',
+        sa.column('tier', sa.String()),
+        sa.column('active', sa.Boolean()),
+        sa.column('expires_at', sa.DateTime()),
+        sa.column('counted_tier', sa.String()),
+    )
+    counts = sa.table('licensetiercount', sa.column('tier', sa.String()), sa.column('members', sa.Integer()))
+    op.execute(
+        member.update()
+        .where(member.c.active == sa.true())
+        .where(sa.or_(member.c.expires_at.is_(None), member.c.expires_at > datetime.utcnow()))
+        .values(counted_tier=member.c.tier)
+    )
+    op.execute(
+        counts.insert().from_select(
+            ['tier', 'members'],
+            sa.select(member.c.counted_tier, sa.func.count())
+            .where(member.c.counted_tier.is_not(None))
+            .group_by(member.c.counted_tier),
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_memberlicense_counted_expires_at', table_name='memberlicense')
+    with op.batch_alter_table('memberlicense') as batch_op:
+        batch_op.drop_column('counted_tier')
+    op.drop_table('licensetiercount')
@@ -1,34 +1,80 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
+from sqlalchemy import BigInteger, Index, LargeBinary, text
 from sqlmodel import Field, Relationship, SQLModel
 
 
 class AssetBase(SQLModel):
     type: str
     filename: str
-    path: str
-    size_bytes: int
+    path: str = Field(index=True)
+    size_bytes: int = Field(sa_type=BigInteger)
     duration_s: Optional[int] = None
     video_codec: Optional[str] = None
     audio_codec: Optional[str] = None
     width: Optional[int] = None
     height: Optional[int] = None
     fps: Optional[float] = None
-    hash: Optional[str] = None
+    hash: Optional[str] = Field(default=None, index=True)
     thumbnail_path: Optional[str] = None
     status: str = "active"
 
 
 class Asset(AssetBase, table=True):
+    __table_args__ = (
+        Index("ix_asset_status_id", "status", "id"),
+        Index("ix_asset_type_id", "type", "id"),
+        # Probe claims scan pending rows in id order.
+        Index("ix_asset_probe_status_id", "probe_status", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    probe_status: str = "pending"
+    probe_runner_id: Optional[str] = None
+    probe_error: Optional[str] = None
     jobs: List["Job"] = Relationship(back_populates="video_asset", sa_relationship_kwargs={"foreign_keys": "Job.video_asset_id"})
     audio_jobs: List["Job"] = Relationship(back_populates="audio_asset", sa_relationship_kwargs={"foreign_keys": "Job.audio_asset_id"})
 
 
+class MediaProbe(SQLModel, table=True):
+    # Probe results by file; reused while the file's size and mtime are unchanged.
+    path: str = Field(primary_key=True)
+    size_bytes: int = Field(sa_type=BigInteger)
+    mtime_ns: int = Field(sa_type=BigInteger)
+    result_json: str
+    probed_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class KeyframeIndex(SQLModel, table=True):
+    # Packed arrays of video keyframe times (float64 s) and byte offsets (int64), in time order.
+    asset_id: int = Field(primary_key=True, foreign_key="asset.id")
+    asset_hash: Optional[str] = None
+    count: int = 0
+    times: bytes = Field(sa_type=LargeBinary)
+    offsets: bytes = Field(sa_type=LargeBinary)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class AssetUploadBase(SQLModel):
+    type: str
+    filename: str
+    size_bytes: int = Field(sa_type=BigInteger)
+    on_duplicate: str = "link"
+
+
+class AssetUpload(AssetUploadBase, table=True):
+    id: str = Field(primary_key=True)
+    received_bytes: int = Field(default=0, sa_type=BigInteger)
+    status: str = "uploading"
+    asset_id: Optional[int] = Field(default=None, foreign_key="asset.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class DestinationBase(SQLModel):
-    name: str
+    name: str = Field(index=True)
     rtmp_url: str
     stream_key_encrypted: str
     rtmp_mode: str = "rtmp"
@@ -41,7 +87,7 @@ class Destination(DestinationBase, table=True):
 
 
 class PresetBase(SQLModel):
-    name: str
+    name: str = Field(index=True)
     mode: str = "copy_default"
     video_bitrate: Optional[int] = None
     audio_bitrate: Optional[int] = None
@@ -61,27 +107,54 @@ class Preset(PresetBase, table=True):
     jobs: List["Job"] = Relationship(back_populates="preset")
 
 
+class Rendition(SQLModel, table=True):
+    # Build claims take pending rows oldest first.
+    __table_args__ = (Index("ix_rendition_status_created_at", "status", "created_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cache_key: str = Field(index=True, unique=True)
+    asset_id: int = Field(foreign_key="asset.id", index=True)
+    # Not a foreign key: deleting a preset only marks its renditions stale for eviction.
+    preset_id: Optional[int] = Field(default=None, index=True)
+    crossfade_s: float = 0
+    path: str
+    status: str = "pending"
+    runner_id: Optional[str] = None
+    size_bytes: int = Field(default=0, sa_type=BigInteger)
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class JobBase(SQLModel):
-    name: str
+    name: str = Field(index=True)
     tier_required: str = "Basic"
-    destination_id: int
-    video_asset_id: int
+    destination_id: int = Field(foreign_key="destination.id")
+    video_asset_id: int = Field(foreign_key="asset.id")
     loop_enabled: bool = False
     crossfade_enabled: bool = False
     audio_mode: str = "none"
-    audio_asset_id: Optional[int] = None
+    audio_asset_id: Optional[int] = Field(default=None, foreign_key="asset.id")
     auto_recovery: bool = False
     hot_swap_mode: str = "immediate"
     scenes_enabled: bool = False
     scene_overrides_json: Optional[str] = None
     swap_rules_json: Optional[str] = None
-    preset_id: Optional[int] = None
+    preset_id: Optional[int] = Field(default=None, foreign_key="preset.id")
     status: str = "draft"
     invalid_reasons: Optional[str] = None
 
 
 class Job(JobBase, table=True):
+    __table_args__ = (
+        Index("ix_job_status_id", "status", "id"),
+        Index("ix_job_destination_id_id", "destination_id", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    pipeline: Optional[str] = None
+    pipeline_reason: Optional[str] = None
+    cpu_cost_estimate: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -94,8 +167,9 @@ class Job(JobBase, table=True):
 
 
 class ScheduleBase(SQLModel):
-    job_id: int
+    job_id: int = Field(foreign_key="job.id")
     type: str = "one_time"
+    recurrence: Optional[str] = None
     start_at: datetime
     end_at: Optional[datetime] = None
     duration_s: Optional[int] = None
@@ -104,29 +178,52 @@ class ScheduleBase(SQLModel):
 
 
 class Schedule(ScheduleBase, table=True):
+    __table_args__ = (
+        Index("ix_schedule_job_id_id", "job_id", "id"),
+        # Boolean filters compile to literals, so the runner's due-schedule scan can use a partial index.
+        Index(
+            "ix_schedule_due",
+            "next_fire_at",
+            postgresql_where=text("enabled"),
+            sqlite_where=text("enabled = 1"),
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    next_fire_at: Optional[datetime] = None
+    last_fired_at: Optional[datetime] = None
     job: Job = Relationship(back_populates="schedules")
     sessions: List["Session"] = Relationship(back_populates="schedule")
 
 
 class SessionBase(SQLModel):
-    job_id: int
-    schedule_id: Optional[int] = None
+    job_id: int = Field(foreign_key="job.id")
+    schedule_id: Optional[int] = Field(default=None, foreign_key="schedule.id")
     trigger: str = "run_now"
-    planned_start_at: Optional[datetime] = None
+    planned_start_at: Optional[datetime] = Field(default=None, index=True)
     planned_end_at: Optional[datetime] = None
     actual_start_at: Optional[datetime] = None
     actual_end_at: Optional[datetime] = None
     state: str = "queued"
-    runner_id: Optional[str] = None
+    runner_id: Optional[str] = Field(default=None, index=True)
+    lease_expires_at: Optional[datetime] = None
+    fencing_token: int = 0
     ffmpeg_pid: Optional[int] = None
     last_heartbeat_at: Optional[datetime] = None
     current_loop_index: Optional[int] = None
     next_loop_eta_s: Optional[int] = None
+    position_s: Optional[float] = None
     stop_reason: Optional[str] = None
 
 
 class Session(SessionBase, table=True):
+    __table_args__ = (
+        Index("ix_session_state_id", "state", "id"),
+        Index("ix_session_job_id_id", "job_id", "id"),
+        Index("ix_session_schedule_id_state", "schedule_id", "state"),
+        Index("ix_session_state_planned_start_at", "state", "planned_start_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     job: Job = Relationship(back_populates="sessions")
     schedule: Optional[Schedule] = Relationship(back_populates="sessions")
@@ -135,7 +232,7 @@ class Session(SessionBase, table=True):
 
 
 class EventBase(SQLModel):
-    session_id: int
+    session_id: int = Field(foreign_key="session.id")
     level: str
     code: str
     message: str
@@ -143,14 +240,43 @@ class EventBase(SQLModel):
 
 
 class Event(EventBase, table=True):
+    __table_args__ = (Index("ix_event_session_id_ts", "session_id", "ts"), Index("ix_event_ts", "ts"))
+
     id: Optional[int] = Field(default=None, primary_key=True)
     session: Session = Relationship(back_populates="events")
 
 
+class SessionMetric(SQLModel, table=True):
+    __table_args__ = (Index("ix_sessionmetric_session_bucket", "session_id", "bucket_ts"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: int = Field(foreign_key="session.id")
+    bucket_ts: int
+    resolution_s: int
+    bitrate_kbps: Optional[float] = None
+    fps: Optional[float] = None
+    speed: Optional[float] = None
+    drop_frames: Optional[int] = None
+    dup_frames: Optional[int] = None
+
+
+class JobDailyRollup(SQLModel, table=True):
+    # Per-job daily totals kept when sessions and events are archived out of the hot tables.
+    # No foreign key: the history outlives the job.
+    job_id: int = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    sessions: int = 0
+    uptime_s: int = 0
+    restarts: int = 0
+    errors: int = 0
+    error_counts_json: Optional[str] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class FFmpegLogBase(SQLModel):
-    session_id: int
+    session_id: int = Field(foreign_key="session.id")
     path: str
-    bytes: int = 0
+    bytes: int = Field(default=0, sa_type=BigInteger)
     started_at: datetime = Field(default_factory=datetime.utcnow)
     ended_at: Optional[datetime] = None
 
@@ -175,7 +301,7 @@ class LicenseState(LicenseStateBase, table=True):
 
 
 class MemberLicenseBase(SQLModel):
-    install_id: str
+    install_id: str = Field(index=True)
     install_secret_hash: str
     tier: str = "Basic"
     notes: Optional[str] = None
@@ -187,7 +313,25 @@ class MemberLicenseBase(SQLModel):
 
 
 class MemberLicense(MemberLicenseBase, table=True):
+    __table_args__ = (
+        Index("ix_memberlicense_tier_id", "tier", "id"),
+        # The expiry sweep only looks at members that are still counted.
+        Index(
+            "ix_memberlicense_counted_expires_at",
+            "expires_at",
+            postgresql_where=text("counted_tier IS NOT NULL"),
+            sqlite_where=text("counted_tier IS NOT NULL"),
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Tier this member is included under in LicenseTierCount; None while inactive or expired.
+    counted_tier: Optional[str] = None
+
+
+class LicenseTierCount(SQLModel, table=True):
+    tier: str = Field(primary_key=True)
+    members: int = 0
 
 
 class LicenseActivityBase(SQLModel):
@@ -198,6 +342,11 @@ class LicenseActivityBase(SQLModel):
 
 
 class LicenseActivity(LicenseActivityBase, table=True):
+    __table_args__ = (
+        Index("ix_licenseactivity_created_at_id", "created_at", "id"),
+        Index("ix_licenseactivity_install_id_created_at_id", "install_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
 
 
@@ -210,10 +359,35 @@ class JobBackupBase(SQLModel):
 
 
 class JobBackup(JobBackupBase, table=True):
+    __table_args__ = (
+        Index("ix_jobbackup_created_at_id", "created_at", "id"),
+        Index("ix_jobbackup_job_id_created_at_id", "job_id", "created_at", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+
+class ChangeNotice(SQLModel, table=True):
+    __table_args__ = (Index("ix_changenotice_channel_id", "channel", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    channel: str
+    payload: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class AdminAccount(SQLModel, table=True):
+    id: int = Field(default=1, primary_key=True)
+    username: str
+    password_hash: str
+    must_reset: bool = True
+    version: int = 1
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
-class RunnerLock(SQLModel, table=True):
-    lock_id: int = Field(default=1, primary_key=True)
-    runner_id: str
+class RunnerNode(SQLModel, table=True):
+    runner_id: str = Field(primary_key=True)
+    capacity: int
+    capabilities_json: Optional[str] = None
+    started_at: datetime = Field(default_factory=datetime.utcnow)
     heartbeat_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Collection, Optional
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .config import get_settings
+from .models import ChangeNotice
+
+RUNNER_CHANNEL = "zenstream_runner"
+NOTICE_RETENTION = timedelta(minutes=5)
+
+logger = logging.getLogger(__name__)
+
+
+def publish(session: Session, kind: str, object_id: Optional[int] = None, channel: str = RUNNER_CHANNEL) -> None:
+    # Queued inside the caller's transaction: listeners only hear about it once it commits.
+    payload = json.dumps({"kind": kind, "id": object_id})
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+    else:
+        session.add(ChangeNotice(channel=channel, payload=payload))
+
+
+class ChangeListener:
+    def __init__(self, engine: AsyncEngine, channel: str = RUNNER_CHANNEL, kinds: Optional[Collection[str]] = None):
+        self.engine = engine
+        self.channel = channel
+        # None wakes on every notice; otherwise only on notices of these kinds.
+        self.kinds = kinds
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.engine.dialect.name == "postgresql":
+            self._task = asyncio.create_task(self._listen_postgres())
+        else:
+            self._task = asyncio.create_task(self._poll_notices())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            woke = True
+        except asyncio.TimeoutError:
+            woke = False
+        self._event.clear()
+        return woke
+
+    def _wanted(self, payload: Optional[str]) -> bool:
+        if self.kinds is None:
+            return True
+        try:
+            return json.loads(payload)["kind"] in self.kinds
+        except (TypeError, ValueError, KeyError):
+            return True
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        if self._wanted(payload):
+            self._event.set()
+
+    async def _listen_postgres(self) -> None:
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    await raw.add_listener(self.channel, self._on_notify)
+                    # Anything committed while we were disconnected is picked up by this wake.
+                    self._event.set()
+                    while not raw.is_closed():
+                        await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("LISTEN %s failed; retrying", self.channel)
+            await asyncio.sleep(5)
+
+    async def _poll_notices(self) -> None:
+        settings = get_settings()
+        last_id: Optional[int] = None
+        fresh = select(ChangeNotice.payload).where(ChangeNotice.channel == self.channel)
+        while True:
+            try:
+                async with AsyncSession(self.engine) as db:
+                    stmt = select(func.max(ChangeNotice.id)).where(ChangeNotice.channel == self.channel)
+                    latest = (await db.exec(stmt)).first() or 0
+                    if last_id is not None and latest > last_id:
+                        payloads = [] if self.kinds is None else (await db.exec(fresh.where(ChangeNotice.id > last_id))).all()
+                        if self.kinds is None or any(map(self._wanted, payloads)):
+                            self._event.set()
+                        await db.execute(
+                            delete(ChangeNotice).where(ChangeNotice.created_at < datetime.utcnow() - NOTICE_RETENTION)
+                        )
+                        await db.commit()
+                    last_id = max(latest, last_id or 0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Polling change notices failed")
+            await asyncio.sleep(settings.runner_notify_poll_seconds)
@@ -0,0 +1,98 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import tuple_
+from sqlmodel import select
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(jsonable_encoder(list(values)), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if key.type.python_type is datetime else key.type.python_type(value)
+            for key, value in zip(keys, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class Page:
+    # Keyset pagination: rows are ordered by `keys` (ending with the primary key so positions are
+    # unique) and each page continues strictly after the last row of the previous one, so every
+    # page is one index range scan however deep the client has paged.
+    def __init__(
+        self,
+        model,
+        keys: Sequence,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        fields: Optional[str] = None,
+        descending: bool = True,
+    ):
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        self.model = model
+        self.keys = list(keys)
+        self.after = decode_cursor(cursor, self.keys) if cursor else None
+        self.limit = limit
+        self.descending = descending
+        self.fields = None
+        if fields:
+            columns = model.__table__.columns
+            self.fields = [name.strip() for name in fields.split(",") if name.strip()]
+            unknown = [name for name in self.fields if name not in columns]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    def statement(self, *conditions):
+        if self.fields is None:
+            query = select(self.model)
+        else:
+            # Key columns are read too so the cursor can be built; only requested fields are returned.
+            names = dict.fromkeys(self.fields + [key.name for key in self.keys])
+            query = select(*(self.model.__table__.columns[name] for name in names))
+        conditions = [condition for condition in conditions if condition is not None]
+        if self.after is not None:
+            position, after = tuple_(*self.keys), tuple_(*self.after)
+            conditions.append(position < after if self.descending else position > after)
+        order = [key.desc() if self.descending else key.asc() for key in self.keys]
+        return query.where(*conditions).order_by(*order).limit(self.limit + 1)
+
+    def fetch(self, db, *conditions) -> List:
+        statement = self.statement(*conditions)
+        # Projected queries go through execute() so single-column selects still yield rows.
+        return list(db.exec(statement) if self.fields is None else db.execute(statement))
+
+    async def fetch_async(self, db, *conditions) -> List:
+        statement = self.statement(*conditions)
+        return list(await db.exec(statement) if self.fields is None else await db.execute(statement))
+
+    def respond(self, rows: List, response: Response):
+        more = len(rows) > self.limit
+        rows = rows[: self.limit]
+        headers = {}
+        if more:
+            last = rows[-1]
+            values = [getattr(last, key.name) if self.fields is None else last._mapping[key.name] for key in self.keys]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(values)
+        if self.fields is None:
+            response.headers.update(headers)
+            return rows
+        items = [{name: row._mapping[name] for name in self.fields} for row in rows]
+        return JSONResponse(jsonable_encoder(items), headers=headers)
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlmodel import Session, or_, select
+
+from .models import Asset, Destination, Job, Preset
+
+COPY = "copy"
+AUDIO_TRANSCODE = "audio_transcode"
+FULL_TRANSCODE = "full_transcode"
+PIPELINES = (COPY, AUDIO_TRANSCODE, FULL_TRANSCODE)
+
+# (video codecs, audio codecs) each destination mode can carry; RTMP(S) muxes FLV.
+FLV_CODECS = ({"h264"}, {"aac", "mp3"})
+DESTINATION_CODECS = {"rtmp": FLV_CODECS, "rtmps": FLV_CODECS}
+# Rough cores per stream, calibrated to libx264 veryfast at 1080p30.
+COPY_COST = 0.05
+AUDIO_TRANSCODE_COST = 0.1
+REFERENCE_PIXEL_RATE = 1920 * 1080 * 30
+REFERENCE_VIDEO_COST = 1.5
+X264_PRESET_FACTORS = {
+    "ultrafast": 0.4,
+    "superfast": 0.6,
+    "veryfast": 1.0,
+    "faster": 1.4,
+    "fast": 1.8,
+    "medium": 2.5,
+    "slow": 4.0,
+    "slower": 7.0,
+    "veryslow": 12.0,
+}
+
+
+@dataclass
+class PipelineDecision:
+    pipeline: str
+    reason: str
+    cpu_cost: float
+
+
+def asset_bitrate_kbps(asset: Asset) -> Optional[float]:
+    if not asset.duration_s or not asset.size_bytes:
+        return None
+    return asset.size_bytes * 8 / asset.duration_s / 1000
+
+
+def output_size(preset: Optional[Preset], asset: Asset):
+    width, height = asset.width or 1920, asset.height or 1080
+    if preset and preset.scale:
+        parts = preset.scale.replace("x", ":").split(":")
+        try:
+            w, h = int(parts[0]), int(parts[1])
+        except (ValueError, IndexError):
+            return width, height
+        # FFmpeg's -1/-2 keep the aspect ratio from the other dimension.
+        if w <= 0 and h > 0:
+            w = round(h * width / height)
+        if h <= 0 and w > 0:
+            h = round(w * height / width)
+        if w > 0 and h > 0:
+            return w, h
+    return width, height
+
+
+def video_cost(preset: Optional[Preset], asset: Asset) -> float:
+    width, height = output_size(preset, asset)
+    fps = (preset.fps if preset else None) or asset.fps or 30
+    factor = X264_PRESET_FACTORS.get((preset.preset if preset else None) or "veryfast", 1.0)
+    return round(REFERENCE_VIDEO_COST * factor * width * height * fps / REFERENCE_PIXEL_RATE, 2)
+
+
+def destination_codecs(destination: Destination):
+    return DESTINATION_CODECS.get(destination.rtmp_mode, FLV_CODECS)
+
+
+def video_mismatch(video: Asset, destination: Destination, preset: Optional[Preset]) -> Optional[str]:
+    if video.video_codec and video.video_codec.lower() not in destination_codecs(destination)[0]:
+        return f"video codec {video.video_codec} is not supported by {destination.rtmp_mode}"
+    if preset is None or preset.mode == "copy_default":
+        return None
+    # A transcoding preset only forces an encode for settings the source does not already meet.
+    if preset.gop or preset.profile or preset.tune:
+        return "preset sets GOP/profile/tune, which stream copy cannot guarantee"
+    if preset.scale and (video.width, video.height) != output_size(preset, video):
+        return f"preset scales to {preset.scale}"
+    if preset.fps and (not video.fps or abs(video.fps - preset.fps) > 0.01):
+        return f"preset changes frame rate to {preset.fps:g}"
+    if preset.video_bitrate:
+        bitrate = asset_bitrate_kbps(video)
+        if bitrate is None or bitrate > preset.video_bitrate:
+            return f"source bitrate exceeds the preset's {preset.video_bitrate} kbps cap"
+    return None
+
+
+def audio_mismatch(
+    job: Job, video: Asset, destination: Destination, preset: Optional[Preset], audio: Optional[Asset]
+) -> Optional[str]:
+    if audio is not None and job.audio_mode != "none":
+        return "replacement audio is encoded to the stream's settings"
+    if video.audio_codec and video.audio_codec.lower() not in destination_codecs(destination)[1]:
+        return f"audio codec {video.audio_codec} is not supported by {destination.rtmp_mode}"
+    if preset and preset.mode != "copy_default" and (preset.audio_channels or preset.audio_rate):
+        return "preset changes audio channels or sample rate"
+    return None
+
+
+def analyze_pipeline(
+    job: Job,
+    video: Asset,
+    destination: Destination,
+    preset: Optional[Preset] = None,
+    audio: Optional[Asset] = None,
+) -> PipelineDecision:
+    video_reason = video_mismatch(video, destination, preset)
+    if video_reason:
+        return PipelineDecision(FULL_TRANSCODE, video_reason, round(video_cost(preset, video) + AUDIO_TRANSCODE_COST, 2))
+    audio_reason = audio_mismatch(job, video, destination, preset, audio)
+    if audio_reason:
+        return PipelineDecision(AUDIO_TRANSCODE, audio_reason, AUDIO_TRANSCODE_COST)
+    if not video.video_codec:
+        return PipelineDecision(COPY, "asset not probed; assuming RTMP-compatible streams", COPY_COST)
+    return PipelineDecision(COPY, "source streams already match the destination and preset", COPY_COST)
+
+
+def apply_pipeline(job: Job, session: Session) -> None:
+    destination = session.get(Destination, job.destination_id)
+    video = session.get(Asset, job.video_asset_id)
+    if not destination or not video:
+        job.pipeline = job.pipeline_reason = job.cpu_cost_estimate = None
+        return
+    preset = session.get(Preset, job.preset_id) if job.preset_id else None
+    audio = session.get(Asset, job.audio_asset_id) if job.audio_asset_id else None
+    decision = analyze_pipeline(job, video, destination, preset, audio)
+    job.pipeline = decision.pipeline
+    job.pipeline_reason = decision.reason
+    job.cpu_cost_estimate = decision.cpu_cost
+
+
+def preload_references(session: Session, jobs) -> list:
+    # The identity map only holds weak references: callers keep the returned rows alive while they
+    # analyze a batch, so the lookups apply_pipeline makes hit the map instead of the database.
+    destination_ids = {job.destination_id for job in jobs}
+    asset_ids = {job.video_asset_id for job in jobs} | {job.audio_asset_id for job in jobs if job.audio_asset_id}
+    preset_ids = {job.preset_id for job in jobs if job.preset_id}
+    rows = list(session.exec(select(Destination).where(Destination.id.in_(destination_ids))))
+    rows += session.exec(select(Asset).where(Asset.id.in_(asset_ids)))
+    if preset_ids:
+        rows += session.exec(select(Preset).where(Preset.id.in_(preset_ids)))
+    return rows
+
+
+def refresh_pipelines(session: Session, asset_ids: Optional[List[int]] = None, preset_id: Optional[int] = None) -> None:
+    # Asset metadata and preset settings feed the decision, so jobs using them are re-analyzed.
+    # The runner calls this through AsyncSession.run_sync after storing probe results.
+    conditions = []
+    if asset_ids:
+        conditions += [Job.video_asset_id.in_(asset_ids), Job.audio_asset_id.in_(asset_ids)]
+    if preset_id is not None:
+        conditions.append(Job.preset_id == preset_id)
+    if not conditions:
+        return
+    jobs = session.exec(select(Job).where(or_(*conditions))).all()
+    loaded = preload_references(session, jobs)
+    for job in jobs:
+        apply_pipeline(job, session)
+        session.add(job)
+    del loaded
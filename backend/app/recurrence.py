@@ -0,0 +1,190 @@
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence
+
+RECURRING_TYPES = ("cron", "rrule")
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+RRULE_PERIODS = {"HOURLY": timedelta(hours=1), "DAILY": timedelta(days=1), "WEEKLY": timedelta(weeks=1)}
+# Long enough to cover every calendar pattern (leap years included) a cron rule can express.
+CRON_SEARCH_DAYS = 366 * 8
+
+
+def _cron_field(token: str, low: int, high: int) -> List[int]:
+    values = set()
+    for part in token.split(","):
+        span, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if span == "*":
+            first, last = low, high
+        elif "-" in span:
+            first_text, last_text = span.split("-", 1)
+            first, last = int(first_text), int(last_text)
+        else:
+            first = int(span)
+            last = high if step_text else first
+        if step < 1 or first < low or last > high or first > last:
+            raise ValueError(f"Cron field '{token}' outside {low}-{high}")
+        values.update(range(first, last + 1, step))
+    return sorted(values)
+
+
+class CronRule:
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError("Cron rules need five fields: minute hour day month weekday")
+        self.minutes = _cron_field(fields[0], 0, 59)
+        self.hours = _cron_field(fields[1], 0, 23)
+        self.days = set(_cron_field(fields[2], 1, 31))
+        self.months = set(_cron_field(fields[3], 1, 12))
+        # Cron counts Sunday as 0 or 7; Python's weekday() starts at Monday.
+        self.weekdays = {(d - 1) % 7 for d in _cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day: date) -> bool:
+        if day.month not in self.months:
+            return False
+        dom = day.day in self.days
+        dow = day.weekday() in self.weekdays
+        if self.any_day or self.any_weekday:
+            return dom and dow
+        return dom or dow
+
+    def _first_time(self, floor_minute: int) -> Optional[time]:
+        for hour in self.hours[bisect_left(self.hours, floor_minute // 60):]:
+            first = floor_minute % 60 if hour == floor_minute // 60 else 0
+            idx = bisect_left(self.minutes, first)
+            if idx < len(self.minutes):
+                return time(hour, self.minutes[idx])
+        return None
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        candidate = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = candidate.date()
+        floor_minute = candidate.hour * 60 + candidate.minute
+        for _ in range(CRON_SEARCH_DAYS):
+            if self._day_matches(day):
+                at = self._first_time(floor_minute)
+                if at is not None:
+                    return datetime.combine(day, at)
+            day += timedelta(days=1)
+            floor_minute = 0
+        return None
+
+
+class RRule:
+    def __init__(self, text: str, dtstart: datetime):
+        parts = {}
+        for item in text.upper().removeprefix("RRULE:").split(";"):
+            if item:
+                key, _, value = item.partition("=")
+                parts[key] = value
+        freq = parts.get("FREQ")
+        if freq not in RRULE_PERIODS:
+            raise ValueError("RRULE FREQ must be HOURLY, DAILY or WEEKLY")
+        interval = int(parts.get("INTERVAL", "1"))
+        if interval < 1:
+            raise ValueError("RRULE INTERVAL must be positive")
+        days = None
+        if "BYDAY" in parts:
+            names = parts["BYDAY"].split(",")
+            if any(name not in WEEKDAYS for name in names):
+                raise ValueError("RRULE BYDAY must use MO, TU, WE, TH, FR, SA or SU")
+            days = [WEEKDAYS[name] for name in names]
+        hours = [int(h) for h in parts["BYHOUR"].split(",")] if "BYHOUR" in parts else [dtstart.hour]
+        minutes = [int(m) for m in parts["BYMINUTE"].split(",")] if "BYMINUTE" in parts else [dtstart.minute]
+        if any(not 0 <= h <= 23 for h in hours) or any(not 0 <= m <= 59 for m in minutes):
+            raise ValueError("RRULE BYHOUR/BYMINUTE out of range")
+        if freq == "DAILY" and days is not None:
+            # A daily rule limited to some weekdays is the same series as a weekly one.
+            if interval != 1:
+                raise ValueError("RRULE BYDAY with FREQ=DAILY requires INTERVAL=1")
+            freq = "WEEKLY"
+        if freq == "HOURLY" and ("BYHOUR" in parts or days is not None):
+            raise ValueError("RRULE FREQ=HOURLY only supports BYMINUTE")
+
+        self.dtstart = dtstart
+        self.period = RRULE_PERIODS[freq] * interval
+        self.count = int(parts["COUNT"]) if "COUNT" in parts else None
+        self.until = datetime.fromisoformat(parts["UNTIL"].rstrip("Z")) if "UNTIL" in parts else None
+        second = timedelta(seconds=dtstart.second)
+        if freq == "HOURLY":
+            self.anchor = dtstart.replace(minute=0, second=0, microsecond=0)
+            offsets = [timedelta(minutes=m) + second for m in minutes]
+        elif freq == "DAILY":
+            self.anchor = datetime.combine(dtstart.date(), time())
+            offsets = [timedelta(hours=h, minutes=m) + second for h in hours for m in minutes]
+        else:
+            self.anchor = datetime.combine(dtstart.date() - timedelta(days=dtstart.weekday()), time())
+            offsets = [
+                timedelta(days=d, hours=h, minutes=m) + second
+                for d in (days if days is not None else [dtstart.weekday()])
+                for h in hours
+                for m in minutes
+            ]
+        self.offsets: Sequence[timedelta] = sorted(set(offsets))
+        # Slots of the first period that fall before DTSTART are not part of the series.
+        self.skipped = bisect_left(self.offsets, dtstart - self.anchor)
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        floor = max(after, self.dtstart - timedelta(microseconds=1))
+        period = max(0, (floor - self.anchor) // self.period)
+        while True:
+            base = self.anchor + self.period * period
+            idx = bisect_left(self.offsets, floor - base + timedelta(microseconds=1))
+            if idx < len(self.offsets):
+                break
+            period += 1
+        occurrence = base + self.offsets[idx]
+        index = period * len(self.offsets) + idx - self.skipped
+        if self.count is not None and index >= self.count:
+            return None
+        if self.until is not None and occurrence > self.until:
+            return None
+        return occurrence
+
+
+@lru_cache(maxsize=4096)
+def _cron(rule: str) -> CronRule:
+    return CronRule(rule)
+
+
+@lru_cache(maxsize=4096)
+def _rrule(rule: str, dtstart: datetime) -> RRule:
+    return RRule(rule, dtstart)
+
+
+def compile_rule(kind: str, rule: Optional[str], dtstart: datetime):
+    if kind == "one_time":
+        return None
+    if not rule:
+        raise ValueError(f"Schedules of type {kind} need a recurrence rule")
+    if kind == "cron":
+        return _cron(rule)
+    if kind == "rrule":
+        return _rrule(rule, dtstart)
+    raise ValueError(f"Unknown schedule type {kind}")
+
+
+def next_fire_time(schedule, after: Optional[datetime] = None) -> Optional[datetime]:
+    rule = compile_rule(schedule.type, schedule.recurrence, schedule.start_at)
+    if rule is None:
+        if after is None or schedule.start_at > after:
+            return schedule.start_at
+        return None
+    floor = schedule.start_at - timedelta(microseconds=1)
+    occurrence = rule.next_after(max(after, floor) if after else floor)
+    if occurrence is None or occurrence < schedule.start_at:
+        return None
+    if schedule.end_at is not None and occurrence > schedule.end_at:
+        return None
+    return occurrence
+
+
+def occurrences(schedule, after: Optional[datetime] = None) -> Iterator[datetime]:
+    current = next_fire_time(schedule, after)
+    while current is not None:
+        yield current
+        current = next_fire_time(schedule, current)
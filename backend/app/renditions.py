@@ -0,0 +1,50 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import or_, update
+from sqlmodel import Session
+
+from .config import get_settings
+from .models import Asset, Job, Preset, PresetBase, Rendition
+from .pipeline import FULL_TRANSCODE
+
+# Everything that changes the encoded bytes; the preset's name does not.
+ENCODE_FIELDS = tuple(name for name in PresetBase.model_fields if name != "name")
+
+
+def rendition_dir() -> Path:
+    return Path(get_settings().data_dir) / "renditions"
+
+
+def wants_rendition(job: Job, video: Asset, preset: Optional[Preset]) -> bool:
+    # Only loops re-encode the same frames forever, and only content-hashed assets can be addressed.
+    if not job.loop_enabled or not video.hash or preset is None:
+        return False
+    if job.pipeline:
+        return job.pipeline == FULL_TRANSCODE
+    return preset.mode != "copy_default"
+
+
+def crossfade_seconds(job: Job, video: Asset) -> float:
+    seconds = get_settings().rendition_crossfade_seconds
+    if not job.crossfade_enabled or not video.duration_s or video.duration_s <= 2 * seconds:
+        return 0.0
+    return seconds
+
+
+def rendition_key(video: Asset, preset: Preset, crossfade_s: float) -> str:
+    params = {name: getattr(preset, name) for name in ENCODE_FIELDS}
+    blob = json.dumps({"asset": video.hash, "preset": params, "crossfade_s": crossfade_s}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def invalidate_renditions(session: Session, asset_id: Optional[int] = None, preset_id: Optional[int] = None) -> None:
+    conditions = []
+    if asset_id is not None:
+        conditions.append(Rendition.asset_id == asset_id)
+    if preset_id is not None:
+        conditions.append(Rendition.preset_id == preset_id)
+    if conditions:
+        session.execute(update(Rendition).where(or_(*conditions)).values(status="stale"))
@@ -1,13 +1,25 @@
-from datetime import datetime
-from typing import List
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from starlette.requests import ClientDisconnect
+from sqlalchemy import and_, delete, insert, or_, update
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import models
 from ..auth import require_password_reset
-from ..deps import get_session
+from ..deps import get_async_session, get_session
+from ..notify import publish
+from ..pagination import DEFAULT_PAGE_SIZE, Page
+from ..pipeline import refresh_pipelines
+from ..renditions import invalidate_renditions
 from ..storage import default_asset_path
+from ..uploads import CLAIM_SECONDS, UploadSink, discard, store, unique_path
 
 router = APIRouter(prefix="/assets", tags=["assets"])
 
@@ -18,20 +30,210 @@ def create_asset(asset: models.AssetBase, session: Session = Depends(get_session
     if not db_asset.path:
         db_asset.path = default_asset_path(db_asset.type, db_asset.filename)
     session.add(db_asset)
+    session.flush()
+    # Probing happens on a runner; this only wakes it.
+    publish(session, "asset", db_asset.id)
     session.commit()
     session.refresh(db_asset)
     return db_asset
 
 
+@router.post("/bulk")
+def create_assets(assets: List[models.AssetBase], session: Session = Depends(get_session), admin=Depends(require_password_reset)):
+    rows = []
+    for asset in assets:
+        db_asset = models.Asset.model_validate(asset)
+        if not db_asset.path:
+            db_asset.path = default_asset_path(db_asset.type, db_asset.filename)
+        rows.append(db_asset.model_dump(exclude={"id"}))
+    if rows:
+        session.execute(insert(models.Asset), rows)
+        publish(session, "asset")
+    session.commit()
+    return {"created": len(rows)}
+
+
+@router.post("/rescan")
+def rescan_assets(session: Session = Depends(get_session), admin=Depends(require_password_reset)):
+    # Unchanged files are answered from the probe cache, so a full rescan only probes what changed.
+    result = session.execute(
+        update(models.Asset).where(models.Asset.status == "active").values(probe_status="pending", probe_runner_id=None)
+    )
+    publish(session, "asset")
+    session.commit()
+    return {"queued": result.rowcount}
+
+
+@router.post("/uploads", response_model=models.AssetUpload)
+async def create_upload(
+    payload: models.AssetUploadBase,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    if payload.size_bytes <= 0:
+        raise HTTPException(status_code=400, detail="size_bytes must be positive")
+    if payload.on_duplicate not in ("link", "reject"):
+        raise HTTPException(status_code=400, detail="on_duplicate must be link or reject")
+    if Path(payload.filename).name != payload.filename:
+        raise HTTPException(status_code=400, detail="filename must not contain a path")
+    upload = models.AssetUpload.model_validate(payload, update={"id": uuid.uuid4().hex})
+    session.add(upload)
+    await session.commit()
+    await session.refresh(upload)
+    return upload
+
+
+@router.get("/uploads/{upload_id}", response_model=models.AssetUpload)
+async def get_upload(upload_id: str, session: AsyncSession = Depends(get_async_session), admin=Depends(require_password_reset)):
+    upload = await session.get(models.AssetUpload, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+async def _claim_upload(session: AsyncSession, upload_id: str, offset: int) -> Optional[datetime]:
+    # Compare-and-set on the recorded offset: of several PUTs at one offset, on any worker, only
+    # one gets to touch the partial file. The claim's updated_at is its token.
+    now = datetime.utcnow()
+    lapsed = now - timedelta(seconds=CLAIM_SECONDS)
+    upload = models.AssetUpload
+    result = await session.execute(
+        update(upload)
+        .where(
+            upload.id == upload_id,
+            upload.received_bytes == offset,
+            or_(upload.status == "uploading", and_(upload.status == "receiving", upload.updated_at < lapsed)),
+        )
+        .values(status="receiving", updated_at=now)
+    )
+    await session.commit()
+    return now if result.rowcount == 1 else None
+
+
+async def _renew_claim(session: AsyncSession, upload_id: str, claim: datetime, **values) -> Optional[datetime]:
+    now = datetime.utcnow()
+    upload = models.AssetUpload
+    result = await session.execute(
+        update(upload)
+        .where(upload.id == upload_id, upload.status == "receiving", upload.updated_at == claim)
+        .values(updated_at=now, **values)
+    )
+    await session.commit()
+    return now if result.rowcount == 1 else None
+
+
+@router.put("/uploads/{upload_id}", response_model=models.AssetUpload)
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    upload = await session.get(models.AssetUpload, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload.status not in ("uploading", "receiving"):
+        raise HTTPException(status_code=409, detail=f"Upload is {upload.status}")
+    claim = await _claim_upload(session, upload_id, offset)
+    await session.refresh(upload)
+    if claim is None:
+        if upload.received_bytes != offset:
+            raise HTTPException(status_code=409, detail=f"Resume from offset {upload.received_bytes}")
+        raise HTTPException(status_code=409, detail="Another request is writing this upload")
+    sink = await asyncio.to_thread(UploadSink, upload_id, offset)
+    renewed_at = time.monotonic()
+    try:
+        async for chunk in request.stream():
+            if sink.offset + len(chunk) > upload.size_bytes:
+                raise HTTPException(status_code=413, detail="Upload exceeds declared size_bytes")
+            # Renewed before any write once a third of the window has passed, so nothing is
+            # written after the claim could have been taken over.
+            if time.monotonic() - renewed_at > CLAIM_SECONDS / 3:
+                claim = await _renew_claim(session, upload_id, claim)
+                if claim is None:
+                    raise HTTPException(status_code=409, detail="Upload was taken over by another request")
+                renewed_at = time.monotonic()
+            await asyncio.to_thread(sink.write, chunk)
+    except ClientDisconnect:
+        pass
+    finally:
+        # Record what reached the disk even if the client went away, so it can resume there. A
+        # complete upload keeps its claim until the asset is created.
+        complete = sink.offset == upload.size_bytes
+        if claim is not None:
+            claim = await _renew_claim(
+                session,
+                upload_id,
+                claim,
+                received_bytes=sink.offset,
+                status="receiving" if complete else "uploading",
+            )
+        await asyncio.to_thread(sink.close, claim is not None)
+    if claim is None:
+        raise HTTPException(status_code=409, detail="Upload was taken over by another request")
+    await session.refresh(upload)
+    if complete:
+        await finish_upload(upload, sink.hexdigest(), session)
+    return upload
+
+
+async def finish_upload(upload: models.AssetUpload, digest: str, session: AsyncSession) -> None:
+    duplicate = (
+        await session.exec(select(models.Asset).where(models.Asset.hash == digest, models.Asset.status == "active"))
+    ).first()
+    if duplicate and upload.on_duplicate == "reject":
+        await asyncio.to_thread(discard, upload.id)
+        upload.status = "duplicate"
+        upload.asset_id = duplicate.id
+        session.add(upload)
+        await session.commit()
+        raise HTTPException(status_code=409, detail=f"Duplicate of asset {duplicate.id}")
+    target = unique_path(Path(default_asset_path(upload.type, upload.filename)), upload.id[:8])
+    path = await asyncio.to_thread(store, upload.id, target, duplicate.path if duplicate else None)
+    asset = models.Asset(
+        type=upload.type,
+        filename=upload.filename,
+        path=str(path),
+        size_bytes=upload.size_bytes,
+        hash=digest,
+    )
+    session.add(asset)
+    await session.flush()
+    await session.run_sync(publish, "asset", asset.id)
+    upload.status = "complete"
+    upload.asset_id = asset.id
+    upload.updated_at = datetime.utcnow()
+    session.add(upload)
+    await session.commit()
+    await session.refresh(upload)
+
+
 @router.get("/", response_model=List[models.Asset])
-def list_assets(session: Session = Depends(get_session), admin=Depends(require_password_reset)):
-    assets = session.exec(select(models.Asset)).all()
-    return assets
+async def list_assets(
+    response: Response,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    probe_status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    page = Page(models.Asset, [models.Asset.id], cursor, limit, fields, descending=False)
+    rows = await page.fetch_async(
+        session,
+        models.Asset.type == type if type else None,
+        models.Asset.status == status if status else None,
+        models.Asset.probe_status == probe_status if probe_status else None,
+    )
+    return page.respond(rows, response)
 
 
 @router.get("/{asset_id}", response_model=models.Asset)
-def get_asset(asset_id: int, session: Session = Depends(get_session), admin=Depends(require_password_reset)):
-    asset = session.get(models.Asset, asset_id)
+async def get_asset(asset_id: int, session: AsyncSession = Depends(get_async_session), admin=Depends(require_password_reset)):
+    asset = await session.get(models.Asset, asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     return asset
@@ -45,6 +247,13 @@ def update_asset(asset_id: int, payload: models.AssetBase, session: Session = De
     update_data = payload.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(asset, key, value)
+    if "path" in update_data:
+        asset.probe_status = "pending"
+        publish(session, "asset", asset_id)
+    if "path" in update_data or "hash" in update_data:
+        session.execute(delete(models.KeyframeIndex).where(models.KeyframeIndex.asset_id == asset_id))
+    invalidate_renditions(session, asset_id=asset_id)
+    refresh_pipelines(session, asset_ids=[asset_id])
     session.add(asset)
     session.commit()
     session.refresh(asset)
@@ -57,6 +266,7 @@ def delete_asset(asset_id: int, session: Session = Depends(get_session), admin=D
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     asset.status = "deleted"
+    invalidate_renditions(session, asset_id=asset_id)
     session.add(asset)
     session.commit()
     return {"status": "deleted"}
@@ -1,42 +1,51 @@
-from typing import Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 
-from fastapi import APIRouter, Body, Depends
-from sqlmodel import Session, select
-
-from .. import models
 from ..auth import require_password_reset
-from ..deps import get_session
+from ..database import async_engine, engine
+from ..transfer import ConfigImporter, ConfigImportError, export_lines, gzip_chunks, legacy_records, ndjson_records
+from .jobs import validate_job
 
 router = APIRouter(prefix="/config", tags=["config"])
 
 
 @router.get("/export")
-def export_config(session: Session = Depends(get_session), admin=Depends(require_password_reset)):
-    payload: Dict[str, List[Dict]] = {
-        "assets": [asset.model_dump() for asset in session.exec(select(models.Asset)).all()],
-        "destinations": [dest.model_dump() for dest in session.exec(select(models.Destination)).all()],
-        "presets": [preset.model_dump() for preset in session.exec(select(models.Preset)).all()],
-        "jobs": [job.model_dump() for job in session.exec(select(models.Job)).all()],
-        "schedules": [sched.model_dump() for sched in session.exec(select(models.Schedule)).all()],
-    }
-    return payload
+def export_config(gzip: bool = False, admin=Depends(require_password_reset)):
+    # NDJSON, one {"section", "row"} object per line, streamed straight from the database.
+    if gzip:
+        return StreamingResponse(
+            gzip_chunks(export_lines(engine)),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="config.ndjson.gz"'},
+        )
+    return StreamingResponse(
+        export_lines(engine),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="config.ndjson"'},
+    )
 
 
 @router.post("/import")
-def import_config(
-    data: Dict = Body(...), session: Session = Depends(get_session), admin=Depends(require_password_reset)
-):
-    def upsert(model_cls, items: List[Dict]):
-        for raw in items:
-            clean = dict(raw)
-            clean.pop("id", None)
-            obj = model_cls(**clean)
-            session.add(obj)
-    upsert(models.Asset, data.get("assets", []))
-    upsert(models.Destination, data.get("destinations", []))
-    upsert(models.Preset, data.get("presets", []))
-    upsert(models.Job, data.get("jobs", []))
-    upsert(models.Schedule, data.get("schedules", []))
-    session.commit()
-    return {"status": "imported"}
-
+async def import_config(request: Request, admin=Depends(require_password_reset)):
+    # Takes an export as NDJSON (plain or gzip) or the older single JSON document, and applies it
+    # in one transaction: rows matching an existing natural key are updated, the rest inserted.
+    async with async_engine.begin() as conn:
+        importer = ConfigImporter(conn, validate_job)
+        try:
+            if request.headers.get("content-type", "").startswith("application/json"):
+                data = await request.json()
+                if not isinstance(data, dict):
+                    raise ConfigImportError("expected an object of sections")
+                for record in legacy_records(data):
+                    await importer.add(*record)
+            else:
+                async for record in ndjson_records(request.stream()):
+                    await importer.add(*record)
+            await importer.flush()
+            await importer.notify()
+        except ConfigImportError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        except IntegrityError as exc:
+            raise HTTPException(status_code=400, detail=f"Import conflicts with existing data: {exc.orig}")
+    return {"status": "imported", "created": importer.created, "updated": importer.updated}
@@ -1,12 +1,21 @@
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
+from sqlalchemy import func, or_
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import models
 from ..auth import require_password_reset
-from ..deps import get_session
+from ..config import get_settings
+from ..deps import get_async_session, get_session
+from ..history import RESTART_CODE, DayTally, new_tallies, report_day, rollup_tally, tally_events, tally_sessions
+from ..job_backups import restore_jobs, restore_values
+from ..licensing import lease_cache, tier_covers
+from ..notify import publish
+from ..pagination import DEFAULT_PAGE_SIZE, Page
+from ..pipeline import apply_pipeline
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
@@ -25,6 +34,10 @@ def validate_job(job: models.Job, session: Session) -> List[str]:
         reasons.append("Audio replacement requires Premium")
     if job.scenes_enabled and job.tier_required != "Ultimate":
         reasons.append("Scenes require Ultimate")
+    licensed = lease_cache.tier(session)
+    if not tier_covers(licensed, job.tier_required):
+        reasons.append(f"Requires the {job.tier_required} tier (licensed: {licensed})")
+    apply_pipeline(job, session)
     return reasons
 
 
@@ -41,17 +54,77 @@ def create_job(payload: models.JobBase, session: Session = Depends(get_session),
 
 
 @router.get("/", response_model=List[models.Job])
-def list_jobs(filter_status: Optional[str] = None, session: Session = Depends(get_session), admin=Depends(require_password_reset)):
-    query = select(models.Job)
-    if filter_status:
-        query = query.where(models.Job.status == filter_status)
-    return session.exec(query).all()
+async def list_jobs(
+    response: Response,
+    filter_status: Optional[str] = None,
+    tier: Optional[str] = None,
+    destination_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    page = Page(models.Job, [models.Job.id], cursor, limit, fields, descending=False)
+    rows = await page.fetch_async(
+        session,
+        models.Job.status == filter_status if filter_status else None,
+        models.Job.tier_required == tier if tier else None,
+        models.Job.destination_id == destination_id if destination_id is not None else None,
+    )
+    return page.respond(rows, response)
+
+
+@router.get("/capacity")
+async def capacity(session: AsyncSession = Depends(get_async_session), admin=Depends(require_password_reset)):
+    cutoff = datetime.utcnow() - timedelta(seconds=get_settings().runner_lease_seconds)
+    nodes = (await session.exec(select(models.RunnerNode).where(models.RunnerNode.heartbeat_at >= cutoff))).all()
+    load = (
+        await session.exec(
+            select(models.Session.runner_id, func.count(), func.coalesce(func.sum(models.Job.cpu_cost_estimate), 0))
+            .join(models.Job, models.Job.id == models.Session.job_id)
+            .where(models.Session.state.in_(("queued", "starting", "running")))
+            .group_by(models.Session.runner_id)
+        )
+    ).all()
+    by_runner = {runner_id: (sessions, float(cpu)) for runner_id, sessions, cpu in load}
+    runners = [
+        {
+            "runner_id": node.runner_id,
+            "capacity": node.capacity,
+            "sessions": by_runner.get(node.runner_id, (0, 0.0))[0],
+            "committed_cpu": by_runner.get(node.runner_id, (0, 0.0))[1],
+        }
+        for node in nodes
+    ]
+    return {
+        "total_capacity": sum(node.capacity for node in nodes),
+        "committed_cpu": round(sum(cpu for _, cpu in by_runner.values()), 2),
+        "unassigned_cpu": round(by_runner.get(None, (0, 0.0))[1], 2),
+        "runners": runners,
+    }
 
 
 @router.get("/backups", response_model=List[models.JobBackup])
-def list_backups(session: Session = Depends(get_session), admin=Depends(require_password_reset)):
-    stmt = select(models.JobBackup).order_by(models.JobBackup.created_at.desc())
-    return session.exec(stmt).all()
+def list_backups(
+    response: Response,
+    job_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None,
+    session: Session = Depends(get_session),
+    admin=Depends(require_password_reset),
+):
+    page = Page(models.JobBackup, [models.JobBackup.created_at, models.JobBackup.id], cursor, limit, fields)
+    rows = page.fetch(
+        session,
+        models.JobBackup.job_id == job_id if job_id is not None else None,
+        models.JobBackup.created_at >= since if since else None,
+        models.JobBackup.created_at < until if until else None,
+    )
+    return page.respond(rows, response)
 
 
 @router.patch("/{job_id}", response_model=models.Job)
@@ -67,6 +140,7 @@ def update_job(job_id: int, payload: models.JobBase, session: Session = Depends(
     job.invalid_reasons = ", ".join(reasons) if reasons else None
     job.updated_at = datetime.utcnow()
     session.add(job)
+    publish(session, "job", job.id)
     session.commit()
     session.refresh(job)
     return job
@@ -79,11 +153,28 @@ def run_now(job_id: int, session: Session = Depends(get_session), admin=Depends(
         raise HTTPException(status_code=404, detail="Job not found")
     new_session = models.Session(job_id=job.id, trigger="run_now", planned_start_at=datetime.utcnow())
     session.add(new_session)
+    session.flush()
+    publish(session, "session", new_session.id)
     session.commit()
     session.refresh(new_session)
     return new_session
 
 
+@router.post("/restore")
+def restore_jobs_bulk(
+    job_ids: Optional[List[int]] = Body(default=None, embed=True),
+    since: Optional[datetime] = None,
+    session: Session = Depends(get_session),
+    admin=Depends(require_password_reset),
+):
+    # Every job with a backup (or just `job_ids`) returns to its newest backup taken since `since`.
+    restored = restore_jobs(session, validate_job, job_ids, since)
+    if restored:
+        publish(session, "job")
+        session.commit()
+    return {"restored": restored}
+
+
 @router.post("/{job_id}/restore", response_model=models.Job)
 def restore_job(job_id: int, session: Session = Depends(get_session), admin=Depends(require_password_reset)):
     backup = session.exec(
@@ -94,13 +185,81 @@ def restore_job(job_id: int, session: Session = Depends(get_session), admin=Depe
     job = session.get(models.Job, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    restored = models.Job.model_validate_json(backup.backup_json)
-    for key, value in restored.model_dump(exclude={"id"}).items():
+    for key, value in restore_values(backup.backup_json).items():
         setattr(job, key, value)
-    job.status = "draft"
-    job.invalid_reasons = None
+    # Revalidated like an update: a backup of a tier the install no longer holds stays invalid.
+    reasons = validate_job(job, session)
+    job.status = "invalid" if reasons else "valid"
+    job.invalid_reasons = ", ".join(reasons) if reasons else None
     job.updated_at = datetime.utcnow()
     session.add(job)
+    publish(session, "job", job.id)
     session.commit()
     session.refresh(job)
     return job
+
+
+@router.get("/{job_id}/history")
+async def job_history(
+    job_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    rollups = (
+        await session.exec(
+            select(models.JobDailyRollup).where(
+                models.JobDailyRollup.job_id == job_id,
+                models.JobDailyRollup.day >= start,
+                models.JobDailyRollup.day <= end,
+            )
+        )
+    ).all()
+    days = {rollup.day: rollup_tally(rollup) for rollup in rollups}
+    # Archived history comes from the rollups; rows still in the (retention-bounded) hot tables
+    # are tallied the same way on the fly.
+    low, high = datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+    began = func.coalesce(models.Session.actual_start_at, models.Session.planned_start_at)
+    sessions = (
+        await session.execute(
+            select(
+                models.Session.job_id,
+                models.Session.state,
+                models.Session.actual_start_at,
+                models.Session.actual_end_at,
+                models.Session.planned_start_at,
+            ).where(models.Session.job_id == job_id, began >= low, began < high)
+        )
+    ).all()
+    events = (
+        await session.execute(
+            select(models.Event.level, models.Event.code, models.Event.ts, models.Session.job_id)
+            .join(models.Session, models.Session.id == models.Event.session_id)
+            .where(
+                models.Session.job_id == job_id,
+                models.Event.ts >= low,
+                models.Event.ts < high,
+                or_(models.Event.level == "error", models.Event.code == RESTART_CODE),
+            )
+        )
+    ).all()
+    live = new_tallies()
+    tally_sessions(live, sessions, datetime.utcnow())
+    tally_events(live, events)
+    for (_, day), tally in live.items():
+        days.setdefault(day, DayTally()).add(tally)
+    totals = DayTally()
+    for tally in days.values():
+        totals.add(tally)
+    return {
+        "job_id": job_id,
+        "start": start,
+        "end": end,
+        "days": [report_day(day, days[day]) for day in sorted(days)],
+        "totals": {key: value for key, value in report_day(start, totals).items() if key != "day"},
+    }
@@ -6,6 +6,8 @@ from sqlmodel import Session, select
 from .. import models
 from ..auth import require_password_reset
 from ..deps import get_session
+from ..pipeline import refresh_pipelines
+from ..renditions import invalidate_renditions
 
 router = APIRouter(prefix="/presets", tags=["presets"])
 
@@ -24,11 +26,27 @@ def list_presets(session: Session = Depends(get_session), admin=Depends(require_
     return session.exec(select(models.Preset)).all()
 
 
+@router.patch("/{preset_id}", response_model=models.Preset)
+def update_preset(preset_id: int, payload: models.PresetBase, session: Session = Depends(get_session), admin=Depends(require_password_reset)):
+    preset = session.get(models.Preset, preset_id)
+    if not preset:
+        raise HTTPException(status_code=404, detail="Preset not found")
+    for key, value in payload.model_dump(exclude_unset=True).items():
+        setattr(preset, key, value)
+    invalidate_renditions(session, preset_id=preset_id)
+    refresh_pipelines(session, preset_id=preset_id)
+    session.add(preset)
+    session.commit()
+    session.refresh(preset)
+    return preset
+
+
 @router.delete("/{preset_id}")
 def delete_preset(preset_id: int, session: Session = Depends(get_session), admin=Depends(require_password_reset)):
     preset = session.get(models.Preset, preset_id)
     if not preset:
         raise HTTPException(status_code=404, detail="Preset not found")
+    invalidate_renditions(session, preset_id=preset_id)
     session.delete(preset)
     session.commit()
     return {"status": "deleted"}
@@ -1,12 +1,16 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import models
 from ..auth import require_password_reset
-from ..deps import get_session
+from ..deps import get_async_session, get_session
+from ..notify import publish
+from ..pagination import DEFAULT_PAGE_SIZE, Page
+from ..recurrence import RECURRING_TYPES, next_fire_time
 
 router = APIRouter(prefix="/schedules", tags=["schedules"])
 
@@ -16,15 +20,42 @@ def create_schedule(payload: models.ScheduleBase, session: Session = Depends(get
     job = session.get(models.Job, payload.job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    if payload.end_at is None and not job.loop_enabled:
+    recurring = payload.type in RECURRING_TYPES
+    open_ended = payload.duration_s is None if recurring else payload.end_at is None
+    if open_ended and not job.loop_enabled:
         raise HTTPException(status_code=400, detail="Open-ended schedules require loop enabled")
+    try:
+        # Recurring schedules created with a past start begin at their next upcoming occurrence.
+        next_fire = next_fire_time(payload, datetime.utcnow() if recurring else None)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if next_fire is None:
+        raise HTTPException(status_code=400, detail="Recurrence rule never fires")
     schedule = models.Schedule.from_orm(payload)
+    schedule.next_fire_at = next_fire if schedule.enabled else None
     session.add(schedule)
+    session.flush()
+    publish(session, "schedule", schedule.id)
     session.commit()
     session.refresh(schedule)
     return schedule
 
 
 @router.get("/", response_model=List[models.Schedule])
-def list_schedules(session: Session = Depends(get_session), admin=Depends(require_password_reset)):
-    return session.exec(select(models.Schedule)).all()
+async def list_schedules(
+    response: Response,
+    job_id: Optional[int] = None,
+    enabled: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    page = Page(models.Schedule, [models.Schedule.id], cursor, limit, fields, descending=False)
+    rows = await page.fetch_async(
+        session,
+        models.Schedule.job_id == job_id if job_id is not None else None,
+        models.Schedule.enabled == enabled if enabled is not None else None,
+    )
+    return page.respond(rows, response)
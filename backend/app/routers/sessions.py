@@ -1,15 +1,141 @@
-from typing import List
+import asyncio
+import calendar
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import models
 from ..auth import require_password_reset
-from ..deps import get_session
+from ..deps import get_async_session
+from ..logstore import read_range, read_tail, session_log_dir
+from ..pagination import DEFAULT_PAGE_SIZE, Page
+from ..stream import broker
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
+MAX_METRIC_POINTS = 2000
+MAX_LOG_READ = 1024 * 1024
+
 
 @router.get("/", response_model=List[models.Session])
-def list_sessions(session: Session = Depends(get_session), admin=Depends(require_password_reset)):
-    return session.exec(select(models.Session)).all()
+async def list_sessions(
+    response: Response,
+    state: Optional[str] = None,
+    job_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    page = Page(models.Session, [models.Session.id], cursor, limit, fields)
+    rows = await page.fetch_async(
+        session,
+        models.Session.state == state if state else None,
+        models.Session.job_id == job_id if job_id is not None else None,
+        models.Session.planned_start_at >= since if since else None,
+        models.Session.planned_start_at < until if until else None,
+    )
+    return page.respond(rows, response)
+
+
+@router.get("/stream")
+async def stream_sessions(
+    job_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+    after: Optional[int] = None,
+    last_event_id: Optional[int] = Header(default=None),
+    admin=Depends(require_password_reset),
+):
+    # Server-Sent Events: a snapshot of live sessions, then session changes and new events as they
+    # happen. Event messages carry their id, so a reconnecting EventSource resumes after the last one.
+    return StreamingResponse(
+        broker.stream(job_id, session_id, last_event_id if last_event_id is not None else after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{session_id}/metrics")
+async def session_metrics(
+    session_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: int = 60,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    if not await session.get(models.Session, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=1)
+    start_ts = calendar.timegm(start.utctimetuple())
+    end_ts = calendar.timegm(end.utctimetuple())
+    if end_ts <= start_ts:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    resolution = max(resolution, 1, math.ceil((end_ts - start_ts) / MAX_METRIC_POINTS))
+    metric = models.SessionMetric
+    bucket = (metric.bucket_ts - metric.bucket_ts % resolution).label("bucket")
+    stmt = (
+        select(
+            bucket,
+            func.avg(metric.bitrate_kbps),
+            func.avg(metric.fps),
+            func.avg(metric.speed),
+            func.max(metric.drop_frames),
+            func.max(metric.dup_frames),
+        )
+        .where(metric.session_id == session_id, metric.bucket_ts >= start_ts, metric.bucket_ts < end_ts)
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    rows = (await session.exec(stmt)).all()
+    return {
+        "session_id": session_id,
+        "resolution_s": resolution,
+        "points": [
+            {
+                "ts": datetime.utcfromtimestamp(ts),
+                "bitrate_kbps": bitrate,
+                "fps": fps,
+                "speed": speed,
+                "drop_frames": drops,
+                "dup_frames": dups,
+            }
+            for ts, bitrate, fps, speed, drops, dups in rows
+        ],
+    }
+
+
+@router.get("/{session_id}/logs")
+async def session_logs(
+    session_id: int,
+    offset: int = 0,
+    length: int = 64 * 1024,
+    tail: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(require_password_reset),
+):
+    if not await session.get(models.Session, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    if offset < 0 or length < 0 or (tail is not None and tail < 0):
+        raise HTTPException(status_code=400, detail="offset, length and tail must be non-negative")
+    directory = session_log_dir(session_id)
+    length = min(length, MAX_LOG_READ)
+    if tail is not None:
+        start, size, data = await asyncio.to_thread(read_tail, directory, min(tail, MAX_LOG_READ))
+    else:
+        start, size, data = await asyncio.to_thread(read_range, directory, offset, length)
+    return Response(
+        content=data,
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Log-Start": str(start), "X-Log-End": str(start + len(data)), "X-Log-Size": str(size)},
+    )
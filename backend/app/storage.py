@@ -18,6 +18,10 @@ def ensure_data_folders() -> None:
         path = base / "assets" / sub
         path.mkdir(parents=True, exist_ok=True)
     (base / "logs").mkdir(parents=True, exist_ok=True)
+    (base / "renditions").mkdir(parents=True, exist_ok=True)
+    (base / "uploads").mkdir(parents=True, exist_ok=True)
+    (base / "thumbnails").mkdir(parents=True, exist_ok=True)
+    (base / "playlists").mkdir(parents=True, exist_ok=True)
 
 
 def default_asset_path(asset_type: str, filename: str) -> str:
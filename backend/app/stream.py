@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .config import get_settings
+from .database import async_engine
+from .models import Event, Session as RunSession
+
+LIVE_STATES = ("queued", "starting", "running")
+# What clients see of a session. Lease renewals and heartbeats alone change none of these, so
+# they are not pushed; a heartbeat that moves the stream position is.
+SESSION_FIELDS = (
+    "id",
+    "job_id",
+    "schedule_id",
+    "trigger",
+    "state",
+    "runner_id",
+    "ffmpeg_pid",
+    "planned_start_at",
+    "planned_end_at",
+    "actual_start_at",
+    "actual_end_at",
+    "stop_reason",
+    "position_s",
+    "current_loop_index",
+    "next_loop_eta_s",
+)
+# Runners commit event batches concurrently, so a lower id can become visible after a higher one.
+# Ids missing below the newest one seen are waited for this long before they are given up on.
+EVENT_GRACE = timedelta(seconds=30)
+REPLAY_LIMIT = 10000
+
+Message = Tuple[str, Optional[int], object]
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def encode(kind: str, message_id: Optional[int], data) -> str:
+    head = f"id: {message_id}\n" if message_id is not None else ""
+    return f"{head}event: {kind}\ndata: {json.dumps(jsonable_encoder(data), separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    def __init__(self, job_id: Optional[int], session_id: Optional[int]):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.stream_client_queue)
+        self.closed = False
+
+    def wants(self, job_id: int, session_id: int) -> bool:
+        return (self.job_id is None or self.job_id == job_id) and (
+            self.session_id is None or self.session_id == session_id
+        )
+
+    def offer(self, message: Message) -> None:
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A client that cannot keep up is cut off rather than buffered without bound; it
+            # reconnects with Last-Event-ID and replays what it missed from the event table.
+            self.close()
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class SessionBroker:
+    # One poll loop reads session changes and new events for every connected client, so database
+    # load does not grow with the number of viewers. It only runs while someone is subscribed.
+    def __init__(self, engine=async_engine):
+        self.engine = engine
+        self.subscribers: Set[Subscriber] = set()
+        self.sessions: Dict[int, Dict] = {}
+        # Every event id up to `floor` is settled; above it, `sent` holds the ids already published
+        # and `gaps` the ids not seen yet, with when they were first missed.
+        self.floor: Optional[int] = None
+        self.last_event_id = 0
+        self.sent: Set[int] = set()
+        self.gaps: Dict[int, datetime] = {}
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def subscribe(self, job_id: Optional[int] = None, session_id: Optional[int] = None) -> Subscriber:
+        subscriber = Subscriber(job_id, session_id)
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._ready.clear()
+            self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def snapshot(self, subscriber: Subscriber) -> List[Dict]:
+        return [row for row in self.sessions.values() if subscriber.wants(row["job_id"], row["id"])]
+
+    def publish(self, kind: str, message_id: Optional[int], data: Dict) -> None:
+        for subscriber in list(self.subscribers):
+            if subscriber.wants(data["job_id"], data["session_id" if kind == "event" else "id"]):
+                subscriber.offer((kind, message_id, data))
+
+    async def _run(self) -> None:
+        self.sessions, self.floor, self.sent, self.gaps = {}, None, set(), {}
+        while self.subscribers:
+            try:
+                await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Polling session changes failed")
+            self._ready.set()
+            await asyncio.sleep(settings.stream_poll_seconds)
+
+    async def _poll(self) -> None:
+        columns = [RunSession.__table__.c[name] for name in SESSION_FIELDS]
+        async with AsyncSession(self.engine) as db:
+            rows = (await db.execute(select(*columns).where(RunSession.state.in_(LIVE_STATES)))).all()
+            current = {row.id: dict(row._mapping) for row in rows}
+            # Sessions that left the live states are read once more to report how they ended.
+            ended = [session_id for session_id in self.sessions if session_id not in current]
+            if ended:
+                rows = (await db.execute(select(*columns).where(RunSession.id.in_(ended)))).all()
+                current.update({row.id: dict(row._mapping) for row in rows})
+            first = self.floor is None
+            if first:
+                self.floor = self.last_event_id = (await db.execute(select(func.max(Event.id)))).scalar() or 0
+                events = []
+            else:
+                # Only ids above the oldest one still awaited are read, so a quiet poll reads nothing.
+                events = (
+                    await db.execute(
+                        select(Event.__table__, RunSession.job_id)
+                        .join(RunSession, RunSession.id == Event.session_id)
+                        .where(Event.id > self.floor)
+                        .order_by(Event.id)
+                    )
+                ).all()
+        # The first poll only records where things stand; subscribers get that as their snapshot.
+        for session_id, row in current.items():
+            before = self.sessions.get(session_id)
+            changes = {key: value for key, value in row.items() if before is None or before[key] != value}
+            if changes and not first:
+                self.publish("session", None, {**changes, "id": session_id, "job_id": row["job_id"]})
+        for row in events:
+            if row.id not in self.sent:
+                self.sent.add(row.id)
+                self.publish("event", row.id, dict(row._mapping))
+        self.sessions = {session_id: row for session_id, row in current.items() if row["state"] in LIVE_STATES}
+        self._settle(datetime.utcnow())
+
+    def _settle(self, now: datetime) -> None:
+        newest = max(self.sent, default=self.last_event_id)
+        for event_id in range(self.last_event_id + 1, newest):
+            if event_id not in self.sent:
+                self.gaps[event_id] = now
+        self.last_event_id = max(self.last_event_id, newest)
+        # A gap is filled when its event shows up, and given up on (a rolled-back batch) after the grace.
+        self.gaps = {event_id: at for event_id, at in self.gaps.items() if event_id not in self.sent and now - at < EVENT_GRACE}
+        self.floor = min(self.gaps) - 1 if self.gaps else self.last_event_id
+        self.sent = {event_id for event_id in self.sent if event_id > self.floor}
+
+    async def replay(self, subscriber: Subscriber, after: int) -> Tuple[List[Dict], bool]:
+        conditions = [Event.id > after]
+        if subscriber.job_id is not None:
+            conditions.append(RunSession.job_id == subscriber.job_id)
+        if subscriber.session_id is not None:
+            conditions.append(Event.session_id == subscriber.session_id)
+        async with AsyncSession(self.engine) as db:
+            rows = (
+                await db.execute(
+                    select(Event.__table__, RunSession.job_id)
+                    .join(RunSession, RunSession.id == Event.session_id)
+                    .where(*conditions)
+                    .order_by(Event.id.desc())
+                    .limit(REPLAY_LIMIT + 1)
+                )
+            ).all()
+        truncated = len(rows) > REPLAY_LIMIT
+        return [dict(row._mapping) for row in reversed(rows[:REPLAY_LIMIT])], truncated
+
+    async def stream(
+        self, job_id: Optional[int] = None, session_id: Optional[int] = None, after: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        subscriber = await self.subscribe(job_id, session_id)
+        try:
+            yield f"retry: {int(settings.stream_poll_seconds * 1000)}\n\n"
+            yield encode("snapshot", None, self.snapshot(subscriber))
+            replayed: Set[int] = set()
+            if after is not None:
+                events, truncated = await self.replay(subscriber, after)
+                if truncated:
+                    yield encode("gap", None, {"after": after})
+                for row in events:
+                    replayed.add(row["id"])
+                    yield encode("event", row["id"], row)
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), settings.stream_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None or subscriber.closed:
+                    break
+                kind, message_id, data = message
+                if message_id not in replayed:
+                    yield encode(kind, message_id, data)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+broker = SessionBroker()
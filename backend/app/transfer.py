@@ -0,0 +1,283 @@
+import json
+import zlib
+from datetime import date, datetime
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Date, DateTime, bindparam, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import Session
+
+from .models import Asset, AssetBase, Destination, DestinationBase, Job, JobBase, Preset, PresetBase, Schedule, ScheduleBase
+from .notify import publish
+from .pipeline import preload_references
+from .recurrence import RECURRING_TYPES, next_fire_time
+
+# Sections in dependency order, each with the natural key an import matches existing rows on.
+SECTIONS = {
+    "assets": (Asset, ("path",)),
+    "destinations": (Destination, ("name",)),
+    "presets": (Preset, ("name",)),
+    "jobs": (Job, ("name",)),
+    "schedules": (Schedule, ("job_id", "type", "start_at")),
+}
+# Only configuration travels: the API's create fields, plus the id that references are remapped by.
+# Runtime state (probe claims, fire times, pipeline decisions) is recomputed by the importing install.
+CONFIG_FIELDS = {
+    section: ("id", *base.model_fields)
+    for section, base in (
+        ("assets", AssetBase),
+        ("destinations", DestinationBase),
+        ("presets", PresetBase),
+        ("jobs", JobBase),
+        ("schedules", ScheduleBase),
+    )
+}
+# Written on insert and update alike: imported assets are probed again on this install.
+RESET_ON_IMPORT = {"assets": {"probe_status": "pending", "probe_runner_id": None, "probe_error": None}}
+# Change notices an import sends for each section it touched, so runners pick the changes up.
+NOTICES = {"assets": "asset", "jobs": "job", "schedules": "schedule"}
+# Exported foreign keys hold the exporting install's ids; an import maps them to its own.
+REFERENCES = {
+    "jobs": {"destination_id": "destinations", "video_asset_id": "assets", "audio_asset_id": "assets", "preset_id": "presets"},
+    "schedules": {"job_id": "jobs"},
+}
+EXPORT_BATCH = 1000
+IMPORT_BATCH = 1000
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class ConfigImportError(ValueError):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def export_lines(engine) -> Iterator[bytes]:
+    # Rows are streamed from a server-side cursor, so memory stays flat however large the install.
+    with engine.connect() as conn:
+        for section, (model, _) in SECTIONS.items():
+            table = model.__table__
+            columns = [table.c[name] for name in CONFIG_FIELDS[section]]
+            result = conn.execution_options(yield_per=EXPORT_BATCH).execute(select(*columns).order_by(table.c.id))
+            for rows in result.partitions():
+                yield "".join(
+                    json.dumps({"section": section, "row": dict(row._mapping)}, default=_json_default, separators=(",", ":"))
+                    + "\n"
+                    for row in rows
+                ).encode()
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str, Dict]]:
+    decompressor = None
+    pending, line_no, first = b"", 0, True
+    async for chunk in chunks:
+        if first and chunk:
+            first = False
+            if chunk[:2] == GZIP_MAGIC:
+                decompressor = zlib.decompressobj(wbits=31)
+        pending += decompressor.decompress(chunk) if decompressor else chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield _record(line_no, line)
+    if decompressor:
+        pending += decompressor.flush()
+    if pending.strip():
+        yield _record(line_no + 1, pending)
+
+
+def _record(line_no: int, line: bytes) -> Tuple[int, str, Dict]:
+    try:
+        record = json.loads(line)
+        section, row = record["section"], record["row"]
+    except (ValueError, KeyError, TypeError):
+        raise ConfigImportError(f"line {line_no}: expected {{\"section\": ..., \"row\": {{...}}}}")
+    if section not in SECTIONS or not isinstance(row, dict):
+        raise ConfigImportError(f"line {line_no}: unknown section {section!r}")
+    return line_no, section, row
+
+
+def legacy_records(data: Dict) -> Iterator[Tuple[int, str, Dict]]:
+    # The previous export format: one JSON object holding a list per section.
+    for section in SECTIONS:
+        for index, row in enumerate(data.get(section, [])):
+            yield index + 1, section, row
+
+
+@lru_cache()
+def _columns(section: str) -> List[Tuple[str, object, Optional[Callable]]]:
+    # Other columns in a row (older exports carried runtime state) are ignored.
+    model = SECTIONS[section][0]
+    parsers = [(DateTime, datetime.fromisoformat), (Date, date.fromisoformat)]
+    return [
+        (column.name, model.model_fields[column.name], next((parse for kind, parse in parsers if isinstance(column.type, kind)), None))
+        for column in model.__table__.columns
+        if column.name in CONFIG_FIELDS[section] and column.name != "id"
+    ]
+
+
+class ConfigImporter:
+    # Upserts rows a batch at a time inside the caller's transaction: one lookup by natural key,
+    # one multi-row INSERT ... RETURNING and one executemany UPDATE per batch. Each jobs batch is then
+    # revalidated with `validate` (which also decides the pipeline) and each schedules batch gets its
+    # next fire time.
+    def __init__(self, conn: AsyncConnection, validate: Callable[[Job, Session], List[str]]):
+        self.conn = conn
+        self.validate = validate
+        self.ids: Dict[str, Dict[int, int]] = {}
+        self.created: Dict[str, int] = dict.fromkeys(SECTIONS, 0)
+        self.updated: Dict[str, int] = dict.fromkeys(SECTIONS, 0)
+        self.section: Optional[str] = None
+        self.batch: List[Tuple[int, Dict]] = []
+
+    async def add(self, line_no: int, section: str, row: Dict) -> None:
+        if section != self.section or len(self.batch) >= IMPORT_BATCH:
+            await self.flush()
+            if section != self.section and (section in self.ids or self._after(section)):
+                raise ConfigImportError(f"line {line_no}: sections must come in the order {', '.join(SECTIONS)}")
+            self.section = section
+            self.ids.setdefault(section, {})
+        self.batch.append((line_no, row))
+
+    def _after(self, section: str) -> bool:
+        order = list(SECTIONS)
+        return any(order.index(seen) > order.index(section) for seen in self.ids)
+
+    async def flush(self) -> None:
+        if not self.batch:
+            return
+        section, batch = self.section, self.batch
+        self.batch = []
+        model, keys = SECTIONS[section]
+        table = model.__table__
+        rows = [(line_no, raw.get("id"), self._row(section, line_no, raw)) for line_no, raw in batch]
+        key_columns = [table.c[key] for key in keys]
+        wanted = {tuple(row[key] for key in keys) for _, _, row in rows}
+        matches = (
+            key_columns[0].in_([key[0] for key in wanted])
+            if len(keys) == 1
+            else tuple_(*key_columns).in_(list(wanted))
+        )
+        existing: Dict[Tuple, int] = {}
+        # Older imports could leave duplicates behind; the oldest row with a key is the one kept up to date.
+        for found in await self.conn.execute(select(table.c.id, *key_columns).where(matches).order_by(table.c.id.desc())):
+            existing[tuple(found[1:])] = found.id
+        # Later lines win when one batch repeats a key.
+        latest: Dict[Tuple, Dict] = {}
+        for _, _, row in rows:
+            latest[tuple(row[key] for key in keys)] = row
+        inserts = [row for key, row in latest.items() if key not in existing]
+        updates = [{"_id": existing[key], **row} for key, row in latest.items() if key in existing]
+        if inserts:
+            result = await self.conn.execute(insert(table).returning(table.c.id, *key_columns), inserts)
+            existing.update({tuple(created[1:]): created.id for created in result})
+            self.created[section] += len(inserts)
+        if updates:
+            columns = [name for name in updates[0] if name != "_id"]
+            statement = (
+                update(table)
+                .where(table.c.id == bindparam("_id"))
+                .values({name: bindparam(f"_{name}") for name in columns})
+            )
+            await self.conn.execute(
+                statement, [{"_id": row["_id"], **{f"_{name}": row[name] for name in columns}} for row in updates]
+            )
+            self.updated[section] += len(updates)
+        ids = self.ids[section]
+        lines: Dict[int, int] = {}
+        for line_no, old_id, row in rows:
+            new_id = existing[tuple(row[key] for key in keys)]
+            lines[new_id] = line_no
+            if old_id is not None:
+                ids[old_id] = new_id
+        if section == "jobs":
+            await self.conn.run_sync(self._validate_jobs, list(lines))
+        elif section == "schedules":
+            await self._schedule_fire_times(lines)
+
+    def _validate_jobs(self, conn, job_ids: List[int]) -> None:
+        # The ORM session joins the import's transaction; validate_job needs one for its lookups.
+        with Session(bind=conn) as session:
+            jobs = session.scalars(select(Job).where(Job.id.in_(job_ids))).all()
+            loaded = preload_references(session, jobs)
+            now = datetime.utcnow()
+            for job in jobs:
+                reasons = self.validate(job, session)
+                job.status = "invalid" if reasons else "valid"
+                job.invalid_reasons = ", ".join(reasons) if reasons else None
+                job.updated_at = now
+            session.flush()
+            del loaded
+
+    async def _schedule_fire_times(self, lines: Dict[int, int]) -> None:
+        # Matched schedules keep their local last_fired_at, so a one-time schedule that already ran
+        # is not fired again.
+        table = Schedule.__table__
+        now = datetime.utcnow()
+        params = []
+        for schedule in await self.conn.execute(select(table).where(table.c.id.in_(list(lines)))):
+            next_fire = None
+            if schedule.enabled:
+                after = schedule.last_fired_at
+                if schedule.type in RECURRING_TYPES:
+                    after = max(after, now) if after else now
+                try:
+                    next_fire = next_fire_time(schedule, after)
+                except ValueError as exc:
+                    raise ConfigImportError(f"line {lines[schedule.id]}: {exc}")
+            params.append({"_id": schedule.id, "_next_fire_at": next_fire})
+        await self.conn.execute(
+            update(table).where(table.c.id == bindparam("_id")).values(next_fire_at=bindparam("_next_fire_at")), params
+        )
+
+    async def notify(self) -> None:
+        # Queued in the import's transaction, so listeners hear about it once the import commits.
+        kinds = [kind for section, kind in NOTICES.items() if self.created[section] or self.updated[section]]
+        if kinds:
+            await self.conn.run_sync(self._publish, kinds)
+
+    def _publish(self, conn, kinds: List[str]) -> None:
+        with Session(bind=conn) as session:
+            for kind in kinds:
+                publish(session, kind)
+            session.flush()
+
+    def _row(self, section: str, line_no: int, raw: Dict) -> Dict:
+        row = {}
+        for name, field, parse in _columns(section):
+            if name in raw:
+                value = raw[name]
+                if parse and isinstance(value, str):
+                    try:
+                        value = parse(value)
+                    except ValueError:
+                        raise ConfigImportError(f"line {line_no}: {name} is not an ISO timestamp")
+            elif field.is_required():
+                raise ConfigImportError(f"line {line_no}: {section} row is missing {name}")
+            else:
+                value = field.get_default(call_default_factory=True)
+            row[name] = value
+        for name, target in REFERENCES.get(section, {}).items():
+            # A reference into a section the import carries must resolve to one of its rows; without
+            # that section the id is taken to be this install's own.
+            if row[name] is not None and target in self.ids:
+                if row[name] not in self.ids[target]:
+                    raise ConfigImportError(f"line {line_no}: {name} {row[name]} is not among the imported {target}")
+                row[name] = self.ids[target][row[name]]
+        row.update(RESET_ON_IMPORT.get(section, {}))
+        return row
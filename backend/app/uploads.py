@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .config import get_settings
+
+HASH_BLOCK = 1024 * 1024
+# A PUT holds an upload while its "receiving" claim is fresh; it renews the claim well inside
+# this window, and a claim left behind by a crashed worker can be taken over once it lapses.
+CLAIM_SECONDS = 60
+HASHER_CACHE_SIZE = 256
+# upload id -> (offset, running sha256); lets consecutive chunks continue the hash without
+# re-reading the file. Another worker, a restart or eviction rebuilds it from the partial file
+# once. Bounded, since uploads abandoned here are expired by the runner, not this process.
+_hashers: "OrderedDict[str, Tuple[int, hashlib._Hash]]" = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def part_path(upload_id: str) -> Path:
+    return Path(get_settings().data_dir) / "uploads" / f"{upload_id}.part"
+
+
+def unique_path(path: Path, suffix: str) -> Path:
+    if not path.exists():
+        return path
+    return path.with_name(f"{path.stem}-{suffix}{path.suffix}")
+
+
+def _cache_hasher(upload_id: str, offset: int, hasher) -> None:
+    with _hashers_lock:
+        _hashers[upload_id] = (offset, hasher)
+        _hashers.move_to_end(upload_id)
+        while len(_hashers) > HASHER_CACHE_SIZE:
+            _hashers.popitem(last=False)
+
+
+def _forget_hasher(upload_id: str) -> None:
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+
+
+def _resume_hasher(upload_id: str, path: Path, offset: int):
+    with _hashers_lock:
+        cached = _hashers.pop(upload_id, None)
+    if cached and cached[0] == offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    with open(path, "rb") as fh:
+        remaining = offset
+        while remaining:
+            block = fh.read(min(HASH_BLOCK, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+class UploadSink:
+    # Blocking file work; callers drive it through asyncio.to_thread.
+    def __init__(self, upload_id: str, offset: int):
+        self.upload_id = upload_id
+        self.path = part_path(upload_id)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch()
+        # The database offset is authoritative: bytes past it came from an interrupted request.
+        self.fh = open(self.path, "r+b")
+        self.fh.truncate(offset)
+        self.fh.seek(offset)
+        self.offset = offset
+        self.hasher = _resume_hasher(upload_id, self.path, offset)
+
+    def write(self, chunk: bytes) -> None:
+        self.fh.write(chunk)
+        self.hasher.update(chunk)
+        self.offset += len(chunk)
+
+    def close(self, keep_hash: bool = True) -> None:
+        # A writer that lost its claim must not leave its hash state for the next chunk.
+        self.fh.close()
+        if keep_hash:
+            _cache_hasher(self.upload_id, self.offset, self.hasher)
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
+
+
+def discard(upload_id: str) -> None:
+    _forget_hasher(upload_id)
+    part_path(upload_id).unlink(missing_ok=True)
+
+
+def store(upload_id: str, target: Path, duplicate_of: Optional[str] = None) -> Path:
+    # Returns where the asset now lives; duplicates share the existing file's inode.
+    target.parent.mkdir(parents=True, exist_ok=True)
+    source = part_path(upload_id)
+    if duplicate_of:
+        try:
+            os.link(duplicate_of, target)
+        except OSError:
+            # Different filesystem (or no hardlink support): point at the existing copy instead.
+            target = Path(duplicate_of)
+        discard(upload_id)
+        return target
+    os.replace(source, target)
+    _forget_hasher(upload_id)
+    return target
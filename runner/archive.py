@@ -0,0 +1,139 @@
+import asyncio
+import shutil
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app.config import get_settings
+from backend.app.history import (
+    ARCHIVED_STATES,
+    Tallies,
+    merge_rollup,
+    new_tallies,
+    tally_events,
+    tally_sessions,
+    write_archive,
+)
+from backend.app.logstore import session_log_dir
+from backend.app.models import (
+    Event,
+    FFmpegLog,
+    JobDailyRollup,
+    LicenseActivity,
+    Session as RunSession,
+    SessionMetric,
+)
+
+settings = get_settings()
+
+
+def _dicts(rows) -> List[Dict]:
+    return [dict(row._mapping) for row in rows]
+
+
+def _day(field: str):
+    return lambda row: row[field].date()
+
+
+async def _store_rollups(db: AsyncSession, tallies: Tallies) -> None:
+    for (job_id, day), tally in tallies.items():
+        db.add(merge_rollup(await db.get(JobDailyRollup, (job_id, day)), job_id, day, tally))
+
+
+async def archive_sessions(db: AsyncSession, cutoff: datetime) -> int:
+    # Finished sessions leave with everything hanging off them, after their totals are rolled up.
+    sessions = (
+        await db.execute(
+            select(RunSession.__table__)
+            .where(
+                RunSession.state.in_(ARCHIVED_STATES),
+                func.coalesce(RunSession.actual_end_at, RunSession.planned_start_at) < cutoff,
+            )
+            .order_by(RunSession.id)
+            .limit(settings.history_archive_batch)
+        )
+    ).all()
+    if not sessions:
+        return 0
+    ids = [row.id for row in sessions]
+    events = (
+        await db.execute(
+            select(Event.__table__, RunSession.job_id)
+            .join(RunSession, RunSession.id == Event.session_id)
+            .where(Event.session_id.in_(ids))
+        )
+    ).all()
+    metrics = (await db.execute(select(SessionMetric.__table__).where(SessionMetric.session_id.in_(ids)))).all()
+    logs = (await db.execute(select(FFmpegLog.__table__).where(FFmpegLog.session_id.in_(ids)))).all()
+    tallies = new_tallies()
+    tally_sessions(tallies, sessions)
+    tally_events(tallies, events)
+
+    def write() -> None:
+        write_archive("session", _dicts(sessions), lambda row: (row["actual_start_at"] or row["planned_start_at"]).date())
+        write_archive("event", _dicts(events), _day("ts"))
+        write_archive("sessionmetric", _dicts(metrics), lambda row: datetime.utcfromtimestamp(row["bucket_ts"]).date())
+        write_archive("ffmpeglog", _dicts(logs), _day("started_at"))
+
+    # Archive first: a failed commit leaves duplicates in the archive, never a gap.
+    await asyncio.to_thread(write)
+    await _store_rollups(db, tallies)
+    await db.execute(delete(Event).where(Event.session_id.in_(ids)))
+    await db.execute(delete(SessionMetric).where(SessionMetric.session_id.in_(ids)))
+    await db.execute(delete(FFmpegLog).where(FFmpegLog.session_id.in_(ids)))
+    await db.execute(delete(RunSession).where(RunSession.id.in_(ids)))
+    await db.commit()
+    await asyncio.to_thread(lambda: [shutil.rmtree(session_log_dir(sid), ignore_errors=True) for sid in ids])
+    return len(ids)
+
+
+async def archive_events(db: AsyncSession, cutoff: datetime) -> int:
+    # Old events of sessions that are still live (or not yet archivable).
+    events = (
+        await db.execute(
+            select(Event.__table__, RunSession.job_id)
+            .join(RunSession, RunSession.id == Event.session_id)
+            .where(Event.ts < cutoff)
+            .order_by(Event.id)
+            .limit(settings.history_archive_batch)
+        )
+    ).all()
+    if not events:
+        return 0
+    tallies = new_tallies()
+    tally_events(tallies, events)
+    await asyncio.to_thread(write_archive, "event", _dicts(events), _day("ts"))
+    await _store_rollups(db, tallies)
+    await db.execute(delete(Event).where(Event.id.in_([row.id for row in events])))
+    await db.commit()
+    return len(events)
+
+
+async def archive_activity(db: AsyncSession, cutoff: datetime) -> int:
+    rows = (
+        await db.execute(
+            select(LicenseActivity.__table__)
+            .where(LicenseActivity.created_at < cutoff)
+            .order_by(LicenseActivity.created_at, LicenseActivity.id)
+            .limit(settings.history_archive_batch)
+        )
+    ).all()
+    if not rows:
+        return 0
+    await asyncio.to_thread(write_archive, "licenseactivity", _dicts(rows), _day("created_at"))
+    await db.execute(delete(LicenseActivity).where(LicenseActivity.id.in_([row.id for row in rows])))
+    await db.commit()
+    return len(rows)
+
+
+async def archive_history(db: AsyncSession) -> None:
+    if settings.history_retention_days <= 0:
+        return
+    cutoff = datetime.utcnow() - timedelta(days=settings.history_retention_days)
+    # Events go first, in their own batches, so a session batch only carries its few recent events.
+    for step in (archive_events, archive_sessions, archive_activity):
+        while await step(db, cutoff) >= settings.history_archive_batch:
+            pass
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import random
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from backend.app.models import Event
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+EVENT_COLUMNS = ["session_id", "level", "code", "message", "ts"]
+# Levels that are never sampled or dropped: they wait for buffer space instead.
+KEPT_LEVELS = ("warning", "error")
+
+
+class EventWriter:
+    # Buffers session events in memory and writes them in batches: one multi-row statement (COPY
+    # on Postgres) per flush instead of a commit per event. A flush happens once `batch_size`
+    # events are waiting or every `flush_seconds`, whichever comes first.
+    def __init__(
+        self,
+        max_buffer: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_seconds: Optional[float] = None,
+        debug_sample_rate: Optional[float] = None,
+    ):
+        self.max_buffer = max_buffer or settings.event_buffer_size
+        self.batch_size = batch_size or settings.event_batch_size
+        self.flush_seconds = flush_seconds if flush_seconds is not None else settings.event_flush_seconds
+        self.debug_sample_rate = debug_sample_rate if debug_sample_rate is not None else settings.event_debug_sample_rate
+        self.buffer: Deque[Dict] = deque()
+        self.wake = asyncio.Event()
+        self.space = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        self.closing = False
+        self.sampled_out = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def write(self, session_id: int, level: str, code: str, message: str) -> None:
+        if level == "debug" and random.random() >= self.debug_sample_rate:
+            self.sampled_out += 1
+            return
+        if len(self.buffer) >= self.max_buffer:
+            if level not in KEPT_LEVELS:
+                # Routine events are shed rather than stalling the stream they describe.
+                self.dropped += 1
+                return
+            # Backpressure: warnings and errors wait until the writer has drained some space.
+            async with self.space:
+                await self.space.wait_for(lambda: len(self.buffer) < self.max_buffer)
+        self.buffer.append(
+            {"session_id": session_id, "level": level, "code": code, "message": message, "ts": datetime.utcnow()}
+        )
+        if len(self.buffer) >= self.batch_size:
+            self.wake.set()
+
+    async def close(self) -> None:
+        # Drain everything still buffered so errors raised during shutdown reach the database.
+        if self.task:
+            # Stop the flush loop between batches rather than cancelling it: wait_for can swallow a
+            # cancel that races a set `wake`, and a cancelled COPY may already have committed.
+            self.closing = True
+            self.wake.set()
+            await asyncio.gather(self.task, return_exceptions=True)
+        while True:
+            while self.buffer:
+                if not await self.flush():
+                    for row in self.buffer:
+                        if row["level"] in KEPT_LEVELS:
+                            logger.error("Unsaved session %s event %s: %s", row["session_id"], row["code"], row["message"])
+                    self.buffer.clear()
+                    await self._release_space()
+            # Producers woken by the last flush append their event on their next turn; drain those too.
+            await asyncio.sleep(0)
+            if not self.buffer:
+                break
+        if self.sampled_out or self.dropped:
+            logger.info("Session events: %d debug sampled out, %d dropped while the buffer was full", self.sampled_out, self.dropped)
+
+    async def _run(self) -> None:
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            while self.buffer:
+                if not await self.flush():
+                    break
+                if len(self.buffer) < self.batch_size:
+                    break
+
+    async def flush(self) -> bool:
+        batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+        if not batch:
+            return True
+        try:
+            await self._insert(batch)
+        except asyncio.CancelledError:
+            self.buffer.extendleft(reversed(batch))
+            raise
+        except Exception:
+            logger.exception("Writing %d session events failed; retrying", len(batch))
+            # Put the batch back in order; the buffer may briefly exceed its bound until the next try.
+            self.buffer.extendleft(reversed(batch))
+            return False
+        await self._release_space()
+        return True
+
+    async def _release_space(self) -> None:
+        async with self.space:
+            self.space.notify_all()
+
+    async def _insert(self, batch: List[Dict]) -> None:
+        async with async_engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    Event.__tablename__, records=[tuple(row[name] for name in EVENT_COLUMNS) for row in batch], columns=EVENT_COLUMNS
+                )
+            else:
+                await conn.execute(insert(Event), batch)
+            await conn.commit()
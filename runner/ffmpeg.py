@@ -0,0 +1,83 @@
+from typing import List, Optional
+
+from backend.app.config import get_settings
+from backend.app.models import Asset, Destination, Job, Preset
+from backend.app.pipeline import COPY, FULL_TRANSCODE
+
+settings = get_settings()
+# Encoder settings for jobs that must transcode but have no preset (e.g. an HEVC source).
+DEFAULT_PRESET = Preset(name="default", mode="transcode")
+
+
+def destination_url(destination: Destination) -> str:
+    return f"{destination.rtmp_url.rstrip('/')}/{destination.stream_key_encrypted}"
+
+
+def video_args(preset: Preset, filters: bool = True) -> List[str]:
+    args = ["-c:v", "libx264", "-preset", preset.preset or "veryfast"]
+    if preset.video_bitrate:
+        args += ["-b:v", f"{preset.video_bitrate}k"]
+        if preset.use_safety_cap:
+            args += ["-maxrate", f"{preset.video_bitrate}k", "-bufsize", f"{preset.video_bitrate * 2}k"]
+    if preset.gop:
+        args += ["-g", str(preset.gop), "-keyint_min", str(preset.gop)]
+    if preset.profile:
+        args += ["-profile:v", preset.profile]
+    if preset.tune:
+        args += ["-tune", preset.tune]
+    if preset.scale and filters:
+        args += ["-vf", f"scale={preset.scale}"]
+    if preset.fps:
+        args += ["-r", f"{preset.fps:g}"]
+    return args + ["-pix_fmt", "yuv420p"]
+
+
+def audio_args(preset: Optional[Preset]) -> List[str]:
+    args = ["-c:a", "aac", "-b:a", f"{(preset.audio_bitrate if preset and preset.audio_bitrate else 128)}k"]
+    if preset and preset.audio_channels:
+        args += ["-ac", str(preset.audio_channels)]
+    if preset and preset.audio_rate:
+        args += ["-ar", str(preset.audio_rate)]
+    return args
+
+
+def build_command(
+    job: Job,
+    video: Asset,
+    destination: Destination,
+    preset: Optional[Preset] = None,
+    audio: Optional[Asset] = None,
+    rendition: Optional[str] = None,
+    start_s: float = 0.0,
+    playlist: Optional[str] = None,
+) -> List[str]:
+    cmd = [settings.ffmpeg_path, "-hide_banner", "-nostdin", "-loglevel", "warning", "-progress", "pipe:1", "-nostats", "-re"]
+    if playlist:
+        cmd += ["-f", "concat", "-safe", "0", "-i", playlist]
+    else:
+        if job.loop_enabled:
+            cmd += ["-stream_loop", "-1"]
+        if start_s:
+            cmd += ["-ss", f"{start_s:.6f}"]
+        # A rendition is already encoded with the preset, so it is stream-copied like a copy job.
+        cmd += ["-i", rendition or video.path]
+    replace_audio = audio is not None and job.audio_mode != "none"
+    if replace_audio:
+        cmd += ["-stream_loop", "-1", "-i", audio.path, "-map", "0:v:0", "-map", "1:a:0", "-shortest"]
+    if rendition:
+        copy_video = True
+    elif job.pipeline:
+        copy_video = job.pipeline != FULL_TRANSCODE
+    else:
+        # Jobs saved before pipeline analysis fall back to the preset mode.
+        copy_video = preset is None or preset.mode == "copy_default"
+    # A replacement track has to be re-encoded to fit the stream's audio settings.
+    if replace_audio:
+        copy_audio = False
+    elif job.pipeline and not rendition:
+        copy_audio = job.pipeline == COPY
+    else:
+        copy_audio = copy_video
+    cmd += ["-c:v", "copy"] if copy_video else video_args(preset or DEFAULT_PRESET)
+    cmd += ["-c:a", "copy"] if copy_audio else audio_args(preset)
+    return cmd + ["-f", "flv", destination_url(destination)]
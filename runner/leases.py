@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, or_, tuple_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from backend.app.models import Job, RunnerNode, Session as RunSession
+from backend.app.pipeline import FULL_TRANSCODE, PIPELINES
+
+settings = get_settings()
+RUNNER_ID = os.environ.get("RUNNER_ID", str(uuid.uuid4()))
+ACTIVE_STATES = ("queued", "starting", "running")
+
+logger = logging.getLogger(__name__)
+
+
+def runner_capacity() -> int:
+    return settings.runner_capacity or os.cpu_count() or 1
+
+
+def runner_capabilities() -> List[str]:
+    capabilities = [c.strip() for c in settings.runner_capabilities.split(",") if c.strip()]
+    unknown = set(capabilities) - set(PIPELINES)
+    if unknown:
+        raise ValueError(f"Unknown runner capabilities {sorted(unknown)}; expected some of {list(PIPELINES)}")
+    return capabilities
+
+
+def runnable(capabilities: List[str]):
+    # Jobs not analyzed yet may fall back to a transcoding preset, so only full transcoders take them.
+    if FULL_TRANSCODE in capabilities:
+        return or_(Job.pipeline.in_(capabilities), Job.pipeline == None)
+    return Job.pipeline.in_(capabilities)
+
+
+def lease_deadline(now: datetime) -> datetime:
+    return now + timedelta(seconds=settings.runner_lease_seconds)
+
+
+class Leases:
+    def __init__(self, runner_id: str = RUNNER_ID):
+        self.runner_id = runner_id
+        # session id -> fencing token we hold for it; every mutation we make is conditioned on it.
+        self.tokens: Dict[int, int] = {}
+        self.on_lost: Optional[Callable[[List[int]], Awaitable[None]]] = None
+        self._renewed_at = time.monotonic()
+
+    def guard(self, session_id: int):
+        return and_(RunSession.id == session_id, RunSession.fencing_token == self.tokens.get(session_id, -1))
+
+    def free_slots(self) -> int:
+        return runner_capacity() - len(self.tokens)
+
+    async def register(self, db: AsyncSession) -> None:
+        now = datetime.utcnow()
+        node = await db.get(RunnerNode, self.runner_id)
+        if not node:
+            node = RunnerNode(runner_id=self.runner_id, capacity=runner_capacity())
+        node.capacity = runner_capacity()
+        node.capabilities_json = json.dumps(runner_capabilities())
+        node.heartbeat_at = now
+        db.add(node)
+        # A restart under the same id lost its in-memory tokens; expire our old leases so
+        # the claim path re-adopts them immediately under fresh tokens.
+        await db.execute(
+            update(RunSession)
+            .where(RunSession.runner_id == self.runner_id, RunSession.state.in_(ACTIVE_STATES))
+            .values(lease_expires_at=now - timedelta(seconds=1))
+        )
+        await db.commit()
+
+    async def deregister(self, db: AsyncSession) -> None:
+        # Hand back claims that never started so other runners pick them up without waiting for expiry.
+        await db.execute(
+            update(RunSession)
+            .where(RunSession.runner_id == self.runner_id, RunSession.state == "queued")
+            .values(runner_id=None, lease_expires_at=None)
+        )
+        await db.execute(delete(RunnerNode).where(RunnerNode.runner_id == self.runner_id))
+        await db.commit()
+        self.tokens.clear()
+
+    async def claim(self, db: AsyncSession) -> List[RunSession]:
+        free = self.free_slots()
+        if free <= 0:
+            return []
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(RunSession.state == "queued", RunSession.runner_id == None),
+            RunSession.lease_expires_at < now,
+        )
+        ids = (
+            await db.exec(
+                select(RunSession.id)
+                .join(Job, Job.id == RunSession.job_id)
+                .where(
+                    RunSession.state.in_(ACTIVE_STATES),
+                    or_(RunSession.planned_start_at == None, RunSession.planned_start_at <= now),
+                    claimable,
+                    runnable(runner_capabilities()),
+                )
+                .order_by(RunSession.planned_start_at)
+                .limit(free)
+                .with_for_update(skip_locked=True, of=RunSession)
+            )
+        ).all()
+        if not ids:
+            await db.commit()
+            return []
+        # Compare-and-set: the predicate is re-checked by the UPDATE itself, so two runners
+        # racing for the same row cannot both win, and the winner gets a strictly larger token.
+        claimed = (
+            await db.execute(
+                update(RunSession)
+                .where(RunSession.id.in_(ids), RunSession.state.in_(ACTIVE_STATES), claimable)
+                .values(
+                    runner_id=self.runner_id,
+                    lease_expires_at=lease_deadline(now),
+                    fencing_token=RunSession.fencing_token + 1,
+                )
+                .returning(RunSession)
+            )
+        ).scalars().all()
+        await db.commit()
+        for session in claimed:
+            self.tokens[session.id] = session.fencing_token
+        return list(claimed)
+
+    async def release(self, db: AsyncSession, session_ids: List[int]) -> None:
+        for session_id in session_ids:
+            await db.execute(
+                update(RunSession)
+                .where(self.guard(session_id), RunSession.state == "queued")
+                .values(runner_id=None, lease_expires_at=None)
+            )
+            self.tokens.pop(session_id, None)
+        await db.commit()
+
+    def forget(self, session_id: int) -> None:
+        self.tokens.pop(session_id, None)
+
+    async def rebalance(self, db: AsyncSession) -> int:
+        # Capacity can shrink on restart; give back unstarted claims we can no longer run.
+        excess = -self.free_slots()
+        if excess <= 0 or not self.tokens:
+            return 0
+        ids = (
+            await db.exec(
+                select(RunSession.id)
+                .where(RunSession.id.in_(list(self.tokens)), RunSession.state == "queued")
+                .order_by(RunSession.planned_start_at.desc())
+                .limit(excess)
+            )
+        ).all()
+        await self.release(db, list(ids))
+        return len(ids)
+
+    async def renew(self, db: AsyncSession) -> List[int]:
+        now = datetime.utcnow()
+        await db.execute(update(RunnerNode).where(RunnerNode.runner_id == self.runner_id).values(heartbeat_at=now))
+        held = dict(self.tokens)
+        renewed = {}
+        if held:
+            # Only leases we still fence are extended: a session re-claimed under a newer token (by
+            # another runner, or a restarted process with our id) is left to its new owner.
+            rows = (
+                await db.execute(
+                    update(RunSession)
+                    .where(
+                        RunSession.runner_id == self.runner_id,
+                        tuple_(RunSession.id, RunSession.fencing_token).in_(list(held.items())),
+                    )
+                    .values(lease_expires_at=lease_deadline(now))
+                    .returning(RunSession.id)
+                )
+            ).all()
+            renewed = {row.id for row in rows}
+        await db.commit()
+        self._renewed_at = time.monotonic()
+        return [sid for sid, token in held.items() if sid not in renewed and self.tokens.get(sid) == token]
+
+    async def _drop(self, lost: List[int]) -> None:
+        for session_id in lost:
+            self.tokens.pop(session_id, None)
+        if lost:
+            logger.warning("Lost leases on sessions %s", lost)
+            if self.on_lost:
+                await self.on_lost(lost)
+
+    async def keep_alive(self) -> None:
+        interval = settings.runner_lease_seconds / 3
+        while True:
+            try:
+                async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                    await self._drop(await self.renew(db))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Lease renewal failed")
+                # Past our own lease another runner may already own these sessions: stand down.
+                if time.monotonic() - self._renewed_at > settings.runner_lease_seconds:
+                    await self._drop(list(self.tokens))
+            await asyncio.sleep(interval)
@@ -0,0 +1,118 @@
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional, Set
+
+from backend.app.config import get_settings
+from backend.app.logstore import ACTIVE_SUFFIX, list_segments, log_extent, segment_name, session_log_dir
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+LOG_CHUNK = 64 * 1024
+
+
+def pack_segment(path: Path) -> None:
+    packed = path.with_name(path.name + ".gz")
+    partial = packed.with_name(packed.name + ".part")
+    with open(path, "rb") as src, gzip.open(partial, "wb") as dst:
+        shutil.copyfileobj(src, dst, LOG_CHUNK)
+    os.replace(partial, packed)
+    path.unlink()
+
+
+def prune_segments(directory: Path) -> None:
+    segments = list_segments(directory)
+    for _, path in segments[: max(0, len(segments) - settings.log_keep_segments)]:
+        path.unlink(missing_ok=True)
+
+
+class SegmentLog:
+    # File IO runs on worker threads so a slow disk never stalls the event loop. `_io` orders it:
+    # a write still running after its pump was cancelled finishes before close() seals the file.
+    def __init__(self, session_id: int):
+        self.directory = session_log_dir(session_id)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = list_segments(self.directory)
+        _, self.size = log_extent(segments)
+        self._offset = self.size
+        self._fh = None
+        self._io = threading.Lock()
+        self._packing: Set[asyncio.Task] = set()
+        # An adopted session keeps appending to the segment the previous runner left open.
+        if segments and segments[-1][1].name.endswith(ACTIVE_SUFFIX):
+            self._offset = segments[-1][0]
+            self._fh = open(segments[-1][1], "ab")
+
+    @classmethod
+    async def open(cls, session_id: int) -> "SegmentLog":
+        return await asyncio.to_thread(cls, session_id)
+
+    async def write(self, data: bytes) -> None:
+        sealed = await asyncio.to_thread(self._append, data)
+        if sealed is not None:
+            self._pack_later(sealed)
+
+    def _append(self, data: bytes) -> Optional[Path]:
+        with self._io:
+            if self._fh is None:
+                self._offset = self.size
+                self._fh = open(self.directory / segment_name(self._offset), "ab")
+            self._fh.write(data)
+            self._fh.flush()
+            self.size += len(data)
+            if self.size - self._offset >= settings.log_segment_bytes:
+                return self._seal()
+            return None
+
+    def _seal(self) -> Path:
+        self._fh.close()
+        self._fh = None
+        return self.directory / segment_name(self._offset)
+
+    def _finish(self) -> Optional[Path]:
+        with self._io:
+            if self._fh is None:
+                return None
+            if self.size > self._offset:
+                return self._seal()
+            self._fh.close()
+            self._fh = None
+            return None
+
+    def _pack_later(self, path: Path) -> None:
+        # Compression gets its own thread so the pump goes straight back to draining FFmpeg's stderr.
+        task = asyncio.create_task(asyncio.to_thread(self._pack, path))
+        self._packing.add(task)
+        task.add_done_callback(self._packing.discard)
+
+    def _pack(self, path: Path) -> None:
+        try:
+            pack_segment(path)
+            prune_segments(self.directory)
+        except OSError:
+            logger.exception("Packing log segment %s failed", path)
+
+    async def close(self) -> None:
+        sealed = await asyncio.to_thread(self._finish)
+        if sealed is not None:
+            self._pack_later(sealed)
+        if self._packing:
+            await asyncio.gather(*self._packing, return_exceptions=True)
+
+
+async def pump_log(stream: asyncio.StreamReader, log: SegmentLog) -> None:
+    # Fixed-size reads: FFmpeg lines can be arbitrarily long and readline() would fail on them.
+    # The pipe keeps draining even if the disk fails, otherwise FFmpeg would block on stderr.
+    failed = False
+    while chunk := await stream.read(LOG_CHUNK):
+        if failed:
+            continue
+        try:
+            await log.write(chunk)
+        except OSError:
+            logger.exception("Writing FFmpeg log to %s failed", log.directory)
+            failed = True
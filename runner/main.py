@@ -1,85 +1,153 @@
 import asyncio
-import os
-import uuid
 from datetime import datetime, timedelta
 
-from sqlmodel import Session, select
+from sqlalchemy import insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from backend.app.config import get_settings
-from backend.app.database import engine
-from backend.app.models import Job, RunnerLock, Schedule, Session as RunSession
+from backend.app.database import async_engine, check_schema
+from backend.app.models import Schedule, Session as RunSession
+from backend.app.notify import ChangeListener
+from backend.app.recurrence import next_fire_time
+from runner.events import EventWriter
+from runner.leases import ACTIVE_STATES, Leases
+from runner.maintenance import keep_license, maintain
+from runner.probe import ProbeWorker
+from runner.renditions import RenditionBuilder
+from runner.supervisor import Supervisor
 
 settings = get_settings()
-RUNNER_ID = os.environ.get("RUNNER_ID", str(uuid.uuid4()))
 
 
-async def acquire_lock(db: Session) -> bool:
-    lock = db.get(RunnerLock, 1)
-    now = datetime.utcnow()
-    if not lock:
-        db.add(RunnerLock(lock_id=1, runner_id=RUNNER_ID, heartbeat_at=now))
-        db.commit()
-        return True
-    if (now - lock.heartbeat_at).total_seconds() > settings.runner_heartbeat_seconds:
-        lock.runner_id = RUNNER_ID
-        lock.heartbeat_at = now
-        db.add(lock)
-        db.commit()
-        return True
-    return lock.runner_id == RUNNER_ID
+def planned_end(schedule, fire_at: datetime):
+    if schedule.duration_s:
+        return fire_at + timedelta(seconds=schedule.duration_s)
+    return schedule.end_at
 
 
-def heartbeat(db: Session) -> None:
-    lock = db.get(RunnerLock, 1)
-    if lock and lock.runner_id == RUNNER_ID:
-        lock.heartbeat_at = datetime.utcnow()
-        db.add(lock)
-        db.commit()
+async def materialize_due(db: AsyncSession) -> int:
+    now = datetime.utcnow()
+    due = (
+        await db.exec(
+            select(
+                Schedule.id,
+                Schedule.job_id,
+                Schedule.type,
+                Schedule.recurrence,
+                Schedule.start_at,
+                Schedule.next_fire_at,
+                Schedule.end_at,
+                Schedule.duration_s,
+            )
+            .where(Schedule.enabled == True, Schedule.next_fire_at <= now)
+            .order_by(Schedule.next_fire_at)
+            .limit(settings.runner_materialize_batch)
+            .with_for_update(skip_locked=True)
+        )
+    ).all()
+    if not due:
+        return 0
+    # SKIP LOCKED is a no-op on SQLite, so a runner only materializes the rows its own conditional
+    # update still finds due; a concurrent runner that advanced them first wins.
+    claimed = set(
+        (
+            await db.execute(
+                update(Schedule)
+                .where(Schedule.id.in_([row.id for row in due]), Schedule.enabled == True, Schedule.next_fire_at <= now)
+                .values(last_fired_at=now)
+                .returning(Schedule.id)
+            )
+        ).scalars()
+    )
+    selected = len(due)
+    due = [row for row in due if row.id in claimed]
+    if not due:
+        await db.commit()
+        return selected
+    ids = [row.id for row in due]
+    busy = set(
+        (
+            await db.exec(
+                select(RunSession.schedule_id).where(
+                    RunSession.schedule_id.in_(ids),
+                    RunSession.state.in_(ACTIVE_STATES),
+                )
+            )
+        ).all()
+    )
+    rows = [
+        {
+            "job_id": row.job_id,
+            "schedule_id": row.id,
+            "trigger": "schedule",
+            "planned_start_at": row.next_fire_at,
+            "planned_end_at": planned_end(row, row.next_fire_at),
+            "state": "queued",
+        }
+        for row in due
+        if row.id not in busy
+    ]
+    if rows:
+        await db.execute(insert(RunSession), rows)
+    # Recurring schedules advance to their next occurrence after now; missed ones are not replayed.
+    advanced = [
+        {"id": row.id, "next_fire_at": next_fire_time(row, max(now, row.next_fire_at)), "last_fired_at": now}
+        for row in due
+    ]
+    await db.execute(update(Schedule), advanced)
+    await db.commit()
+    return selected
 
 
-def eligible_schedules(db: Session):
-    now = datetime.utcnow()
-    stmt = select(Schedule).where(Schedule.enabled == True, Schedule.start_at <= now)
-    return db.exec(stmt).all()
+def idle_timeout() -> float:
+    # Orphaned sessions become claimable once their short lease lapses; poll at least that often.
+    return min(settings.runner_heartbeat_seconds, settings.runner_lease_seconds / 3)
 
 
-def ensure_session(db: Session, schedule: Schedule) -> None:
-    existing = db.exec(
-        select(RunSession).where(
-            RunSession.schedule_id == schedule.id,
-            RunSession.state.in_(["queued", "starting", "running"]),
-        )
-    ).first()
-    if existing:
-        return
-    job = db.get(Job, schedule.job_id)
-    planned_end = None
-    if schedule.duration_s:
-        planned_end = schedule.start_at + timedelta(seconds=schedule.duration_s)
-    elif schedule.end_at:
-        planned_end = schedule.end_at
-    session = RunSession(
-        job_id=job.id,
-        schedule_id=schedule.id,
-        trigger="schedule",
-        planned_start_at=schedule.start_at,
-        planned_end_at=planned_end,
-        state="queued",
-    )
-    db.add(session)
-    db.commit()
+async def tick(leases: Leases, supervisor: Supervisor, builder: RenditionBuilder) -> None:
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        while await materialize_due(db) == settings.runner_materialize_batch:
+            pass
+        await leases.rebalance(db)
+        for session in await leases.claim(db):
+            supervisor.start(session.id)
+        await supervisor.flush(db)
+        await builder.poll(db)
 
 
 async def main():
-    while True:
-        with Session(engine) as db:
-            if not await acquire_lock(db):
-                await asyncio.sleep(5)
-                continue
-            heartbeat(db)
-            for sched in eligible_schedules(db):
-                ensure_session(db, sched)
-        await asyncio.sleep(settings.runner_heartbeat_seconds)
+    check_schema()
+    leases = Leases()
+    events = EventWriter()
+    supervisor = Supervisor(leases, events)
+    builder = RenditionBuilder(leases.runner_id)
+    prober = ProbeWorker(leases.runner_id)
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        await leases.register(db)
+    keep_alive = asyncio.create_task(leases.keep_alive())
+    housekeeping = asyncio.create_task(maintain(leases))
+    licensing = asyncio.create_task(keep_license(leases))
+    listener = ChangeListener(async_engine)
+    listener.start()
+    prober.start()
+    events.start()
+    try:
+        while True:
+            await tick(leases, supervisor, builder)
+            # Router writes wake us immediately; the timeout is only a safety poll.
+            await listener.wait(idle_timeout())
+    finally:
+        await supervisor.shutdown()
+        await builder.shutdown()
+        await prober.shutdown()
+        await events.close()
+        keep_alive.cancel()
+        housekeeping.cancel()
+        licensing.cancel()
+        await listener.stop()
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            await leases.deregister(db)
 
 
 if __name__ == "__main__":
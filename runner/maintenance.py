@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from backend.app.licensing import renew_if_due, sweep_expired
+from backend.app.models import AssetUpload, RunnerNode
+from backend.app.uploads import discard
+from runner.archive import archive_history
+from runner.leases import Leases
+from runner.metrics import compact_metrics
+from runner.renditions import evict_renditions
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def is_leader(db: AsyncSession, runner_id: str) -> bool:
+    # Housekeeping runs on exactly one live runner: the lowest id with a fresh heartbeat.
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.runner_lease_seconds)
+    stmt = select(func.min(RunnerNode.runner_id)).where(RunnerNode.heartbeat_at >= cutoff)
+    return (await db.exec(stmt)).first() == runner_id
+
+
+async def expire_uploads(db: AsyncSession) -> None:
+    cutoff = datetime.utcnow() - timedelta(hours=settings.upload_expiry_hours)
+    stale = (
+        await db.exec(
+            select(AssetUpload.id).where(AssetUpload.status.in_(("uploading", "receiving")), AssetUpload.updated_at < cutoff)
+        )
+    ).all()
+    for upload_id in stale:
+        discard(upload_id)
+    if stale:
+        await db.execute(delete(AssetUpload).where(AssetUpload.id.in_(stale)))
+    await db.commit()
+
+
+async def expire_licenses(db: AsyncSession) -> None:
+    await db.run_sync(sweep_expired)
+    await db.commit()
+
+
+async def keep_license(leases: Leases) -> None:
+    # The leader renews the license lease ahead of expiry instead of waiting for someone to call /license/renew.
+    while True:
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                if await is_leader(db, leases.runner_id):
+                    await db.run_sync(renew_if_due)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("License renewal failed")
+        await asyncio.sleep(settings.license_renew_seconds)
+
+
+async def maintain(leases: Leases) -> None:
+    while True:
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                if await is_leader(db, leases.runner_id):
+                    await compact_metrics(db)
+                    await evict_renditions(db)
+                    await expire_uploads(db)
+                    await expire_licenses(db)
+                    await archive_history(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Runner maintenance failed")
+        await asyncio.sleep(settings.runner_maintenance_seconds)
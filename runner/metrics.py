@@ -0,0 +1,155 @@
+import calendar
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app.config import get_settings
+from backend.app.models import SessionMetric
+
+settings = get_settings()
+FIELDS = ("bitrate_kbps", "fps", "speed", "drop_frames", "dup_frames", "out_time_s")
+# (resolution, age after which finer rows are rolled up into it); each tier reads what the previous one kept.
+ROLLUPS = (
+    (300, timedelta(days=1)),
+    (3600, timedelta(days=7)),
+)
+
+
+def epoch(dt: datetime) -> int:
+    return calendar.timegm(dt.utctimetuple())
+
+
+def _number(raw: str) -> Optional[float]:
+    raw = raw.strip().rstrip("x").replace("kbits/s", "")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+class MetricRing:
+    def __init__(self, size: int):
+        self.size = size
+        self.ts = array("d", bytes(8 * size))
+        self.values = {name: array("d", bytes(8 * size)) for name in FIELDS}
+        self.head = 0
+        self.count = 0
+
+    def push(self, ts: float, sample: Dict[str, float]) -> None:
+        self.ts[self.head] = ts
+        for name in FIELDS:
+            self.values[name][self.head] = sample.get(name, float("nan"))
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def latest(self, name: str) -> Optional[float]:
+        if not self.count:
+            return None
+        value = self.values[name][(self.head - 1) % self.size]
+        return None if value != value else value
+
+    def summarize(self, since: float) -> Optional[Dict[str, float]]:
+        sums = dict.fromkeys(FIELDS, 0.0)
+        counts = dict.fromkeys(FIELDS, 0)
+        peaks = dict.fromkeys(FIELDS, 0.0)
+        for offset in range(1, self.count + 1):
+            idx = (self.head - offset) % self.size
+            if self.ts[idx] <= since:
+                break
+            for name in FIELDS:
+                value = self.values[name][idx]
+                if value == value:
+                    sums[name] += value
+                    counts[name] += 1
+                    peaks[name] = max(peaks[name], value)
+        if not any(counts.values()):
+            return None
+        summary = {name: sums[name] / counts[name] for name in FIELDS if counts[name]}
+        # Drop/dup counters are cumulative in FFmpeg's output; keep the highest seen.
+        for name in ("drop_frames", "dup_frames"):
+            if counts[name]:
+                summary[name] = peaks[name]
+        return summary
+
+
+class ProgressParser:
+    def __init__(self, ring: MetricRing):
+        self.ring = ring
+        self._block: Dict[str, float] = {}
+
+    def feed(self, line: str) -> None:
+        key, sep, raw = line.partition("=")
+        if not sep:
+            return
+        key = key.strip()
+        if key == "progress":
+            if self._block:
+                self.ring.push(time.time(), self._block)
+            self._block = {}
+        elif key == "bitrate":
+            self._set("bitrate_kbps", raw)
+        elif key in ("fps", "speed", "drop_frames", "dup_frames"):
+            self._set(key, raw)
+        elif key in ("out_time_us", "out_time_ms"):
+            # FFmpeg reports microseconds under both names.
+            value = _number(raw)
+            if value is not None:
+                self._block["out_time_s"] = value / 1_000_000
+
+    def _set(self, name: str, raw: str) -> None:
+        value = _number(raw)
+        if value is not None:
+            self._block[name] = value
+
+
+def bucket_row(session_id: int, bucket_ts: int, summary: Dict[str, float]) -> Dict:
+    return {
+        "session_id": session_id,
+        "bucket_ts": bucket_ts,
+        "resolution_s": settings.metrics_bucket_seconds,
+        "bitrate_kbps": summary.get("bitrate_kbps"),
+        "fps": summary.get("fps"),
+        "speed": summary.get("speed"),
+        "drop_frames": int(summary["drop_frames"]) if "drop_frames" in summary else None,
+        "dup_frames": int(summary["dup_frames"]) if "dup_frames" in summary else None,
+    }
+
+
+async def compact_metrics(db: AsyncSession) -> None:
+    now = epoch(datetime.utcnow())
+    source = settings.metrics_bucket_seconds
+    for target, age in ROLLUPS:
+        # Flush buckets already this coarse skip the tier; rolling a resolution into itself would
+        # have the DELETE below remove the rows the INSERT just wrote.
+        if target <= source:
+            continue
+        cutoff = now - int(age.total_seconds())
+        cutoff -= cutoff % target
+        bucket = SessionMetric.bucket_ts - SessionMetric.bucket_ts % target
+        rollup = (
+            select(
+                SessionMetric.session_id,
+                bucket,
+                literal(target),
+                func.avg(SessionMetric.bitrate_kbps),
+                func.avg(SessionMetric.fps),
+                func.avg(SessionMetric.speed),
+                func.max(SessionMetric.drop_frames),
+                func.max(SessionMetric.dup_frames),
+            )
+            .where(SessionMetric.resolution_s == source, SessionMetric.bucket_ts < cutoff)
+            .group_by(SessionMetric.session_id, bucket)
+        )
+        columns = ["session_id", "bucket_ts", "resolution_s", "bitrate_kbps", "fps", "speed", "drop_frames", "dup_frames"]
+        await db.execute(insert(SessionMetric).from_select(columns, rollup))
+        await db.execute(
+            delete(SessionMetric).where(SessionMetric.resolution_s == source, SessionMetric.bucket_ts < cutoff)
+        )
+        source = target
+    horizon = now - settings.metrics_retention_days * 86400
+    await db.execute(delete(SessionMetric).where(SessionMetric.bucket_ts < horizon))
+    await db.commit()
@@ -0,0 +1,334 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import and_, bindparam, delete, insert, or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from backend.app.keyframes import build_index, parse_packets
+from backend.app.models import Asset, KeyframeIndex, MediaProbe, RunnerNode
+from backend.app.notify import ChangeListener
+from backend.app.pipeline import refresh_pipelines
+from runner.leases import RUNNER_ID
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+PROBED_FIELDS = ("duration_s", "video_codec", "audio_codec", "width", "height", "fps", "thumbnail_path")
+WRITE_BATCH = 500
+# Results are held this long so one transaction carries many of them.
+WRITE_DELAY = 0.5
+
+ASSET = Asset.__table__
+PROBE_CLAIM = (
+    ASSET.c.id == bindparam("aid"),
+    ASSET.c.probe_status == "probing",
+    ASSET.c.probe_runner_id == bindparam("runner"),
+)
+# Conditioned on our claim: an edit that re-queued the asset meanwhile wins.
+STORE_PROBE = (
+    update(ASSET)
+    .where(*PROBE_CLAIM)
+    .values(
+        probe_status="done",
+        probe_error=None,
+        probe_runner_id=None,
+        size_bytes=bindparam("p_size"),
+        **{name: bindparam(f"p_{name}") for name in PROBED_FIELDS},
+    )
+)
+STORE_FAILURE = (
+    update(ASSET).where(*PROBE_CLAIM).values(probe_status="failed", probe_error=bindparam("p_error"), probe_runner_id=None)
+)
+
+
+class ProbeError(Exception):
+    pass
+
+
+@dataclass
+class ProbeOutcome:
+    asset_id: int
+    result: Optional[Dict] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+    cache: Optional[MediaProbe] = None
+    keyframes: Optional[KeyframeIndex] = None
+
+
+def thumbnail_for(path: str) -> str:
+    name = hashlib.sha1(path.encode()).hexdigest()
+    return str(Path(settings.data_dir) / "thumbnails" / f"{name}.jpg")
+
+
+def _rate(text: Optional[str]) -> Optional[float]:
+    if not text or text == "0/0":
+        return None
+    num, _, den = text.partition("/")
+    try:
+        return round(float(num) / float(den or 1), 3)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def stat_files(paths: List[str]) -> Dict[str, Union[Tuple[int, int], str]]:
+    stats = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats[path] = (stat.st_size, stat.st_mtime_ns)
+        except OSError as exc:
+            stats[path] = f"File not readable: {exc}"
+    return stats
+
+
+def list_keyframes(path: str, ffprobe: str, timeout: int) -> List[Tuple[float, int]]:
+    # Packet flags come from the demuxer, so this reads the container index without decoding.
+    try:
+        out = subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,pos,flags", "-of", "csv=p=0", path],
+            capture_output=True,
+            timeout=timeout,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    return parse_packets(out.stdout.decode(errors="replace")) if out.returncode == 0 else []
+
+
+def probe_file(path: str, thumbnail: str, ffprobe: str, ffmpeg: str, timeout: int) -> Tuple[Dict, List[Tuple[float, int]]]:
+    # Runs in a worker process: ffprobe for metadata and keyframes, then one scaled frame for the thumbnail.
+    try:
+        out = subprocess.run(
+            [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+            capture_output=True,
+            timeout=timeout,
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        raise ProbeError(f"ffprobe failed: {exc}")
+    if out.returncode != 0:
+        raise ProbeError(out.stderr.decode(errors="replace")[-500:] or f"ffprobe exited with {out.returncode}")
+    info = json.loads(out.stdout or b"{}")
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    duration = info.get("format", {}).get("duration")
+    result = {
+        "duration_s": round(float(duration)) if duration else None,
+        "video_codec": video.get("codec_name") if video else None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "width": video.get("width") if video else None,
+        "height": video.get("height") if video else None,
+        "fps": _rate(video.get("avg_frame_rate") or video.get("r_frame_rate")) if video else None,
+        "thumbnail_path": None,
+    }
+    keyframes = list_keyframes(path, ffprobe, timeout) if video else []
+    if video:
+        seek = min((result["duration_s"] or 0) * 0.1, 10)
+        os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+        try:
+            shot = subprocess.run(
+                [ffmpeg, "-v", "error", "-y", "-ss", f"{seek:g}", "-i", path, "-frames:v", "1", "-vf", "scale=320:-2", thumbnail],
+                capture_output=True,
+                timeout=timeout,
+            )
+            if shot.returncode == 0:
+                result["thumbnail_path"] = thumbnail
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    return result, keyframes
+
+
+class ProbeWorker:
+    def __init__(self, runner_id: str = RUNNER_ID):
+        self.runner_id = runner_id
+        self.workers = settings.probe_workers or os.cpu_count() or 1
+        # Bounded: the feeder blocks once it is full, so a library import waits in the
+        # database as pending rows rather than in memory.
+        self.queue: asyncio.Queue = asyncio.Queue(settings.probe_queue_size)
+        # Finished outcomes, written back in batches by one writer task.
+        self.done: asyncio.Queue = asyncio.Queue()
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.tasks: Set[asyncio.Task] = set()
+        self.claimed: Set[int] = set()
+        # Asset writes publish "asset" notices; job and session churn does not wake the feeder.
+        self.listener = ChangeListener(async_engine, kinds={"asset"})
+
+    def start(self) -> None:
+        self.pool = ProcessPoolExecutor(self.workers)
+        self.listener.start()
+        loops = [self._feed(), self._write()] + [self._consume() for _ in range(self.workers)]
+        self.tasks = {asyncio.create_task(loop) for loop in loops}
+
+    async def shutdown(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.listener.stop()
+        if self.claimed:
+            async with AsyncSession(async_engine) as db:
+                await db.execute(
+                    update(Asset)
+                    .where(Asset.id.in_(list(self.claimed)), Asset.probe_runner_id == self.runner_id)
+                    .values(probe_status="pending", probe_runner_id=None)
+                )
+                await db.commit()
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def _feed(self) -> None:
+        while True:
+            try:
+                fed = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Claiming assets to probe failed")
+                fed = 0
+            if not fed:
+                # The timeout only picks up probes orphaned by a runner whose lease has lapsed.
+                await self.listener.wait(settings.runner_lease_seconds)
+
+    async def _claim(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.runner_lease_seconds)
+        live = select(RunnerNode.runner_id).where(RunnerNode.heartbeat_at >= cutoff)
+        orphaned = and_(Asset.probe_runner_id != self.runner_id, Asset.probe_runner_id.not_in(live))
+        claimable = or_(Asset.probe_status == "pending", and_(Asset.probe_status == "probing", orphaned))
+        async with AsyncSession(async_engine) as db:
+            ids = (
+                await db.exec(
+                    select(Asset.id)
+                    .where(claimable, Asset.status == "active")
+                    .order_by(Asset.id)
+                    .limit(settings.probe_queue_size)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not ids:
+                await db.commit()
+                return 0
+            rows = (
+                await db.execute(
+                    update(Asset)
+                    .where(Asset.id.in_(ids), claimable)
+                    .values(probe_status="probing", probe_runner_id=self.runner_id)
+                    .returning(Asset.id, Asset.path, Asset.hash)
+                )
+            ).all()
+            await db.commit()
+            self.claimed.update(row.id for row in rows)
+            paths = [row.path for row in rows]
+            cached = {
+                entry.path: entry for entry in (await db.exec(select(MediaProbe).where(MediaProbe.path.in_(paths)))).all()
+            }
+            indexed = dict(
+                (
+                    await db.exec(
+                        select(KeyframeIndex.asset_id, KeyframeIndex.asset_hash).where(
+                            KeyframeIndex.asset_id.in_([row.id for row in rows])
+                        )
+                    )
+                ).all()
+            )
+        stats = await asyncio.to_thread(stat_files, paths)
+        for row in rows:
+            stat = stats[row.path]
+            entry = cached.get(row.path)
+            if isinstance(stat, str):
+                self.done.put_nowait(ProbeOutcome(row.id, error=stat))
+            elif entry and (entry.size_bytes, entry.mtime_ns) == stat and row.id in indexed and indexed[row.id] == row.hash:
+                # Unchanged since it was last probed: answer from the cache without a worker.
+                self.done.put_nowait(ProbeOutcome(row.id, json.loads(entry.result_json), size=stat[0]))
+            else:
+                await self.queue.put((row.id, row.path, row.hash, stat))
+        return len(rows)
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            asset_id, path, asset_hash, (size, mtime_ns) = await self.queue.get()
+            try:
+                result, keyframes = await loop.run_in_executor(
+                    self.pool,
+                    probe_file,
+                    path,
+                    thumbnail_for(path),
+                    settings.ffprobe_path,
+                    settings.ffmpeg_path,
+                    settings.probe_timeout_seconds,
+                )
+            except asyncio.CancelledError:
+                raise
+            except ProbeError as exc:
+                self.done.put_nowait(ProbeOutcome(asset_id, error=str(exc)))
+                continue
+            except Exception:
+                logger.exception("Probing asset %s failed", asset_id)
+                self.done.put_nowait(ProbeOutcome(asset_id, error="Probe worker error"))
+                continue
+            entry = MediaProbe(path=path, size_bytes=size, mtime_ns=mtime_ns, result_json=json.dumps(result))
+            index = build_index(asset_id, asset_hash, keyframes)
+            self.done.put_nowait(ProbeOutcome(asset_id, result, size=size, cache=entry, keyframes=index))
+
+    async def _write(self) -> None:
+        while True:
+            batch = [await self.done.get()]
+            await asyncio.sleep(WRITE_DELAY)
+            while not self.done.empty() and len(batch) < WRITE_BATCH:
+                batch.append(self.done.get_nowait())
+            try:
+                await self._store(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Left claimed: shutdown or another runner's takeover puts them back in the queue.
+                logger.exception("Storing %d probe results failed", len(batch))
+                continue
+            self.claimed.difference_update(outcome.asset_id for outcome in batch)
+
+    async def _store(self, batch: List[ProbeOutcome]) -> None:
+        probed = [outcome for outcome in batch if outcome.error is None]
+        failed = [outcome for outcome in batch if outcome.error is not None]
+        # Deduplicated uploads can share one file; keep a single cache row per path.
+        entries = list({outcome.cache.path: outcome.cache for outcome in probed if outcome.cache is not None}.values())
+        indexes = [outcome.keyframes for outcome in probed if outcome.keyframes is not None]
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            if entries:
+                await db.execute(delete(MediaProbe).where(MediaProbe.path.in_([entry.path for entry in entries])))
+                await db.execute(insert(MediaProbe), [entry.model_dump() for entry in entries])
+            if indexes:
+                await db.execute(
+                    delete(KeyframeIndex).where(KeyframeIndex.asset_id.in_([index.asset_id for index in indexes]))
+                )
+                await db.execute(insert(KeyframeIndex), [index.model_dump() for index in indexes])
+            if probed:
+                await db.execute(
+                    STORE_PROBE,
+                    [
+                        {
+                            "aid": outcome.asset_id,
+                            "runner": self.runner_id,
+                            "p_size": outcome.size,
+                            **{f"p_{name}": outcome.result.get(name) for name in PROBED_FIELDS},
+                        }
+                        for outcome in probed
+                    ],
+                )
+            if failed:
+                await db.execute(
+                    STORE_FAILURE,
+                    [{"aid": outcome.asset_id, "runner": self.runner_id, "p_error": outcome.error} for outcome in failed],
+                )
+            if probed:
+                asset_ids = [outcome.asset_id for outcome in probed]
+                await db.run_sync(lambda session: refresh_pipelines(session, asset_ids=asset_ids))
+            await db.commit()
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Set
+
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from backend.app.models import Asset, Job, Preset, Rendition, RunnerNode, Session as RunSession
+from backend.app.renditions import crossfade_seconds, rendition_dir, rendition_key, wants_rendition
+from runner.ffmpeg import audio_args, video_args
+from runner.leases import ACTIVE_STATES, RUNNER_ID
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+FAILED_RETRY_AFTER = timedelta(days=1)
+
+
+def part_path(path: Path) -> Path:
+    return path.with_name(path.stem + ".part" + path.suffix)
+
+
+def rendition_command(video: Asset, preset: Preset, crossfade_s: float, output: Path) -> List[str]:
+    cmd = [settings.ffmpeg_path, "-hide_banner", "-nostdin", "-loglevel", "error", "-y", "-i", video.path]
+    if crossfade_s:
+        # Drop the first C seconds and fade the last C seconds into them: the file ends on the
+        # frame it starts after, so -stream_loop plays one continuous crossfaded loop. The head
+        # is read from a second input because acrossfade stalls on two legs of one asplit.
+        c = f"{crossfade_s:g}"
+        offset = f"{video.duration_s - 2 * crossfade_s:g}"
+        # xfade only accepts constant frame rate inputs.
+        rate = f"{preset.fps or video.fps or 30:g}"
+        scale = f",scale={preset.scale}" if preset.scale else ""
+        cmd += ["-i", video.path]
+        graph = (
+            f"[0:v]trim=start={c},setpts=PTS-STARTPTS,fps={rate}[body];"
+            f"[1:v]trim=end={c},setpts=PTS-STARTPTS,fps={rate}[head];"
+            f"[body][head]xfade=transition=fade:duration={c}:offset={offset}{scale}[v]"
+        )
+        maps = ["-map", "[v]"]
+        if video.audio_codec:
+            graph += (
+                f";[0:a]atrim=start={c},asetpts=PTS-STARTPTS[atail];"
+                f"[1:a]atrim=end={c},asetpts=PTS-STARTPTS[afront];"
+                f"[atail][afront]acrossfade=d={c}[a]"
+            )
+            maps += ["-map", "[a]"]
+        cmd += ["-filter_complex", graph] + maps + video_args(preset, filters=False)
+    else:
+        cmd += ["-map", "0:v:0", "-map", "0:a:0?"] + video_args(preset)
+    return cmd + audio_args(preset) + ["-movflags", "+faststart", "-f", "mp4", str(part_path(output))]
+
+
+async def resolve_rendition(db: AsyncSession, job: Job, video: Asset, preset: Optional[Preset]) -> Optional[Rendition]:
+    # Returns a ready rendition to stream-copy, or queues one for the builders and returns None.
+    if not wants_rendition(job, video, preset):
+        return None
+    crossfade_s = crossfade_seconds(job, video)
+    key = rendition_key(video, preset, crossfade_s)
+    rendition = (await db.exec(select(Rendition).where(Rendition.cache_key == key))).first()
+    if rendition is None:
+        db.add(
+            Rendition(
+                cache_key=key,
+                asset_id=video.id,
+                preset_id=preset.id,
+                crossfade_s=crossfade_s,
+                path=str(rendition_dir() / f"{key}.mp4"),
+            )
+        )
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+        return None
+    if rendition.status in ("ready", "stale") and os.path.exists(rendition.path):
+        # A stale row whose key still matches the current asset and preset is still valid.
+        rendition.status = "ready"
+        rendition.last_used_at = datetime.utcnow()
+        db.add(rendition)
+        await db.commit()
+        return rendition
+    if rendition.status in ("ready", "stale"):
+        rendition.status = "pending"
+        db.add(rendition)
+        await db.commit()
+    return None
+
+
+class RenditionBuilder:
+    def __init__(self, runner_id: str = RUNNER_ID):
+        self.runner_id = runner_id
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def poll(self, db: AsyncSession) -> None:
+        free = settings.rendition_build_concurrency - len(self.tasks)
+        if free <= 0:
+            return
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.runner_lease_seconds)
+        live = select(RunnerNode.runner_id).where(RunnerNode.heartbeat_at >= cutoff)
+        # Pending builds, plus builds whose runner stopped heartbeating mid-encode.
+        orphaned = and_(Rendition.runner_id != self.runner_id, Rendition.runner_id.not_in(live))
+        claimable = or_(Rendition.status == "pending", and_(Rendition.status == "building", orphaned))
+        ids = (
+            await db.exec(
+                select(Rendition.id)
+                .where(claimable)
+                .order_by(Rendition.created_at)
+                .limit(free)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not ids:
+            await db.commit()
+            return
+        claimed = (
+            await db.execute(
+                update(Rendition)
+                .where(Rendition.id.in_(ids), claimable)
+                .values(status="building", runner_id=self.runner_id, error=None)
+                .returning(Rendition.id)
+            )
+        ).scalars().all()
+        await db.commit()
+        for rendition_id in claimed:
+            task = asyncio.create_task(self._build(rendition_id))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def shutdown(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def _claimed(self, rendition_id: int):
+        # Conditioned on our claim: an invalidation during the build leaves the row stale.
+        return update(Rendition).where(
+            Rendition.id == rendition_id,
+            Rendition.status == "building",
+            Rendition.runner_id == self.runner_id,
+        )
+
+    async def _set(self, rendition_id: int, **values) -> None:
+        async with AsyncSession(async_engine) as db:
+            await db.execute(self._claimed(rendition_id).values(**values))
+            await db.commit()
+
+    async def _publish(self, rendition_id: int, output: Path) -> bool:
+        # The file only enters the cache if the row is still ours. The rename happens while the update
+        # holds the row, so an invalidation either lands first (and the build is discarded) or after
+        # the row is ready (and eviction re-checks it).
+        part = part_path(output)
+        async with AsyncSession(async_engine) as db:
+            result = await db.execute(
+                self._claimed(rendition_id).values(
+                    status="ready", size_bytes=part.stat().st_size, last_used_at=datetime.utcnow()
+                )
+            )
+            if result.rowcount != 1:
+                await db.rollback()
+                part.unlink(missing_ok=True)
+                return False
+            os.replace(part, output)
+            await db.commit()
+        return True
+
+    async def _build(self, rendition_id: int) -> None:
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            rendition = await db.get(Rendition, rendition_id)
+            video = await db.get(Asset, rendition.asset_id)
+            preset = await db.get(Preset, rendition.preset_id) if rendition.preset_id is not None else None
+        if not video or not preset or video.status == "deleted":
+            await self._set(rendition_id, status="stale")
+            return
+        output = Path(rendition.path)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *rendition_command(video, preset, rendition.crossfade_s, output),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as exc:
+            await self._set(rendition_id, status="failed", error=f"FFmpeg failed to start: {exc}")
+            return
+        try:
+            _, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            proc.kill()
+            await proc.wait()
+            part_path(output).unlink(missing_ok=True)
+            await self._set(rendition_id, status="pending", runner_id=None)
+            raise
+        if proc.returncode != 0:
+            part_path(output).unlink(missing_ok=True)
+            error = stderr.decode(errors="replace")[-2000:] or f"FFmpeg exited with code {proc.returncode}"
+            await self._set(rendition_id, status="failed", error=error)
+            return
+        if not await self._publish(rendition_id, output):
+            logger.info("Rendition %s was invalidated while building; discarded", rendition.cache_key)
+            return
+        logger.info("Rendition %s ready for asset %s", rendition.cache_key, video.id)
+
+
+async def evict_renditions(db: AsyncSession) -> None:
+    doomed = []
+    stale = (await db.exec(select(Rendition).where(Rendition.status == "stale"))).all()
+    for rendition in stale:
+        video = await db.get(Asset, rendition.asset_id)
+        preset = await db.get(Preset, rendition.preset_id) if rendition.preset_id is not None else None
+        valid = (
+            video is not None
+            and preset is not None
+            and video.status != "deleted"
+            and video.hash
+            and rendition_key(video, preset, rendition.crossfade_s) == rendition.cache_key
+        )
+        if valid and os.path.exists(rendition.path):
+            rendition.status = "ready"
+            db.add(rendition)
+        else:
+            doomed.append(rendition)
+    retry_before = datetime.utcnow() - FAILED_RETRY_AFTER
+    doomed += (
+        await db.exec(select(Rendition).where(Rendition.status == "failed", Rendition.created_at < retry_before))
+    ).all()
+    # Least recently used ready renditions go first once the cache is over budget. last_used_at only
+    # moves when a stream starts, so renditions that active sessions are looping still count toward
+    # the budget but are never evicted from under them.
+    in_use = set(
+        (
+            await db.exec(
+                select(Rendition.id)
+                .join(Job, and_(Job.video_asset_id == Rendition.asset_id, Job.preset_id == Rendition.preset_id))
+                .join(RunSession, RunSession.job_id == Job.id)
+                .where(Rendition.status == "ready", RunSession.state.in_(ACTIVE_STATES))
+            )
+        ).all()
+    )
+    ready = (
+        await db.exec(select(Rendition).where(Rendition.status == "ready").order_by(Rendition.last_used_at.desc()))
+    ).all()
+    used = 0
+    for rendition in ready:
+        used += rendition.size_bytes
+        if used > settings.rendition_cache_bytes and rendition.id not in in_use:
+            doomed.append(rendition)
+    for rendition in doomed:
+        Path(rendition.path).unlink(missing_ok=True)
+    if doomed:
+        await db.execute(delete(Rendition).where(Rendition.id.in_([r.id for r in doomed])))
+    await db.commit()
@@ -0,0 +1,54 @@
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+from backend.app.config import get_settings
+from backend.app.keyframes import Keyframes
+
+settings = get_settings()
+# Upper bound on whole passes written into one resume playlist; the runner restarts the normal
+# endless loop once a playlist is used up.
+MAX_PASSES = 10000
+
+
+def resume_point(position: float, loop_duration: Optional[int], keyframes: Optional[Keyframes]) -> Tuple[float, float]:
+    # Returns (stream position the restart resumes at, offset to seek to within the source file).
+    if loop_duration:
+        offset = position % loop_duration
+        base = position - offset
+    else:
+        offset, base = position, 0.0
+    if keyframes is not None:
+        offset, _ = keyframes.at_or_before(offset)
+    return base + offset, offset
+
+
+def playlist_path(session_id: int) -> Path:
+    return Path(settings.data_dir) / "playlists" / f"session-{session_id}.ffconcat"
+
+
+def _quote(path: str) -> str:
+    return "'" + path.replace("'", "'\\''") + "'"
+
+
+def loop_passes(loop_duration: int, planned_end_at: Optional[datetime]) -> int:
+    if not planned_end_at:
+        return MAX_PASSES
+    remaining = (planned_end_at - datetime.utcnow()).total_seconds()
+    return max(1, min(MAX_PASSES, math.ceil(remaining / loop_duration) + 1))
+
+
+def write_playlist(session_id: int, source: str, inpoint: float, passes: int) -> str:
+    # -stream_loop would repeat the seek on every pass, so a looping resume plays the rest of the
+    # current pass and then whole passes from a flat concat list.
+    quoted = _quote(source)
+    lines = ["ffconcat version 1.0", f"file {quoted}", f"inpoint {inpoint:.6f}"] + [f"file {quoted}"] * passes
+    path = playlist_path(session_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def remove_playlist(session_id: int) -> None:
+    playlist_path(session_id).unlink(missing_ok=True)
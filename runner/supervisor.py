@@ -0,0 +1,375 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from backend.app.keyframes import Keyframes, usable_keyframes
+from backend.app.licensing import lease_cache, tier_covers
+from backend.app.models import (
+    Asset,
+    Destination,
+    FFmpegLog,
+    Job,
+    KeyframeIndex,
+    Preset,
+    Session as RunSession,
+    SessionMetric,
+)
+from runner.events import EventWriter
+from runner.ffmpeg import build_command
+from runner.leases import Leases, runner_capacity
+from runner.logs import SegmentLog, pump_log
+from runner.metrics import MetricRing, ProgressParser, bucket_row
+from runner.renditions import resolve_rendition
+from runner.resume import loop_passes, remove_playlist, resume_point, write_playlist
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StreamPlan:
+    job: Job
+    video: Asset
+    destination: Destination
+    preset: Optional[Preset]
+    audio: Optional[Asset]
+    rendition: Optional[str]
+    planned_end_at: Optional[datetime]
+    loop_duration_s: Optional[int] = None
+    keyframes: Optional[Keyframes] = None
+    position_s: float = 0.0
+
+    def command(self, session_id: int, position: float) -> Tuple[List[str], float, bool]:
+        # Returns the command, the stream position it starts at, and whether it ends on its own
+        # (a finite resume playlist) rather than looping forever.
+        args = (self.job, self.video, self.destination, self.preset, self.audio, self.rendition)
+        loop_duration = self.loop_duration_s if self.job.loop_enabled else None
+        start, seek = resume_point(position, loop_duration, self.keyframes) if position > 0 else (0.0, 0.0)
+        if seek <= 0:
+            return build_command(*args), start, False
+        if not loop_duration:
+            return build_command(*args, start_s=seek), start, False
+        source = self.rendition or self.video.path
+        playlist = write_playlist(session_id, source, seek, loop_passes(loop_duration, self.planned_end_at))
+        return build_command(*args, playlist=playlist), start, True
+
+
+@dataclass
+class LiveStream:
+    plan: StreamPlan
+    log: SegmentLog
+    log_id: int
+    start_s: float = 0.0
+    ring: MetricRing = field(default_factory=lambda: MetricRing(settings.metrics_ring_size))
+    flushed_at: float = field(default_factory=time.time)
+
+    def position(self) -> float:
+        # FFmpeg's out_time restarts at zero with each process; start_s carries what came before.
+        return self.start_s + (self.ring.latest("out_time_s") or 0.0)
+
+    def loop_position(self):
+        if not self.plan.job.loop_enabled or not self.plan.loop_duration_s:
+            return None, None
+        position = self.position()
+        duration = self.plan.loop_duration_s
+        return int(position // duration), int(duration - position % duration)
+
+
+async def pump_progress(stream: asyncio.StreamReader, parser: ProgressParser) -> None:
+    async for line in stream:
+        parser.feed(line.decode(errors="replace"))
+
+
+HEARTBEAT = (
+    update(RunSession.__table__)
+    .where(
+        RunSession.__table__.c.id == bindparam("sid"),
+        RunSession.__table__.c.fencing_token == bindparam("token"),
+    )
+    .values(
+        last_heartbeat_at=bindparam("beat"),
+        current_loop_index=bindparam("loop_index"),
+        next_loop_eta_s=bindparam("loop_eta"),
+        position_s=bindparam("position"),
+    )
+)
+
+
+LOG_BYTES = (
+    update(FFmpegLog.__table__)
+    .where(FFmpegLog.__table__.c.id == bindparam("lid"))
+    .values(bytes=bindparam("size"))
+)
+
+
+async def stop_pumps(pumps: List[asyncio.Task]) -> None:
+    # Let the readers drain what FFmpeg wrote before exiting, but never wait on them forever.
+    if pumps:
+        _, pending = await asyncio.wait(pumps, timeout=settings.runner_stop_grace_seconds)
+        for task in pending:
+            task.cancel()
+    pumps.clear()
+
+
+async def terminate(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is not None:
+        return
+    proc.terminate()
+    try:
+        await asyncio.wait_for(proc.wait(), settings.runner_stop_grace_seconds)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+
+
+class Supervisor:
+    def __init__(self, leases: Leases, events: EventWriter):
+        self.leases = leases
+        self.events = events
+        self.slots = asyncio.Semaphore(runner_capacity())
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.live: Dict[int, LiveStream] = {}
+        leases.on_lost = self.lost
+
+    def start(self, session_id: int) -> None:
+        if session_id in self.tasks:
+            return
+        task = asyncio.create_task(self._supervise(session_id))
+        self.tasks[session_id] = task
+        task.add_done_callback(lambda _, sid=session_id: self.tasks.pop(sid, None))
+
+    async def abandon(self, session_ids: List[int]) -> None:
+        # Another runner holds these now: stop our encodes without touching their rows.
+        tasks = [self.tasks[sid] for sid in session_ids if sid in self.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def lost(self, session_ids: List[int]) -> None:
+        for sid in session_ids:
+            if sid in self.tasks:
+                await self.events.write(sid, "warning", "lease_lost", f"Runner {self.leases.runner_id} lost the session lease")
+        await self.abandon(session_ids)
+
+    async def shutdown(self) -> None:
+        # Hand live sessions back to the queue so another runner restarts them.
+        async with AsyncSession(async_engine) as db:
+            for session_id in list(self.tasks):
+                await db.execute(
+                    update(RunSession)
+                    .where(self.leases.guard(session_id))
+                    .values(state="queued", runner_id=None, lease_expires_at=None, ffmpeg_pid=None)
+                )
+            await db.commit()
+        for session_id in list(self.tasks):
+            await self.events.write(session_id, "info", "session_requeued", f"Runner {self.leases.runner_id} shutting down")
+        await self.abandon(list(self.tasks))
+
+    async def flush(self, db: AsyncSession) -> None:
+        # One executemany for every heartbeat and one multi-row INSERT for the metric buckets.
+        now = datetime.utcnow()
+        wall = time.time()
+        beats = []
+        buckets = []
+        logs = []
+        for sid, live in list(self.live.items()):
+            token = self.leases.tokens.get(sid)
+            if token is None:
+                continue
+            loop_index, loop_eta = live.loop_position()
+            beats.append(
+                {
+                    "sid": sid,
+                    "token": token,
+                    "beat": now,
+                    "loop_index": loop_index,
+                    "loop_eta": loop_eta,
+                    "position": round(live.position(), 3),
+                }
+            )
+            logs.append({"lid": live.log_id, "size": live.log.size})
+            if wall - live.flushed_at >= settings.metrics_bucket_seconds:
+                summary = live.ring.summarize(live.flushed_at)
+                if summary:
+                    bucket_ts = int(live.flushed_at) - int(live.flushed_at) % settings.metrics_bucket_seconds
+                    buckets.append(bucket_row(sid, bucket_ts, summary))
+                live.flushed_at = wall
+        if beats:
+            await db.execute(HEARTBEAT, beats)
+        if buckets:
+            await db.execute(insert(SessionMetric), buckets)
+        if logs:
+            await db.execute(LOG_BYTES, logs)
+        await db.commit()
+
+    async def _update(self, session_id: int, **values) -> bool:
+        async with AsyncSession(async_engine) as db:
+            result = await db.execute(update(RunSession).where(self.leases.guard(session_id)).values(**values))
+            await db.commit()
+        return result.rowcount == 1
+
+    async def _finish(self, session_id: int, state: str, reason: str) -> None:
+        finished = await self._update(
+            session_id, state=state, stop_reason=reason, actual_end_at=datetime.utcnow(), ffmpeg_pid=None
+        )
+        if finished:
+            await self.events.write(session_id, "error" if state == "failed" else "info", f"session_{state}", reason)
+
+    async def _plan(self, session_id: int) -> Optional[StreamPlan]:
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            session = await db.get(RunSession, session_id)
+            job = await db.get(Job, session.job_id) if session else None
+            if not job or job.status == "invalid":
+                return None
+            destination = await db.get(Destination, job.destination_id)
+            video = await db.get(Asset, job.video_asset_id)
+            audio = await db.get(Asset, job.audio_asset_id) if job.audio_asset_id else None
+            preset = await db.get(Preset, job.preset_id) if job.preset_id else None
+            if not destination or not video:
+                return None
+            rendition = await resolve_rendition(db, job, video, preset)
+            loop_duration_s = video.duration_s
+            keyframes = None
+            if rendition and loop_duration_s:
+                loop_duration_s = int(loop_duration_s - rendition.crossfade_s)
+            if not rendition:
+                # The index describes the asset file; a rendition has its own GOP layout.
+                keyframes = usable_keyframes(await db.get(KeyframeIndex, video.id), video)
+            return StreamPlan(
+                job=job,
+                video=video,
+                destination=destination,
+                preset=preset,
+                audio=audio,
+                rendition=rendition.path if rendition else None,
+                planned_end_at=session.planned_end_at,
+                loop_duration_s=loop_duration_s,
+                keyframes=keyframes,
+                position_s=session.position_s or 0.0,
+            )
+
+    async def _open_log(self, session_id: int) -> Tuple[int, SegmentLog]:
+        log = await SegmentLog.open(session_id)
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            row = (await db.exec(select(FFmpegLog).where(FFmpegLog.session_id == session_id))).first()
+            if not row:
+                row = FFmpegLog(session_id=session_id, path=str(log.directory))
+            row.bytes = log.size
+            row.ended_at = None
+            db.add(row)
+            await db.commit()
+            return row.id, log
+
+    async def _close_log(self, log_id: int, log: SegmentLog) -> None:
+        await log.close()
+        async with AsyncSession(async_engine) as db:
+            await db.execute(
+                update(FFmpegLog).where(FFmpegLog.id == log_id).values(bytes=log.size, ended_at=datetime.utcnow())
+            )
+            await db.commit()
+
+    async def _supervise(self, session_id: int) -> None:
+        try:
+            async with self.slots:
+                await self._run(session_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Supervising session %s failed", session_id)
+            await self._finish(session_id, "failed", "Runner error")
+        finally:
+            self.live.pop(session_id, None)
+            self.leases.forget(session_id)
+
+    async def _run(self, session_id: int) -> None:
+        plan = await self._plan(session_id)
+        if plan is None:
+            await self._finish(session_id, "failed", "Job invalid or missing destination/asset")
+            return
+        licensed = await lease_cache.tier_async()
+        if not tier_covers(licensed, plan.job.tier_required):
+            reason = f"Requires the {plan.job.tier_required} tier (licensed: {licensed})"
+            await self._finish(session_id, "failed", reason)
+            return
+        proc: Optional[asyncio.subprocess.Process] = None
+        pumps: List[asyncio.Task] = []
+        log_id, log = await self._open_log(session_id)
+        # An adopted or recovered session resumes at the last position its heartbeats recorded.
+        position = plan.position_s
+        try:
+            while True:
+                now = datetime.utcnow()
+                if plan.planned_end_at and plan.planned_end_at <= now:
+                    await self._finish(session_id, "stopped", "Planned end reached")
+                    return
+                if not await self._update(session_id, state="starting"):
+                    return
+                command, start_s, finite = plan.command(session_id, position)
+                try:
+                    proc = await asyncio.create_subprocess_exec(
+                        *command,
+                        stdin=asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                    )
+                except OSError as exc:
+                    await self._finish(session_id, "failed", f"FFmpeg failed to start: {exc}")
+                    return
+                started = await self._update(
+                    session_id,
+                    state="running",
+                    ffmpeg_pid=proc.pid,
+                    actual_start_at=func.coalesce(RunSession.actual_start_at, now),
+                    last_heartbeat_at=now,
+                )
+                if not started:
+                    return
+                resumed = f" resuming at {start_s:.1f}s" if start_s else ""
+                await self.events.write(session_id, "info", "ffmpeg_started", f"FFmpeg pid {proc.pid} started{resumed}")
+                live = self.live[session_id] = LiveStream(plan, log, log_id, start_s)
+                pumps += [
+                    asyncio.create_task(pump_progress(proc.stdout, ProgressParser(live.ring))),
+                    asyncio.create_task(pump_log(proc.stderr, log)),
+                ]
+                timeout = (plan.planned_end_at - datetime.utcnow()).total_seconds() if plan.planned_end_at else None
+                try:
+                    code = await asyncio.wait_for(proc.wait(), timeout)
+                except asyncio.TimeoutError:
+                    await terminate(proc)
+                    await self._finish(session_id, "stopped", "Planned end reached")
+                    return
+                self.live.pop(session_id, None)
+                await stop_pumps(pumps)
+                position = live.position()
+                if code == 0 and finite:
+                    # The resume playlist ran out on a pass boundary: continue with the endless loop.
+                    position = round(position / plan.loop_duration_s) * plan.loop_duration_s
+                    continue
+                if code == 0 and not plan.job.loop_enabled:
+                    await self._finish(session_id, "stopped", "Completed")
+                    return
+                if not plan.job.auto_recovery:
+                    await self._finish(session_id, "failed", f"FFmpeg exited with code {code}")
+                    return
+                await self.events.write(
+                    session_id,
+                    "warning",
+                    "ffmpeg_restart",
+                    f"FFmpeg exited with code {code}; restarting in {settings.runner_restart_backoff_seconds}s",
+                )
+                await asyncio.sleep(settings.runner_restart_backoff_seconds)
+        finally:
+            if proc is not None:
+                await terminate(proc)
+            await stop_pumps(pumps)
+            await self._close_log(log_id, log)
+            remove_playlist(session_id)
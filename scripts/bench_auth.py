@@ -0,0 +1,61 @@
+"""Authenticated requests per second: Basic with and without the verified-credential cache, and bearer tokens.
+
+Runs the API in-process against a throwaway SQLite database:
+
+    python scripts/bench_auth.py --requests 500
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+PASSWORD = "bench-password"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="zenstream-bench-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.sqlite'}"
+    os.environ["DATA_DIR"] = str(workdir / "data")
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT / "backend", env=os.environ, check=True, capture_output=True
+    )
+    sys.path.insert(0, str(ROOT))
+
+    from fastapi.testclient import TestClient
+
+    from backend.app import auth
+    from backend.app.main import app
+
+    auth.update_password(PASSWORD)
+    admin = auth.get_admin_user()
+    token = auth.issue_token(admin)["access_token"]
+    basic = (admin.username, PASSWORD)
+    cached = auth._credential_cache
+    uncached = auth.VerifiedCredentialCache(0, 0)
+
+    def measure(label: str, **request) -> None:
+        with TestClient(app) as client:
+            assert client.get("/destinations/", **request).status_code == 200
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                client.get("/destinations/", **request)
+            elapsed = time.perf_counter() - started
+        print(f"{label:<28} {args.requests / elapsed:>10.1f} req/s   {elapsed / args.requests * 1000:>8.2f} ms/req")
+
+    auth._credential_cache = uncached
+    measure("basic, bcrypt every request", auth=basic)
+    auth._credential_cache = cached
+    measure("basic, cached", auth=basic)
+    measure("bearer token", headers={"Authorization": f"Bearer {token}"})
+
+
+if __name__ == "__main__":
+    main()
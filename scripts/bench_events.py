@@ -0,0 +1,89 @@
+"""Session events per second: the buffered EventWriter against one ORM commit per event.
+
+Runs against a throwaway SQLite database, or a scratch database given with --database-url (it is
+migrated to head and filled with benchmark rows):
+
+    python scripts/bench_events.py --events 10000
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent producers")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="zenstream-bench-"))
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir / 'bench.sqlite'}"
+    os.environ["DATA_DIR"] = str(workdir / "data")
+    os.environ.setdefault("AUTH_TOKEN_SECRET", "bench")
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT / "backend", env=os.environ, check=True, capture_output=True
+    )
+    sys.path.insert(0, str(ROOT))
+    asyncio.run(bench(args.events, args.sessions))
+
+
+async def bench(events: int, sessions: int) -> None:
+    from sqlmodel import Session as DbSession
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    from backend.app import models
+    from backend.app.database import async_engine, engine
+    from runner.events import EventWriter
+
+    with DbSession(engine) as db:
+        asset = models.Asset(type="video", filename="b.mp4", path="/bench/b.mp4", size_bytes=1)
+        destination = models.Destination(name="bench", rtmp_url="rtmp://bench.invalid/live", stream_key_encrypted="k")
+        db.add_all([asset, destination])
+        db.commit()
+        job = models.Job(name="bench", destination_id=destination.id, video_asset_id=asset.id)
+        db.add(job)
+        db.commit()
+        runs = [models.Session(job_id=job.id, trigger="manual", state="running") for _ in range(sessions)]
+        db.add_all(runs)
+        db.commit()
+        session_ids = [run.id for run in runs]
+    per_session = max(1, events // sessions)
+    total = per_session * sessions
+
+    async def one_commit_per_event(session_id: int) -> None:
+        async with AsyncSession(async_engine) as db:
+            for i in range(per_session):
+                db.add(models.Event(session_id=session_id, level="info", code="bench", message=str(i)))
+                await db.commit()
+
+    async def buffered(writer: EventWriter, session_id: int) -> None:
+        for i in range(per_session):
+            # Warnings wait for space instead of being shed, so every event is written.
+            await writer.write(session_id, "warning", "bench", str(i))
+
+    def report(label: str, elapsed: float) -> None:
+        print(f"{label:<24} {total / elapsed:>12.0f} events/s   {elapsed:>8.2f} s for {total} events")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_commit_per_event(sid) for sid in session_ids))
+    report("commit per event", time.perf_counter() - started)
+
+    writer = EventWriter()
+    writer.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(buffered(writer, sid) for sid in session_ids))
+    await writer.close()
+    report("buffered EventWriter", time.perf_counter() - started)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
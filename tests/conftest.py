@@ -0,0 +1,110 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+WORKDIR = Path(tempfile.mkdtemp(prefix="zenstream-tests-"))
+
+# Settings and engines are built at import time, so the environment is set before anything imports them.
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR / 'test.sqlite'}"
+os.environ["DATA_DIR"] = str(WORKDIR / "data")
+os.environ.setdefault("AUTH_TOKEN_SECRET", "test-secret")
+sys.path.insert(0, str(ROOT))
+subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT / "backend", env=os.environ, check=True)
+
+from sqlmodel import SQLModel, Session  # noqa: E402
+
+from backend.app.database import async_engine, engine  # noqa: E402
+
+
+def run(coro):
+    # Each test gets its own loop; pooled aiosqlite connections are bound to the loop that opened them.
+    async def main():
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    yield
+    with engine.begin() as conn:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture
+def db():
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from backend.app.auth import AdminUser, require_password_reset
+    from backend.app.main import app
+
+    app.dependency_overrides[require_password_reset] = lambda: AdminUser("admin", "", must_reset=False)
+    # The lifespan disposes the async engine on exit, so no connection outlives the client's loop.
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def job(db):
+    from backend.app import models
+
+    asset = models.Asset(type="video", filename="loop.mp4", path="/data/assets/videos/loop.mp4", size_bytes=1, probe_status="done")
+    destination = models.Destination(name="primary", rtmp_url="rtmp://example.invalid/live", stream_key_encrypted="key")
+    db.add(asset)
+    db.add(destination)
+    db.commit()
+    job = models.Job(name="loop", destination_id=destination.id, video_asset_id=asset.id, loop_enabled=True)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+# Stands in for FFmpeg on PATH: records each start, counts concurrent runs, then exits with the
+# code given in FAKE_FFMPEG_EXIT after FAKE_FFMPEG_SECONDS, or cleanly when terminated.
+FAKE_FFMPEG = """#!/bin/sh
+echo start >> "$FAKE_FFMPEG_DIR/starts"
+touch "$FAKE_FFMPEG_DIR/running.$$"
+ls "$FAKE_FFMPEG_DIR" | grep -c '^running' >> "$FAKE_FFMPEG_DIR/concurrency"
+sleep "$FAKE_FFMPEG_SECONDS" > /dev/null 2>&1 &
+trap 'kill $!; rm -f "$FAKE_FFMPEG_DIR/running.$$"; exit 0' TERM
+wait
+rm -f "$FAKE_FFMPEG_DIR/running.$$"
+exit "$FAKE_FFMPEG_EXIT"
+"""
+
+
+@pytest.fixture
+def ffmpeg(tmp_path, monkeypatch):
+    from backend.app.config import get_settings
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "ffmpeg"
+    script.write_text(FAKE_FFMPEG)
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_FFMPEG_DIR", str(tmp_path))
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "60")
+    monkeypatch.setenv("FAKE_FFMPEG_EXIT", "0")
+    settings = get_settings()
+    monkeypatch.setattr(settings, "ffmpeg_path", "ffmpeg")
+    monkeypatch.setattr(settings, "runner_restart_backoff_seconds", 0)
+    return tmp_path
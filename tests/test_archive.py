@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app import models
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from conftest import run
+from runner.archive import archive_history
+
+
+def seed_old_history(db, job) -> None:
+    long_ago = datetime.utcnow() - timedelta(days=400)
+    session = models.Session(job_id=job.id, trigger="schedule", state="stopped", planned_start_at=long_ago, actual_end_at=long_ago)
+    db.add(session)
+    db.commit()
+    db.add(models.Event(session_id=session.id, level="info", code="session_stopped", message="", ts=long_ago))
+    db.commit()
+
+
+def counts(db):
+    return [db.exec(select(func.count()).select_from(model)).one() for model in (models.Session, models.Event)]
+
+
+def archive():
+    async def go():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            await archive_history(session)
+
+    run(go())
+
+
+def test_history_is_kept_unless_retention_is_configured(db, job):
+    seed_old_history(db, job)
+    assert get_settings().history_retention_days == 0
+    archive()
+    assert counts(db) == [1, 1]
+
+
+def test_configured_retention_archives_old_history(db, job, monkeypatch):
+    monkeypatch.setattr(get_settings(), "history_retention_days", 30)
+    seed_old_history(db, job)
+    archive()
+    assert counts(db) == [0, 0]
+    assert db.exec(select(func.count()).select_from(models.JobDailyRollup)).one() == 1
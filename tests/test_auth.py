@@ -0,0 +1,50 @@
+import base64
+import hashlib
+import hmac
+import stat
+
+import pytest
+
+from backend.app import auth
+from backend.app.auth import AdminUser, issue_token, pwd_context, token_secret, verify_credentials, verify_token
+from backend.app.config import get_settings
+
+
+@pytest.fixture
+def no_configured_secret(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "auth_token_secret", "")
+    monkeypatch.setattr(get_settings(), "data_dir", str(tmp_path))
+    token_secret.cache_clear()
+    yield tmp_path / "secrets" / "auth_token_secret"
+    token_secret.cache_clear()
+
+
+def test_missing_secret_is_generated_once_and_kept_private(no_configured_secret):
+    secret = token_secret()
+    assert len(secret) >= 48
+    assert no_configured_secret.read_text() == secret
+    assert stat.S_IMODE(no_configured_secret.stat().st_mode) == 0o600
+    # Another worker, or the next start, reads the same secret back.
+    token_secret.cache_clear()
+    assert token_secret() == secret
+
+
+def test_tokens_cannot_be_minted_from_the_password_hash_alone(no_configured_secret):
+    admin = AdminUser("admin", pwd_context.hash("pw"), must_reset=False)
+    token = issue_token(admin)["access_token"]
+    assert verify_token(admin, token)
+    payload = token.rpartition(".")[0]
+    key = hashlib.sha256(f"\0{admin.password_hash}".encode()).digest()
+    forged = base64.urlsafe_b64encode(hmac.new(key, payload.encode(), hashlib.sha256).digest()).decode().rstrip("=")
+    assert not verify_token(admin, f"{payload}.{forged}")
+
+
+def test_verified_credentials_skip_bcrypt(monkeypatch):
+    admin = AdminUser("admin", pwd_context.hash("pw"), must_reset=False)
+    calls = []
+    verify = pwd_context.verify
+    monkeypatch.setattr(auth.pwd_context, "verify", lambda *args: calls.append(args) or verify(*args))
+    assert all(verify_credentials(admin, "admin", "pw") for _ in range(5))
+    assert len(calls) == 1
+    assert not verify_credentials(admin, "admin", "wrong")
+    assert len(calls) == 2
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+import pytest
+from sqlmodel import select
+
+from backend.app import models
+from conftest import run
+from runner.events import EventWriter
+
+
+@pytest.fixture
+def session_id(db, job):
+    session = models.Session(job_id=job.id, trigger="manual", state="running")
+    db.add(session)
+    db.commit()
+    return session.id
+
+
+def stored(db):
+    db.expire_all()
+    return [(event.level, event.code) for event in db.exec(select(models.Event).order_by(models.Event.id))]
+
+
+def test_full_buffer_sheds_routine_events_and_holds_warnings(db, session_id):
+    async def scenario():
+        # No background task: the buffer only drains when the test flushes it.
+        writer = EventWriter(max_buffer=2, batch_size=10, flush_seconds=3600, debug_sample_rate=0.0)
+        await writer.write(session_id, "debug", "sampled", "never kept at rate 0")
+        await writer.write(session_id, "info", "first", "")
+        await writer.write(session_id, "info", "second", "")
+        await writer.write(session_id, "info", "shed", "buffer full")
+        blocked = asyncio.create_task(writer.write(session_id, "warning", "held", "waits for space"))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        assert await writer.flush()
+        await asyncio.wait_for(blocked, 1)
+        assert [row["code"] for row in writer.buffer] == ["held"]
+        await writer.close()
+        return writer
+
+    writer = run(scenario())
+    assert (writer.sampled_out, writer.dropped) == (1, 1)
+    assert stored(db) == [("info", "first"), ("info", "second"), ("warning", "held")]
+
+
+def test_batch_size_wakes_the_flush_task(db, session_id):
+    async def scenario():
+        writer = EventWriter(max_buffer=100, batch_size=3, flush_seconds=3600)
+        writer.start()
+        for i in range(3):
+            await writer.write(session_id, "info", f"e{i}", "")
+        for _ in range(100):
+            if not writer.buffer:
+                break
+            await asyncio.sleep(0.01)
+        assert not writer.buffer
+        await writer.close()
+
+    run(scenario())
+    assert len(stored(db)) == 3
+
+
+def test_close_right_after_a_batch_fills_stops_the_flush_task(db, session_id):
+    async def scenario():
+        writer = EventWriter(max_buffer=100, batch_size=3, flush_seconds=3600)
+        writer.start()
+        # The third write sets `wake` without yielding, so close() races the pending wakeup.
+        for i in range(3):
+            await writer.write(session_id, "info", f"e{i}", "")
+        await asyncio.wait_for(writer.close(), 5)
+        assert writer.task.done()
+
+    run(scenario())
+    assert len(stored(db)) == 3
+
+
+def test_close_drains_events_from_producers_blocked_on_space(db, session_id):
+    async def scenario():
+        writer = EventWriter(max_buffer=3, batch_size=3, flush_seconds=3600)
+        for i in range(3):
+            await writer.write(session_id, "info", f"e{i}", "")
+        blocked = [
+            asyncio.create_task(writer.write(session_id, level, f"late-{level}", "")) for level in ("error", "warning")
+        ]
+        await asyncio.sleep(0.05)
+        assert not any(task.done() for task in blocked)
+        await writer.close()
+        assert all(task.done() for task in blocked)
+
+    run(scenario())
+    assert stored(db) == [("info", "e0"), ("info", "e1"), ("info", "e2"), ("error", "late-error"), ("warning", "late-warning")]
+
+
+def test_close_releases_blocked_producers_when_the_database_is_down(db, session_id, monkeypatch, caplog):
+    async def failing_insert(batch):
+        raise RuntimeError("database unavailable")
+
+    async def scenario():
+        writer = EventWriter(max_buffer=1, batch_size=1, flush_seconds=3600)
+        monkeypatch.setattr(writer, "_insert", failing_insert)
+        await writer.write(session_id, "error", "first", "")
+        blocked = asyncio.create_task(writer.write(session_id, "error", "second", ""))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(writer.close(), 1)
+        await asyncio.wait_for(blocked, 1)
+
+    with caplog.at_level(logging.ERROR, logger="runner.events"):
+        run(scenario())
+    assert stored(db) == []
+    unsaved = [record.getMessage() for record in caplog.records if record.getMessage().startswith("Unsaved")]
+    assert len(unsaved) == 2
@@ -0,0 +1,113 @@
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, insert
+from sqlmodel import select
+
+from backend.app import models
+from backend.app.job_backups import downgrade_jobs, restore_jobs
+from backend.app.licensing import lease_cache
+from backend.app.routers.jobs import validate_job
+
+JOBS = 100_000
+
+
+@pytest.fixture(autouse=True)
+def fresh_lease():
+    lease_cache.invalidate()
+    yield
+    lease_cache.invalidate()
+
+
+def license_tier(db, tier: str) -> None:
+    now = datetime.utcnow()
+    db.add(models.LicenseState(install_id="install", install_secret_hash="hash", activated_tier=tier, last_check_at=now))
+    db.commit()
+    lease_cache.invalidate()
+
+
+def ultimate(db, job) -> models.Job:
+    job.tier_required = "Ultimate"
+    job.scenes_enabled = True
+    job.status = "valid"
+    db.add(job)
+    db.commit()
+    return job
+
+
+def set_tier(db, tier: str) -> None:
+    state = db.exec(select(models.LicenseState)).one()
+    state.activated_tier = tier
+    db.add(state)
+    db.commit()
+    lease_cache.invalidate()
+
+
+@pytest.mark.parametrize("path", ["/jobs/{id}/restore", "/jobs/restore"])
+def test_restore_under_basic_leaves_higher_tier_jobs_invalid(client, db, job, path):
+    license_tier(db, "Ultimate")
+    ultimate(db, job)
+    set_tier(db, "Basic")
+    downgrade_jobs(db, "License expired; downgraded to Basic")
+
+    assert client.post(path.format(id=job.id)).status_code == 200
+    db.expire_all()
+    restored = db.get(models.Job, job.id)
+    assert (restored.tier_required, restored.scenes_enabled) == ("Ultimate", True)
+    assert restored.status == "invalid"
+    assert "Requires the Ultimate tier (licensed: Basic)" in restored.invalid_reasons
+
+
+@pytest.mark.parametrize("path", ["/jobs/{id}/restore", "/jobs/restore"])
+def test_restore_once_relicensed_makes_jobs_valid(client, db, job, path):
+    license_tier(db, "Ultimate")
+    ultimate(db, job)
+    set_tier(db, "Basic")
+    downgrade_jobs(db, "License expired; downgraded to Basic")
+    set_tier(db, "Ultimate")
+
+    assert client.post(path.format(id=job.id)).status_code == 200
+    db.expire_all()
+    restored = db.get(models.Job, job.id)
+    assert (restored.tier_required, restored.status, restored.invalid_reasons) == ("Ultimate", "valid", None)
+
+
+def test_downgrade_and_restore_100k_jobs(db, job):
+    license_tier(db, "Ultimate")
+    now = datetime.utcnow()
+    row = {
+        "destination_id": job.destination_id,
+        "video_asset_id": job.video_asset_id,
+        "tier_required": "Ultimate",
+        "scenes_enabled": True,
+        "loop_enabled": True,
+        "crossfade_enabled": False,
+        "audio_mode": "none",
+        "auto_recovery": True,
+        "hot_swap_mode": "immediate",
+        "status": "valid",
+        "created_at": now,
+        "updated_at": now,
+    }
+    db.execute(insert(models.Job), [{**row, "name": f"job-{i}"} for i in range(JOBS)])
+    db.commit()
+    set_tier(db, "Basic")
+
+    started = time.perf_counter()
+    downgraded = downgrade_jobs(db, "License expired; downgraded to Basic")
+    downgrade_elapsed = time.perf_counter() - started
+    assert downgraded == JOBS
+    assert db.exec(select(func.count()).select_from(models.JobBackup)).one() == JOBS
+    assert db.exec(select(func.count()).select_from(models.Job).where(models.Job.tier_required != "Basic")).one() == 0
+
+    set_tier(db, "Ultimate")
+    started = time.perf_counter()
+    restored = restore_jobs(db, validate_job)
+    restore_elapsed = time.perf_counter() - started
+    assert restored == JOBS
+    counts = dict(db.exec(select(models.Job.status, func.count()).where(models.Job.tier_required == "Ultimate").group_by(models.Job.status)).all())
+    assert counts == {"valid": JOBS}
+
+    assert downgrade_elapsed < 30, f"downgrading {JOBS} jobs took {downgrade_elapsed:.1f}s"
+    assert restore_elapsed < 60, f"restoring {JOBS} jobs took {restore_elapsed:.1f}s"
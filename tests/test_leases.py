@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app import models
+from backend.app.database import async_engine
+from backend.app.pipeline import COPY, FULL_TRANSCODE
+from conftest import run
+from runner.events import EventWriter
+from runner.leases import Leases, settings
+from runner.main import idle_timeout, tick
+from runner.renditions import RenditionBuilder
+from runner.supervisor import Supervisor
+
+
+def queue_session(db, job) -> int:
+    session = models.Session(job_id=job.id, trigger="run_now", state="queued")
+    db.add(session)
+    db.commit()
+    return session.id
+
+
+async def claim(leases: Leases):
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        return [session.id for session in await leases.claim(db)]
+
+
+async def renew(leases: Leases):
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        return await leases.renew(db)
+
+
+async def current(session_id: int) -> models.Session:
+    # Polls through its own short transaction; an open read on SQLite would block the runners' writes.
+    async with AsyncSession(async_engine) as db:
+        return await db.get(models.Session, session_id)
+
+
+def row(db, session_id: int) -> models.Session:
+    db.expire_all()
+    return db.get(models.Session, session_id)
+
+
+def test_killed_runner_is_replaced_within_a_lease_and_fenced_out(db, job, ffmpeg, monkeypatch):
+    monkeypatch.setattr(settings, "runner_lease_seconds", 1)
+    session_id = queue_session(db, job)
+    first, second = Leases("runner-a"), Leases("runner-b")
+    owner = Supervisor(first, EventWriter())
+    survivor = Supervisor(second, EventWriter())
+
+    async def runner(leases: Leases, supervisor: Supervisor):
+        # The runner main loop, minus the change listener: renew on the side, tick on every idle poll.
+        keep_alive = asyncio.create_task(leases.keep_alive())
+        try:
+            while True:
+                await tick(leases, supervisor, RenditionBuilder(leases.runner_id))
+                await asyncio.sleep(idle_timeout())
+        finally:
+            keep_alive.cancel()
+            await supervisor.abandon(list(supervisor.tasks))
+
+    async def scenario():
+        owner_loop = asyncio.create_task(runner(first, owner))
+        while (await current(session_id)).state != "running":
+            await asyncio.sleep(0.05)
+        survivor_loop = asyncio.create_task(runner(second, survivor))
+        # Both runners keep ticking for several lease periods; the owner keeps the session throughout.
+        await asyncio.sleep(3 * settings.runner_lease_seconds)
+        assert (await current(session_id)).runner_id == "runner-a"
+        assert second.tokens == {}
+
+        # runner-a dies: its loop and lease renewal stop, and nothing touches the session row.
+        killed_at = time.perf_counter()
+        owner_loop.cancel()
+        await asyncio.gather(owner_loop, return_exceptions=True)
+        while session_id not in survivor.live:
+            assert time.perf_counter() - killed_at < 10, "session was never adopted"
+            await asyncio.sleep(0.02)
+        recovery = time.perf_counter() - killed_at
+
+        # runner-a comes back from a stall still believing it owns the session.
+        stale = Supervisor(first, EventWriter())
+        first.tokens[session_id] = 1
+        assert not await stale._update(session_id, state="failed", stop_reason="stale write")
+        survivor_loop.cancel()
+        await asyncio.gather(survivor_loop, return_exceptions=True)
+        return recovery
+
+    recovery = run(scenario())
+    # The lease lapses at most one lease after the last renewal and the next tick adopts it; the rest
+    # is headroom for starting FFmpeg.
+    bound = settings.runner_lease_seconds + idle_timeout() + 0.5
+    assert recovery < bound, f"takeover took {recovery:.2f}s (bound {bound:.2f}s)"
+    adopted = row(db, session_id)
+    assert adopted.runner_id == "runner-b"
+    assert adopted.fencing_token == 2
+    assert (adopted.state, adopted.stop_reason) == ("running", None)
+
+
+def test_renew_skips_sessions_reclaimed_under_a_newer_token(db, job, monkeypatch):
+    # Two processes with one RUNNER_ID, e.g. a restarted container while the old one still runs.
+    monkeypatch.setattr(settings, "runner_lease_seconds", 1)
+    session_id = queue_session(db, job)
+    old, new = Leases("runner-a"), Leases("runner-a")
+
+    async def scenario():
+        assert await claim(old) == [session_id]
+        await asyncio.sleep(1.1)
+        assert await claim(new) == [session_id]
+        deadline = row(db, session_id).lease_expires_at
+        assert await renew(old) == [session_id]
+        assert row(db, session_id).lease_expires_at == deadline
+        assert await renew(new) == []
+        assert row(db, session_id).lease_expires_at > deadline
+
+    run(scenario())
+    assert row(db, session_id).fencing_token == 2
+
+
+def test_copy_only_runner_leaves_transcode_sessions_unclaimed(db, job, monkeypatch):
+    job.pipeline = FULL_TRANSCODE
+    db.add(job)
+    db.commit()
+    session_id = queue_session(db, job)
+
+    monkeypatch.setattr(settings, "runner_capabilities", COPY)
+    assert run(claim(Leases("copy-runner"))) == []
+    assert row(db, session_id).runner_id is None
+    monkeypatch.setattr(settings, "runner_capabilities", f"{COPY},{FULL_TRANSCODE}")
+    assert run(claim(Leases("transcode-runner"))) == [session_id]
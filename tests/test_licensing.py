@@ -0,0 +1,150 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, func, or_
+from sqlmodel import select
+
+from backend.app import models
+from backend.app.database import engine
+from backend.app.licensing import TIERS, lease_cache, sweep_expired
+
+
+def issue(client, install_id: str, tier: str, expires_at=None):
+    params = {"install_id": install_id, "install_secret": "secret", "tier": tier}
+    if expires_at:
+        params["expires_at"] = expires_at.isoformat()
+    response = client.post("/license/issue", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def counted_by_scan(db):
+    now = datetime.utcnow()
+    rows = db.exec(
+        select(models.MemberLicense.tier, func.count())
+        .where(
+            models.MemberLicense.active == True,
+            or_(models.MemberLicense.expires_at == None, models.MemberLicense.expires_at > now),
+        )
+        .group_by(models.MemberLicense.tier)
+    ).all()
+    counts = dict.fromkeys(TIERS, 0)
+    counts.update(dict(rows))
+    return {"total": sum(counts.values()), **counts}
+
+
+def metrics(client):
+    response = client.get("/license/metrics")
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_counters_follow_issue_update_expiry_and_revocation(client, db):
+    soon = (datetime.utcnow() + timedelta(hours=1)).replace(microsecond=0)
+    for i in range(6):
+        issue(client, f"basic-{i}", "Basic")
+    for i in range(4):
+        issue(client, f"premium-{i}", "Premium", expires_at=soon if i < 2 else None)
+    for i in range(3):
+        issue(client, f"ultimate-{i}", "Ultimate")
+    assert metrics(client) == counted_by_scan(db) == {"total": 13, "Basic": 6, "Premium": 4, "Ultimate": 3}
+
+    # A tier change moves the member between counters; a revocation removes it.
+    issue(client, "basic-0", "Ultimate")
+    assert client.post("/license/revoke", params={"install_id": "ultimate-1"}).status_code == 200
+    assert client.post("/license/revoke", params={"install_id": "ultimate-1"}).status_code == 200
+    assert client.post("/license/revoke", params={"install_id": "missing"}).status_code == 404
+    assert metrics(client) == counted_by_scan(db) == {"total": 12, "Basic": 5, "Premium": 4, "Ultimate": 3}
+
+    # Expired members drop out of the metrics before the sweep, and the read leaves them for the sweep.
+    db.execute(
+        models.MemberLicense.__table__.update()
+        .where(models.MemberLicense.expires_at == soon)
+        .values(expires_at=datetime.utcnow() - timedelta(minutes=1))
+    )
+    db.commit()
+    assert metrics(client) == counted_by_scan(db) == {"total": 10, "Basic": 5, "Premium": 2, "Ultimate": 3}
+    db.expire_all()
+    assert len(db.exec(select(models.MemberLicense).where(models.MemberLicense.counted_tier == "Premium")).all()) == 4
+    assert sweep_expired(db) == 2
+    db.commit()
+    assert metrics(client) == counted_by_scan(db)
+    assert sweep_expired(db) == 0
+
+
+def test_first_member_of_a_tier_creates_its_counter(client, db):
+    assert db.exec(select(models.LicenseTierCount)).all() == []
+    issue(client, "first", "Premium")
+    issue(client, "second", "Premium")
+    db.expire_all()
+    assert [(row.tier, row.members) for row in db.exec(select(models.LicenseTierCount))] == [("Premium", 2)]
+
+
+@pytest.fixture
+def fresh_lease():
+    lease_cache.invalidate()
+    yield
+    lease_cache.invalidate()
+
+
+def activate(client, install_id: str):
+    response = client.post("/license/activate", params={"install_id": install_id, "install_secret": "secret"})
+    assert response.status_code == 200, response.text
+
+
+def premium_job_status(client, job) -> str:
+    payload = {"name": "premium", "destination_id": job.destination_id, "video_asset_id": job.video_asset_id, "tier_required": "Premium"}
+    response = client.post("/jobs/", json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()["status"]
+
+
+def cached_tier(db) -> str:
+    # Answered from the cache: a stale entry would be reported here rather than re-read.
+    statements = []
+    record = lambda *args: statements.append(args)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        return lease_cache.tier(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        assert statements == []
+
+
+def test_activation_replaces_the_cached_tier(client, db, job, fresh_lease):
+    assert premium_job_status(client, job) == "invalid"
+    assert cached_tier(db) == "Basic"
+    issue(client, "install", "Premium")
+    activate(client, "install")
+    assert cached_tier(db) == "Premium"
+    assert premium_job_status(client, job) == "valid"
+
+
+def test_member_expiry_lapses_the_cached_tier(client, db, job, fresh_lease):
+    issue(client, "install", "Premium", expires_at=datetime.utcnow() + timedelta(seconds=1))
+    activate(client, "install")
+    assert cached_tier(db) == "Premium"
+    time.sleep(1.1)
+    # Nobody has renewed yet: the cached copy already knows when the member expires.
+    assert cached_tier(db) == "Basic"
+    assert premium_job_status(client, job) == "invalid"
+    assert client.post("/license/renew").json()["activated_tier"] == "Basic"
+    assert cached_tier(db) == "Basic"
+
+
+def test_revoking_the_active_member_drops_the_cached_tier(client, db, job, fresh_lease):
+    issue(client, "install", "Premium")
+    issue(client, "other", "Ultimate")
+    activate(client, "install")
+    assert premium_job_status(client, job) == "valid"
+    # Revoking some other member leaves this install alone.
+    assert client.post("/license/revoke", params={"install_id": "other"}).status_code == 200
+    assert cached_tier(db) == "Premium"
+
+    assert client.post("/license/revoke", params={"install_id": "install"}).status_code == 200
+    assert cached_tier(db) == "Basic"
+    assert premium_job_status(client, job) == "invalid"
+    assert client.get("/license/state").json()["activated_tier"] == "Basic"
+    # Jobs above Basic were backed up and downgraded with the license.
+    assert db.exec(select(models.JobBackup)).first() is not None
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from backend.app.config import get_settings
+from backend.app.logstore import PACKED_SUFFIX, list_segments, read_range
+from conftest import run
+from runner.logs import SegmentLog, pump_log
+
+
+def feed(chunks):
+    stream = asyncio.StreamReader()
+    for chunk in chunks:
+        stream.feed_data(chunk)
+    stream.feed_eof()
+    return stream
+
+
+def test_writes_rotate_and_pack_segments_in_order(monkeypatch):
+    monkeypatch.setattr(get_settings(), "log_segment_bytes", 1000)
+    monkeypatch.setattr(get_settings(), "log_keep_segments", 100)
+    data = b"".join(f"frame={i} fps=30\n".encode() for i in range(2000))
+
+    async def scenario():
+        log = await SegmentLog.open(9001)
+        for i in range(0, len(data), 700):
+            await log.write(data[i : i + 700])
+        await log.close()
+        return log
+
+    log = run(scenario())
+    segments = list_segments(log.directory)
+    assert len(segments) > 10
+    assert all(path.name.endswith(PACKED_SUFFIX) for _, path in segments)
+    assert read_range(log.directory, 0, len(data))[2] == data
+
+
+def test_slow_disk_does_not_block_the_event_loop(monkeypatch):
+    append = SegmentLog._append
+
+    def slow_append(self, data):
+        time.sleep(0.05)
+        return append(self, data)
+
+    monkeypatch.setattr(SegmentLog, "_append", slow_append)
+
+    async def scenario():
+        log = await SegmentLog.open(9002)
+        pump = asyncio.create_task(pump_log(feed([b"x" * 100] * 10), log))
+        lag = 0.0
+        while not pump.done():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - started - 0.005)
+        await log.close()
+        return log, lag
+
+    log, lag = run(scenario())
+    assert log.size == 1000
+    assert lag < 0.04, f"event loop stalled for {lag:.3f}s"
+
+
+def test_close_waits_for_a_write_left_running_by_a_cancelled_pump(monkeypatch):
+    append = SegmentLog._append
+
+    def slow_append(self, data):
+        time.sleep(0.1)
+        return append(self, data)
+
+    monkeypatch.setattr(SegmentLog, "_append", slow_append)
+
+    async def scenario():
+        log = await SegmentLog.open(9003)
+        pump = asyncio.create_task(pump_log(feed([b"tail of the log"]), log))
+        await asyncio.sleep(0.02)
+        pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
+        await log.close()
+        return log
+
+    log = run(scenario())
+    assert read_range(log.directory, 0, 100)[2] == b"tail of the log"
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app import models
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from conftest import run
+from runner.main import materialize_due
+
+SCHEDULES = 1200
+
+
+def seed_due(db, job, count: int = SCHEDULES) -> None:
+    fire_at = datetime.utcnow() - timedelta(minutes=1)
+    db.add_all(models.Schedule(job_id=job.id, start_at=fire_at, next_fire_at=fire_at, duration_s=60) for _ in range(count))
+    db.commit()
+
+
+async def drain() -> None:
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        while await materialize_due(db):
+            # Yield between batches so the two runners interleave.
+            await asyncio.sleep(0)
+
+
+def test_tick_materializes_a_batch_in_one_transaction(db, job):
+    batch = get_settings().runner_materialize_batch
+    seed_due(db, job, batch)
+    commits = []
+    statements = []
+
+    def on_commit(conn):
+        commits.append(conn)
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "commit", on_commit)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+
+    async def tick():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            started = time.perf_counter()
+            count = await materialize_due(session)
+            return count, time.perf_counter() - started
+
+    try:
+        count, elapsed = run(tick())
+    finally:
+        event.remove(async_engine.sync_engine, "commit", on_commit)
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+
+    assert count == batch
+    assert len(commits) == 1
+    # The statement count is fixed per tick, not per schedule.
+    assert len(statements) <= 6, statements
+    assert elapsed < 2.0, f"tick took {elapsed:.2f}s for {batch} schedules"
+    assert db.exec(select(func.count()).select_from(models.Session)).one() == batch
+
+
+def test_two_runners_never_duplicate_sessions(db, job):
+    seed_due(db, job)
+
+    async def race():
+        await asyncio.gather(drain(), drain())
+
+    run(race())
+    schedule_ids = db.exec(select(models.Session.schedule_id)).all()
+    assert len(schedule_ids) == SCHEDULES
+    assert len(set(schedule_ids)) == SCHEDULES
+    now = datetime.utcnow()
+    # One-time schedules are retired once materialized.
+    assert db.exec(select(func.count()).select_from(models.Schedule).where(models.Schedule.next_fire_at <= now)).one() == 0
@@ -0,0 +1,127 @@
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app import models
+from backend.app.database import async_engine
+from conftest import run
+from runner.events import EventWriter
+from runner.leases import Leases
+from runner.metrics import MetricRing, ProgressParser, compact_metrics, epoch, settings
+from runner.supervisor import LiveStream, Supervisor
+
+
+@pytest.fixture
+def session_id(db, job):
+    session = models.Session(job_id=job.id, trigger="run_now", state="running")
+    db.add(session)
+    db.commit()
+    return session.id
+
+
+def seed_buckets(db, session_id: int, start: int, count: int) -> None:
+    # 10s buckets whose bitrate counts up and whose cumulative drop counter only ever grows.
+    db.add_all(
+        models.SessionMetric(
+            session_id=session_id,
+            bucket_ts=start + 10 * i,
+            resolution_s=10,
+            bitrate_kbps=float(i),
+            fps=30.0,
+            speed=1.0,
+            drop_frames=i // 10,
+            dup_frames=0,
+        )
+        for i in range(count)
+    )
+    db.commit()
+
+
+def stored(db, session_id: int):
+    db.expire_all()
+    rows = db.exec(select(models.SessionMetric).where(models.SessionMetric.session_id == session_id))
+    return sorted(((row.resolution_s, row.bucket_ts, row.bitrate_kbps, row.drop_frames) for row in rows))
+
+
+def compact():
+    async def go():
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            await compact_metrics(db)
+
+    run(go())
+
+
+def hour_start(days_ago: int) -> int:
+    ts = epoch(datetime.utcnow() - timedelta(days=days_ago))
+    return ts - ts % 3600
+
+
+def test_flush_writes_a_bucket_from_the_progress_ring(db, session_id):
+    leases = Leases("metrics-runner")
+    leases.tokens[session_id] = 0
+    supervisor = Supervisor(leases, EventWriter())
+    plan = SimpleNamespace(job=SimpleNamespace(loop_enabled=False))
+    live = supervisor.live[session_id] = LiveStream(plan, SimpleNamespace(size=0), 0)
+    live.flushed_at = time.time() - settings.metrics_bucket_seconds
+    parser = ProgressParser(live.ring)
+    for bitrate, drops in ((1000, 1), (3000, 4)):
+        for line in (f"bitrate={bitrate}kbits/s", "fps=30", "speed=1.01x", f"drop_frames={drops}", "progress=continue"):
+            parser.feed(line)
+
+    async def flush():
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            await supervisor.flush(db)
+
+    run(flush())
+    ((resolution, _, bitrate, drops),) = stored(db, session_id)
+    assert (resolution, bitrate, drops) == (settings.metrics_bucket_seconds, 2000.0, 4)
+
+
+def test_ring_keeps_only_its_last_samples():
+    ring = MetricRing(4)
+    for i in range(10):
+        ring.push(float(i), {"fps": float(i)})
+    assert ring.latest("fps") == 9.0
+    assert ring.summarize(0.0)["fps"] == (6 + 7 + 8 + 9) / 4
+
+
+def test_old_buckets_roll_up_to_five_minutes_then_hours(db, session_id):
+    # Two days old: rolled into 300s buckets. Eight days old: on through 300s into 3600s.
+    recent, old = hour_start(2), hour_start(8)
+    seed_buckets(db, session_id, recent, 60)
+    seed_buckets(db, session_id, old, 360)
+
+    compact()
+    rows = stored(db, session_id)
+    five_minutes = [row for row in rows if row[0] == 300]
+    hours = [row for row in rows if row[0] == 3600]
+    assert not [row for row in rows if row[0] == 10]
+    # Each 300s bucket averages its thirty 10s buckets and keeps the largest drop counter.
+    assert five_minutes == [(300, recent, 14.5, 2), (300, recent + 300, 44.5, 5)]
+    assert hours == [(3600, old, 179.5, 35)]
+
+
+def test_five_minute_flush_buckets_are_not_rolled_into_themselves(db, session_id, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_bucket_seconds", 300)
+    start = hour_start(2)
+    db.add_all(
+        models.SessionMetric(session_id=session_id, bucket_ts=start + 300 * i, resolution_s=300, bitrate_kbps=float(i))
+        for i in range(12)
+    )
+    db.commit()
+
+    compact()
+    assert [row[2] for row in stored(db, session_id)] == [float(i) for i in range(12)]
+
+
+def test_retention_drops_expired_rollups(db, session_id, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_retention_days", 30)
+    seed_buckets(db, session_id, hour_start(40), 360)
+    seed_buckets(db, session_id, hour_start(20), 360)
+
+    compact()
+    assert [row[:2] for row in stored(db, session_id)] == [(3600, hour_start(20))]
@@ -0,0 +1,92 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.app import models
+from backend.app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, encode_cursor
+
+ROWS = 2 * DEFAULT_PAGE_SIZE + 37
+
+
+def page_through(client, path: str, **params):
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+
+def test_history_pages_have_no_duplicates_or_gaps_across_timestamp_ties(client, db, job):
+    # Three timestamps for every backup: keyset order falls back to the id within each tie.
+    stamps = [datetime(2026, 1, 1) + timedelta(minutes=i) for i in range(3)]
+    db.add_all(
+        models.JobBackup(job_id=job.id, previous_tier="Premium", backup_json="{}", created_at=stamps[i % 3])
+        for i in range(ROWS)
+    )
+    db.commit()
+
+    pages = page_through(client, "/jobs/backups")
+    assert [len(page) for page in pages] == [DEFAULT_PAGE_SIZE, DEFAULT_PAGE_SIZE, ROWS - 2 * DEFAULT_PAGE_SIZE]
+    rows = [row for page in pages for row in page]
+    keys = [(row["created_at"], row["id"]) for row in rows]
+    assert len(set(keys)) == ROWS
+    assert keys == sorted(keys, reverse=True)
+
+    # A timestamp filter and a smaller page combine with the cursor the same way.
+    since = stamps[1].isoformat()
+    filtered = [row for page in page_through(client, "/jobs/backups", since=since, limit=7) for row in page]
+    assert sorted(row["id"] for row in filtered) == sorted(row["id"] for row in rows if row["created_at"] >= since)
+
+
+def test_session_filters_and_field_projection(client, db, job):
+    other = models.Job(name="other", destination_id=job.destination_id, video_asset_id=job.video_asset_id)
+    db.add(other)
+    db.commit()
+    db.add_all(
+        models.Session(job_id=job.id if i % 2 else other.id, state="running" if i % 5 else "stopped")
+        for i in range(ROWS)
+    )
+    db.commit()
+
+    pages = page_through(client, "/sessions/", job_id=job.id, state="running", fields="id,state")
+    rows = [row for page in pages for row in page]
+    expected = [i + 1 for i in range(ROWS) if i % 2 and i % 5]
+    assert sorted(row["id"] for row in rows) == expected
+    assert len({row["id"] for row in rows}) == len(rows)
+    assert all(set(row) == {"id", "state"} and row["state"] == "running" for row in rows)
+
+
+def test_configuration_lists_page_in_id_order_with_filters(client, db, job):
+    db.add_all(
+        models.Job(name=f"job-{i}", destination_id=job.destination_id, video_asset_id=job.video_asset_id, status="invalid" if i % 3 else "valid")
+        for i in range(ROWS)
+    )
+    db.add_all(models.Asset(type="audio" if i % 4 else "video", filename=f"{i}.mp4", path=f"/{i}.mp4", size_bytes=1) for i in range(ROWS))
+    db.commit()
+
+    jobs = [row for page in page_through(client, "/jobs/", filter_status="invalid", fields="id,name") for row in page]
+    assert [row["name"] for row in jobs] == [f"job-{i}" for i in range(ROWS) if i % 3]
+    assets = [row for page in page_through(client, "/assets/", type="audio") for row in page]
+    assert [row["filename"] for row in assets] == [f"{i}.mp4" for i in range(ROWS) if i % 4]
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"cursor": "not a cursor"},
+        {"cursor": base64.urlsafe_b64encode(b'{"id": 5}').decode()},
+        {"cursor": encode_cursor([1, 2])},
+        {"cursor": encode_cursor(["yesterday", 5])},
+        {"cursor": encode_cursor(["2026-01-01T00:00:00", "five"])},
+        {"limit": 0},
+        {"limit": MAX_PAGE_SIZE + 1},
+        {"fields": "id,secret"},
+    ],
+)
+def test_tampered_cursors_and_bad_parameters_are_rejected(client, params):
+    response = client.get("/jobs/backups", params=params)
+    assert response.status_code == 400, response.text
@@ -0,0 +1,131 @@
+import pytest
+
+from backend.app import models
+from backend.app.pipeline import (
+    AUDIO_TRANSCODE,
+    AUDIO_TRANSCODE_COST,
+    COPY,
+    COPY_COST,
+    FULL_TRANSCODE,
+    analyze_pipeline,
+    apply_pipeline,
+    output_size,
+    refresh_pipelines,
+    video_cost,
+)
+
+DESTINATION = models.Destination(name="d", rtmp_url="rtmp://example.invalid/live", stream_key_encrypted="k")
+# 60s of 1080p30 H.264/AAC at 4000 kbps.
+PROBED = dict(video_codec="h264", audio_codec="aac", width=1920, height=1080, fps=30.0, duration_s=60, size_bytes=30_000_000)
+
+
+def asset(**overrides):
+    return models.Asset(type="video", filename="a.mp4", path="/a.mp4", **{**PROBED, **overrides})
+
+
+def transcode(**settings):
+    return models.Preset(name="p", mode="transcode", **settings)
+
+
+def job(**overrides):
+    return models.Job(name="j", destination_id=1, video_asset_id=1, **overrides)
+
+
+@pytest.mark.parametrize(
+    "video, preset, pipeline, reason",
+    [
+        (asset(), None, COPY, "already match"),
+        (asset(), models.Preset(name="p", scale="1280:720", gop=60), COPY, "already match"),
+        (asset(), transcode(scale="1920:1080", fps=30, video_bitrate=5000), COPY, "already match"),
+        (asset(), transcode(scale="-2:1080"), COPY, "already match"),
+        (asset(video_codec=None, audio_codec=None, width=None, height=None, fps=None), None, COPY, "not probed"),
+        (asset(audio_codec="opus"), None, AUDIO_TRANSCODE, "audio codec opus"),
+        (asset(), transcode(audio_channels=1), AUDIO_TRANSCODE, "audio channels"),
+        (asset(video_codec="hevc"), None, FULL_TRANSCODE, "video codec hevc"),
+        (asset(), transcode(scale="1280:720"), FULL_TRANSCODE, "scales to 1280:720"),
+        (asset(), transcode(scale="1280:-2"), FULL_TRANSCODE, "scales to 1280:-2"),
+        (asset(), transcode(fps=60), FULL_TRANSCODE, "frame rate to 60"),
+        (asset(fps=None), transcode(fps=30), FULL_TRANSCODE, "frame rate to 30"),
+        (asset(), transcode(gop=60), FULL_TRANSCODE, "GOP"),
+        (asset(), transcode(profile="high"), FULL_TRANSCODE, "GOP/profile/tune"),
+        (asset(), transcode(video_bitrate=2500), FULL_TRANSCODE, "2500 kbps cap"),
+        (asset(duration_s=None), transcode(video_bitrate=8000), FULL_TRANSCODE, "8000 kbps cap"),
+        # Video is checked first: a full transcode re-encodes the audio as well.
+        (asset(video_codec="hevc", audio_codec="opus"), None, FULL_TRANSCODE, "video codec hevc"),
+    ],
+)
+def test_analyze_pipeline(video, preset, pipeline, reason):
+    decision = analyze_pipeline(job(), video, DESTINATION, preset)
+    assert decision.pipeline == pipeline
+    assert reason in decision.reason
+
+
+def test_replacement_audio_needs_an_audio_transcode():
+    music = models.Asset(type="audio", filename="m.mp3", path="/m.mp3", size_bytes=1, audio_codec="mp3")
+    assert analyze_pipeline(job(audio_mode="replace"), asset(), DESTINATION, None, music).pipeline == AUDIO_TRANSCODE
+    # The audio asset is ignored while audio replacement is off.
+    assert analyze_pipeline(job(), asset(), DESTINATION, None, music).pipeline == COPY
+
+
+@pytest.mark.parametrize(
+    "scale, width, height, expected",
+    [
+        (None, 1920, 1080, (1920, 1080)),
+        ("1280:720", 1920, 1080, (1280, 720)),
+        ("1280x720", 1920, 1080, (1280, 720)),
+        ("1280:-1", 1920, 1080, (1280, 720)),
+        ("-2:720", 1920, 1080, (1280, 720)),
+        ("-1:1080", 1080, 1920, (608, 1080)),
+        ("-1:-1", 1920, 1080, (1920, 1080)),
+        ("iw/2:ih/2", 1920, 1080, (1920, 1080)),
+        ("1280", 1920, 1080, (1920, 1080)),
+        ("1280:720", None, None, (1280, 720)),
+        (None, None, None, (1920, 1080)),
+    ],
+)
+def test_output_size(scale, width, height, expected):
+    preset = models.Preset(name="p", scale=scale) if scale else None
+    assert output_size(preset, asset(width=width, height=height)) == expected
+
+
+def test_cost_estimates():
+    assert video_cost(None, asset()) == 1.5
+    assert video_cost(transcode(scale="1280:720"), asset()) == 0.67
+    assert video_cost(transcode(fps=60, preset="medium"), asset()) == 7.5
+    assert analyze_pipeline(job(), asset(), DESTINATION).cpu_cost == COPY_COST
+    assert analyze_pipeline(job(), asset(audio_codec="opus"), DESTINATION).cpu_cost == AUDIO_TRANSCODE_COST
+    assert analyze_pipeline(job(), asset(video_codec="hevc"), DESTINATION).cpu_cost == 1.5 + AUDIO_TRANSCODE_COST
+
+
+def test_refresh_reanalyzes_jobs_after_probe_and_preset_changes(db, job):
+    other = models.Job(name="other", destination_id=job.destination_id, video_asset_id=job.video_asset_id)
+    db.add(other)
+    db.commit()
+    for row in (job, other):
+        apply_pipeline(row, db)
+    assert (job.pipeline, other.pipeline) == (COPY, COPY)
+    assert "not probed" in job.pipeline_reason
+
+    video = db.get(models.Asset, job.video_asset_id)
+    for name, value in {**PROBED, "video_codec": "hevc"}.items():
+        setattr(video, name, value)
+    db.add(video)
+    refresh_pipelines(db, asset_ids=[video.id])
+    db.commit()
+    assert (job.pipeline, other.pipeline) == (FULL_TRANSCODE, FULL_TRANSCODE)
+    assert job.cpu_cost_estimate == 1.5 + AUDIO_TRANSCODE_COST
+
+    video.video_codec = "h264"
+    preset = transcode(scale="1280:720")
+    db.add_all([video, preset])
+    db.commit()
+    job.preset_id = preset.id
+    db.add(job)
+    refresh_pipelines(db, preset_id=preset.id)
+    db.commit()
+    # Only jobs using the edited preset are re-analyzed.
+    assert (job.pipeline, job.pipeline_reason) == (FULL_TRANSCODE, "preset scales to 1280:720")
+    assert other.pipeline == FULL_TRANSCODE
+    refresh_pipelines(db, asset_ids=[video.id])
+    db.commit()
+    assert other.pipeline == COPY
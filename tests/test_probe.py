@@ -0,0 +1,78 @@
+import asyncio
+
+from backend.app import models
+from backend.app.notify import publish
+from backend.app.pipeline import AUDIO_TRANSCODE, FULL_TRANSCODE
+from conftest import run
+from runner.probe import PROBED_FIELDS, ProbeOutcome, ProbeWorker, settings
+
+
+def claim(db, asset_id: int, runner_id: str) -> None:
+    asset = db.get(models.Asset, asset_id)
+    asset.probe_status, asset.probe_runner_id = "probing", runner_id
+    db.add(asset)
+    db.commit()
+
+
+def probe_result(**values):
+    return {name: values.get(name) for name in PROBED_FIELDS}
+
+
+def test_stored_probe_results_refresh_job_pipelines(db, job):
+    worker = ProbeWorker("probe-runner")
+    claim(db, job.video_asset_id, worker.runner_id)
+    result = probe_result(duration_s=60, video_codec="hevc", audio_codec="aac", width=1920, height=1080, fps=30.0)
+
+    run(worker._store([ProbeOutcome(job.video_asset_id, result, size=1000)]))
+    db.expire_all()
+    asset = db.get(models.Asset, job.video_asset_id)
+    refreshed = db.get(models.Job, job.id)
+    assert (asset.probe_status, asset.video_codec) == ("done", "hevc")
+    assert refreshed.pipeline == FULL_TRANSCODE
+    assert "hevc" in refreshed.pipeline_reason
+
+
+def test_failed_probes_leave_pipelines_alone(db, job):
+    job.pipeline, job.pipeline_reason = AUDIO_TRANSCODE, "unchanged"
+    db.add(job)
+    db.commit()
+    worker = ProbeWorker("probe-runner")
+    claim(db, job.video_asset_id, worker.runner_id)
+
+    run(worker._store([ProbeOutcome(job.video_asset_id, error="unreadable")]))
+    db.expire_all()
+    assert db.get(models.Asset, job.video_asset_id).probe_status == "failed"
+    untouched = db.get(models.Job, job.id)
+    assert (untouched.pipeline, untouched.pipeline_reason) == (AUDIO_TRANSCODE, "unchanged")
+
+
+def test_feeder_sleeps_until_an_asset_notice(db, monkeypatch):
+    monkeypatch.setattr(settings, "runner_notify_poll_seconds", 0.05)
+    worker = ProbeWorker("probe-runner")
+    claims = []
+
+    async def claim_nothing():
+        claims.append(1)
+        return 0
+
+    worker._claim = claim_nothing
+
+    async def scenario():
+        worker.listener.start()
+        feeder = asyncio.create_task(worker._feed())
+        await asyncio.sleep(0.3)
+        first = len(claims)
+        # Other changes on the runner channel leave the feeder asleep.
+        publish(db, "job")
+        db.commit()
+        await asyncio.sleep(0.3)
+        unrelated = len(claims)
+        publish(db, "asset")
+        db.commit()
+        await asyncio.sleep(0.3)
+        feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+        await worker.listener.stop()
+        return first, unrelated, len(claims)
+
+    assert run(scenario()) == (1, 1, 2)
@@ -0,0 +1,97 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app import models
+from backend.app.database import async_engine, engine
+from backend.app.licensing import current_member
+from backend.app.notify import ChangeListener
+from backend.app.stream import SessionBroker, Subscriber
+from conftest import run
+from runner.leases import Leases
+from runner.main import materialize_due
+from runner.probe import ProbeWorker
+from runner.renditions import RenditionBuilder
+
+
+@pytest.fixture
+def statements():
+    # Plans are taken for the SQL the runner and routers actually emit, not for copies of it.
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            captured.append((statement, parameters))
+
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", record)
+    yield captured
+    for target in (engine, async_engine.sync_engine):
+        event.remove(target, "before_cursor_execute", record)
+
+
+def plan(statements, pattern: str) -> str:
+    matches = [(sql, params) for sql, params in statements if re.search(pattern, sql, re.S)]
+    assert matches, f"no statement matched {pattern!r}"
+    sql, params = matches[0]
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+def assert_searches(text: str, table: str, index: str) -> None:
+    assert f"SCAN {table}\n" not in f"{text}\n", text
+    assert re.search(rf"SEARCH {table} USING (COVERING )?INDEX {index}", text), text
+
+
+def seed(db):
+    db.add(models.Asset(type="video", filename="a.mp4", path="/a.mp4", size_bytes=1, probe_status="done"))
+    db.add(models.Destination(name="d", rtmp_url="rtmp://x", stream_key_encrypted="k"))
+    db.commit()
+    db.add(models.Job(name="j", destination_id=1, video_asset_id=1))
+    db.commit()
+    now = datetime.utcnow()
+    db.add(models.Schedule(job_id=1, start_at=now, next_fire_at=now - timedelta(minutes=1)))
+    db.commit()
+
+
+def test_runner_tick_queries_use_indexes(db, statements):
+    seed(db)
+
+    async def tick():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            await materialize_due(session)
+            await Leases("plan-runner").claim(session)
+            await RenditionBuilder("plan-runner").poll(session)
+
+    run(tick())
+    assert_searches(plan(statements, r"FROM schedule\s+WHERE schedule.enabled"), "schedule", "ix_schedule_due")
+    assert_searches(plan(statements, r"SELECT session.schedule_id"), "session", "ix_session_schedule_id_state")
+    assert_searches(plan(statements, r"SELECT session.id\s+FROM session JOIN job"), "session", r"ix_session_state_\w+")
+    assert_searches(plan(statements, r"SELECT rendition.id"), "rendition", "ix_rendition_status_created_at")
+
+
+def test_background_queries_use_indexes(db, statements):
+    seed(db)
+
+    async def poll():
+        await ProbeWorker("plan-runner")._claim()
+        try:
+            await asyncio.wait_for(ChangeListener(async_engine)._poll_notices(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+        await SessionBroker(async_engine).replay(Subscriber(None, 1), 0)
+
+    run(poll())
+    assert_searches(plan(statements, r"SELECT asset.id\s+FROM asset"), "asset", r"ix_asset_\w+")
+    assert_searches(plan(statements, r"FROM changenotice"), "changenotice", "ix_changenotice_channel_id")
+    assert_searches(plan(statements, r"FROM event JOIN session"), "event", "ix_event_session_id_ts")
+
+
+def test_member_lookup_uses_install_index(db, statements):
+    current_member(db, models.LicenseState(install_id="install", install_secret_hash="hash"))
+    assert_searches(plan(statements, r"FROM memberlicense"), "memberlicense", "ix_memberlicense_install_id")
@@ -0,0 +1,91 @@
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from types import SimpleNamespace
+
+import pytest
+
+from backend.app.recurrence import CronRule, next_fire_time, occurrences
+
+OCCURRENCES = 100_000
+
+
+def schedule(kind: str, rule=None, start_at=datetime(2026, 1, 1), end_at=None):
+    # The runner passes plain result rows, so any object with the schedule columns will do.
+    return SimpleNamespace(type=kind, recurrence=rule, start_at=start_at, end_at=end_at)
+
+
+def brute_force_cron(expr: str, after: datetime, limit: int):
+    # Reference cron semantics: day-of-month and weekday are OR'd only when both are restricted.
+    _, _, dom, _, dow = expr.split()
+    rule = CronRule(expr)
+    current = after.replace(second=0, microsecond=0)
+    found = []
+    while len(found) < limit:
+        current += timedelta(minutes=1)
+        if current.minute not in rule.minutes or current.hour not in rule.hours or current.month not in rule.months:
+            continue
+        day_ok = current.day in rule.days
+        weekday_ok = current.weekday() in rule.weekdays
+        if (day_ok or weekday_ok) if dom != "*" and dow != "*" else (day_ok and weekday_ok):
+            found.append(current)
+    return found
+
+
+@pytest.mark.parametrize(
+    "kind, rule, start_at, after, expected",
+    [
+        ("cron", "*/15 * * * *", datetime(2026, 1, 1), datetime(2026, 1, 1, 0, 7), datetime(2026, 1, 1, 0, 15)),
+        ("cron", "0 9 * * 1-5", datetime(2026, 1, 1), datetime(2026, 1, 2, 9), datetime(2026, 1, 5, 9)),
+        ("cron", "30 6 1 * 0", datetime(2026, 1, 1), datetime(2026, 1, 1, 7), datetime(2026, 1, 4, 6, 30)),
+        ("cron", "0 0 29 2 *", datetime(2026, 1, 1), datetime(2026, 3, 1), datetime(2028, 2, 29)),
+        ("rrule", "FREQ=DAILY;BYHOUR=9,21;BYMINUTE=0", datetime(2026, 1, 1, 12), None, datetime(2026, 1, 1, 21)),
+        ("rrule", "FREQ=WEEKLY;BYDAY=MO,FR", datetime(2026, 1, 1, 8), datetime(2026, 1, 2, 8), datetime(2026, 1, 5, 8)),
+        ("rrule", "FREQ=HOURLY;INTERVAL=6;BYMINUTE=30", datetime(2026, 1, 1), datetime(2026, 1, 1, 0, 30), datetime(2026, 1, 1, 6, 30)),
+        ("rrule", "FREQ=DAILY;COUNT=3", datetime(2026, 1, 1, 10), datetime(2026, 1, 3, 10), None),
+        ("rrule", "FREQ=DAILY;UNTIL=20260105T000000Z", datetime(2026, 1, 1, 10), datetime(2026, 1, 4, 10), None),
+        ("one_time", None, datetime(2026, 1, 1), None, datetime(2026, 1, 1)),
+        ("one_time", None, datetime(2026, 1, 1), datetime(2026, 1, 1), None),
+    ],
+)
+def test_next_fire_time_matches_known_occurrences(kind, rule, start_at, after, expected):
+    assert next_fire_time(schedule(kind, rule, start_at), after) == expected
+
+
+@pytest.mark.parametrize("expr", ["*/7 */5 * * *", "0 12 13 * 5", "15 3,15 * 1-2 6,0", "0,30 8-10 1-7 * *"])
+def test_cron_matches_minute_by_minute_scan(expr):
+    after = datetime(2026, 1, 1)
+    assert list(islice(occurrences(schedule("cron", expr), after), 30)) == brute_force_cron(expr, after, 30)
+
+
+def test_end_at_bounds_the_series():
+    daily = schedule("rrule", "FREQ=DAILY", datetime(2026, 1, 1, 9), end_at=datetime(2026, 1, 3, 12))
+    assert list(occurrences(daily)) == [datetime(2026, 1, d, 9) for d in (1, 2, 3)]
+
+
+@pytest.mark.parametrize("kind, rule", [("cron", "* * * * *"), ("rrule", "FREQ=HOURLY;BYMINUTE=0,30")])
+def test_expanding_100k_occurrences_is_bounded(kind, rule):
+    series = schedule(kind, rule)
+    started = time.perf_counter()
+    expanded = list(islice(occurrences(series), OCCURRENCES))
+    elapsed = time.perf_counter() - started
+    assert len(expanded) == OCCURRENCES
+    assert all(a < b for a, b in zip(expanded, expanded[1:]))
+    assert elapsed < 5.0, f"{OCCURRENCES} occurrences took {elapsed:.2f}s"
+
+
+def test_next_fire_time_for_100k_schedules_is_bounded():
+    # Years-old series and distinct rules: the cost is per schedule, not per elapsed occurrence.
+    now = datetime(2026, 10, 17, 12)
+    schedules = [
+        schedule("rrule", "FREQ=DAILY;BYHOUR=9", datetime(2020, 1, 1) + timedelta(minutes=i))
+        if i % 2
+        else schedule("cron", f"{i % 60} {i % 24} * * 1-5", datetime(2020, 1, 1))
+        for i in range(OCCURRENCES)
+    ]
+    started = time.perf_counter()
+    fires = [next_fire_time(s, now) for s in schedules]
+    elapsed = time.perf_counter() - started
+    assert all(fire is not None and now < fire <= now + timedelta(days=4) for fire in fires)
+    assert fires[1] == datetime(2026, 10, 18, 9, 1)
+    assert elapsed < 8.0, f"next_fire_time for {OCCURRENCES} schedules took {elapsed:.2f}s"
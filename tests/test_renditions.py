@@ -0,0 +1,111 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app import models
+from backend.app.config import get_settings
+from backend.app.database import async_engine
+from conftest import run
+from runner.renditions import RenditionBuilder, evict_renditions, part_path
+
+FAKE_FFMPEG = """#!/bin/sh
+for last; do :; done
+printf 'encoded' > "$last"
+"""
+
+
+@pytest.fixture
+def building(db, job, tmp_path, monkeypatch):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(0o755)
+    monkeypatch.setattr(get_settings(), "ffmpeg_path", str(ffmpeg))
+    preset = models.Preset(name="720p", mode="transcode", scale="1280:720")
+    db.add(preset)
+    db.commit()
+    rendition = models.Rendition(
+        cache_key="key",
+        asset_id=job.video_asset_id,
+        preset_id=preset.id,
+        path=str(tmp_path / "renditions" / "key.mp4"),
+        status="building",
+        runner_id="builder",
+    )
+    db.add(rendition)
+    db.commit()
+    return rendition
+
+
+def test_finished_build_enters_the_cache(db, building):
+    run(RenditionBuilder("builder")._build(building.id))
+    db.refresh(building)
+    assert (building.status, building.size_bytes) == ("ready", len(b"encoded"))
+    assert Path(building.path).read_bytes() == b"encoded"
+    assert not part_path(Path(building.path)).exists()
+
+
+def test_build_invalidated_midway_is_discarded(db, building, monkeypatch):
+    builder = RenditionBuilder("builder")
+    publish = builder._publish
+
+    async def invalidate_then_publish(rendition_id, output):
+        # An asset or preset edit lands after FFmpeg finished, before the result is published.
+        building.status = "stale"
+        db.add(building)
+        db.commit()
+        return await publish(rendition_id, output)
+
+    monkeypatch.setattr(builder, "_publish", invalidate_then_publish)
+    run(builder._build(building.id))
+    db.refresh(building)
+    assert building.status == "stale"
+    output = Path(building.path)
+    assert not output.exists()
+    assert not part_path(output).exists()
+
+
+def test_eviction_keeps_renditions_that_active_sessions_stream(db, job, tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "rendition_cache_bytes", 10)
+    presets = [models.Preset(name=f"p{i}", mode="transcode", scale=f"{640 * (i + 1)}:-2") for i in range(3)]
+    db.add_all(presets)
+    db.commit()
+    renditions, paths = [], [tmp_path / f"{i}.mp4" for i in range(3)]
+    for i, (preset, path) in enumerate(zip(presets, paths)):
+        path.write_bytes(b"x" * 6)
+        # p0 is the least recently used: it started streaming long ago and has been looping since.
+        renditions.append(
+            models.Rendition(
+                cache_key=f"k{i}",
+                asset_id=job.video_asset_id,
+                preset_id=preset.id,
+                path=str(path),
+                status="ready",
+                size_bytes=6,
+                last_used_at=datetime(2026, 1, 1 + i),
+            )
+        )
+    db.add_all(renditions)
+    job.preset_id = presets[0].id
+    db.add(job)
+    db.add(models.Session(job_id=job.id, trigger="run_now", state="running"))
+    db.commit()
+
+    async def evict():
+        async with AsyncSession(async_engine) as session:
+            await evict_renditions(session)
+
+    run(evict())
+    db.expire_all()
+    kept = [row.cache_key for row in db.exec(select(models.Rendition).order_by(models.Rendition.id))]
+    assert kept == ["k0", "k2"]
+    assert [path.exists() for path in paths] == [True, False, True]
+
+    # Once the stream stops the rendition is ordinary LRU again.
+    db.execute(models.Session.__table__.update().values(state="stopped"))
+    db.commit()
+    run(evict())
+    db.expire_all()
+    assert [row.cache_key for row in db.exec(select(models.Rendition))] == ["k2"]
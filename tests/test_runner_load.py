@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from sqlalchemy import event
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app import models
+from backend.app.database import async_engine
+from conftest import run
+from runner.events import EventWriter
+from runner.leases import Leases, settings
+from runner.main import tick
+from runner.renditions import RenditionBuilder
+from runner.supervisor import Supervisor
+
+SESSIONS = 300
+TICKS = 5
+
+
+def test_tick_latency_with_hundreds_of_live_sessions(db, job, ffmpeg, monkeypatch):
+    monkeypatch.setattr(settings, "runner_capacity", SESSIONS)
+    db.add_all(models.Session(job_id=job.id, trigger="run_now", state="queued") for _ in range(SESSIONS))
+    db.commit()
+    leases = Leases("load-runner")
+    supervisor = Supervisor(leases, EventWriter())
+    builder = RenditionBuilder(leases.runner_id)
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def timed(coro):
+        statements.clear()
+        started = time.perf_counter()
+        await coro
+        return time.perf_counter() - started, len(statements)
+
+    async def scenario():
+        await tick(leases, supervisor, builder)
+        while len(supervisor.live) < SESSIONS:
+            await asyncio.sleep(0.05)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+        try:
+            ticks = [await timed(tick(leases, supervisor, builder)) for _ in range(TICKS)]
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                renewal = await timed(leases.renew(session))
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+            await supervisor.abandon(list(supervisor.tasks))
+        return ticks, renewal
+
+    ticks, (renew_s, renew_statements) = run(scenario())
+    slowest = max(elapsed for elapsed, _ in ticks)
+    # Heartbeats, log sizes and lease renewal are batched: the statement count does not grow with sessions.
+    assert max(count for _, count in ticks) <= 6, ticks
+    assert renew_statements <= 3
+    assert slowest < 0.5, f"slowest tick took {slowest:.3f}s with {SESSIONS} live sessions"
+    assert renew_s < 0.5, f"lease renewal took {renew_s:.3f}s for {SESSIONS} sessions"
+    db.expire_all()
+    assert all(session.last_heartbeat_at for session in db.exec(select(models.Session)))
@@ -0,0 +1,139 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from backend.app import models
+from backend.app.routers import sessions
+from backend.app.routers.sessions import stream_sessions
+from backend.app.stream import EVENT_GRACE, SessionBroker, settings
+from conftest import run
+
+
+@pytest.fixture
+def session_id(db, job, monkeypatch):
+    monkeypatch.setattr(settings, "stream_poll_seconds", 0.05)
+    # The app-wide broker is bound to the first event loop it ran on; each test runs its own loop.
+    monkeypatch.setattr(sessions, "broker", SessionBroker())
+    session = models.Session(job_id=job.id, trigger="run_now", state="running", position_s=1.0)
+    db.add(session)
+    db.commit()
+    return session.id
+
+
+def add_events(db, session_id: int, *codes: str) -> None:
+    for code in codes:
+        db.add(models.Event(session_id=session_id, level="info", code=code, message=""))
+        db.commit()
+
+
+def update_session(db, session_id: int, **values) -> None:
+    db.execute(models.Session.__table__.update().where(models.Session.id == session_id).values(**values))
+    db.commit()
+
+
+def parse(chunk: str):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines() if not line.startswith(":"))
+    return fields.get("event"), json.loads(fields["data"]) if "data" in fields else None
+
+
+class Reader:
+    # Drains the response body on its own task: timing out a read must not cancel the stream.
+    def __init__(self, response):
+        self.body = response.body_iterator
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._pump())
+
+    async def _pump(self):
+        async for chunk in self.body:
+            kind, data = parse(chunk)
+            if kind is not None:
+                await self.messages.put((kind, data))
+
+    async def next(self, timeout: float = 2.0):
+        return await asyncio.wait_for(self.messages.get(), timeout)
+
+    async def nothing_for(self, seconds: float) -> bool:
+        await asyncio.sleep(seconds)
+        return self.messages.empty()
+
+    async def close(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        await self.body.aclose()
+
+
+def test_subscriber_gets_a_snapshot_then_state_and_position_changes(db, session_id):
+    async def scenario():
+        response = await stream_sessions(job_id=None, session_id=None, after=None, last_event_id=None, admin=None)
+        reader = Reader(response)
+        kind, snapshot = await reader.next()
+        assert (kind, [(row["id"], row["state"], row["position_s"]) for row in snapshot]) == (
+            "snapshot",
+            [(session_id, "running", 1.0)],
+        )
+        assert "lease_expires_at" not in snapshot[0]
+
+        # Lease renewals and heartbeats that leave the stream where it was are not pushed.
+        update_session(db, session_id, lease_expires_at=datetime.utcnow(), last_heartbeat_at=datetime.utcnow())
+        assert await reader.nothing_for(0.3)
+        update_session(db, session_id, position_s=3.5, last_heartbeat_at=datetime.utcnow())
+        assert await reader.next() == ("session", {"id": session_id, "job_id": 1, "position_s": 3.5})
+        add_events(db, session_id, "ffmpeg_restart")
+        kind, event = await reader.next()
+        assert (kind, event["code"]) == ("event", "ffmpeg_restart")
+        update_session(db, session_id, state="stopped", stop_reason="Completed")
+        kind, change = await reader.next()
+        assert (kind, change["state"], change["stop_reason"]) == ("session", "stopped", "Completed")
+        await reader.close()
+
+    run(scenario())
+
+
+def test_resume_replays_missed_events_once(db, session_id):
+    add_events(db, session_id, "e1", "e2", "e3")
+
+    async def scenario():
+        response = await stream_sessions(job_id=None, session_id=None, after=None, last_event_id=1, admin=None)
+        reader = Reader(response)
+        assert (await reader.next())[0] == "snapshot"
+        # e4 commits after the broker started but before the replay query: it is both replayed
+        # and published live, and the client must see it once.
+        add_events(db, session_id, "e4")
+        await asyncio.sleep(0.3)
+        codes = [(await reader.next())[1]["code"] for _ in range(3)]
+        add_events(db, session_id, "e5")
+        codes.append((await reader.next())[1]["code"])
+        assert await reader.nothing_for(0.3)
+        await reader.close()
+        return codes
+
+    assert run(scenario()) == ["e2", "e3", "e4", "e5"]
+
+
+def test_late_committed_events_are_published_and_abandoned_gaps_expire(db, session_id):
+    broker = SessionBroker()
+    published = []
+    broker.publish = lambda kind, message_id, data: published.append(message_id)
+
+    async def scenario():
+        await broker._poll()
+        base = broker.last_event_id
+        # Ids base+1 and base+2 are taken by a batch that has not committed yet.
+        db.add(models.Event(id=base + 3, session_id=session_id, level="info", code="early", message=""))
+        db.commit()
+        await broker._poll()
+        assert (broker.floor, sorted(broker.gaps)) == (base, [base + 1, base + 2])
+        db.add(models.Event(id=base + 1, session_id=session_id, level="info", code="late", message=""))
+        db.commit()
+        await broker._poll()
+        assert (broker.floor, sorted(broker.gaps)) == (base + 1, [base + 2])
+        # base+2 never commits: after the grace period it is given up on and stops being re-read.
+        broker.gaps = {event_id: at - EVENT_GRACE for event_id, at in broker.gaps.items()}
+        await broker._poll()
+        assert (broker.floor, broker.gaps, broker.sent) == (base + 3, {}, set())
+        return base
+
+    base = run(scenario())
+    assert published == [base + 3, base + 1]
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.app import models
+from backend.app.database import async_engine
+from conftest import run
+from runner.events import EventWriter
+from runner.leases import Leases
+from runner.supervisor import Supervisor, settings
+
+
+def starts(workdir) -> int:
+    path = workdir / "starts"
+    return len(path.read_text().splitlines()) if path.exists() else 0
+
+
+def queue_sessions(db, job, count: int = 1, planned_end_at=None):
+    sessions = [models.Session(job_id=job.id, trigger="run_now", state="queued", planned_end_at=planned_end_at) for _ in range(count)]
+    db.add_all(sessions)
+    db.commit()
+    return [session.id for session in sessions]
+
+
+def row(db, session_id: int) -> models.Session:
+    db.expire_all()
+    return db.get(models.Session, session_id)
+
+
+async def supervise_claimed(supervisor: Supervisor) -> None:
+    async with AsyncSession(async_engine, expire_on_commit=False) as db:
+        for session in await supervisor.leases.claim(db):
+            supervisor.start(session.id)
+    await asyncio.gather(*list(supervisor.tasks.values()))
+
+
+def test_session_moves_from_queued_to_stopped(db, job, ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "0.3")
+    job.loop_enabled = False
+    db.add(job)
+    db.commit()
+    (session_id,) = queue_sessions(db, job)
+    supervisor = Supervisor(Leases("runner-a"), EventWriter())
+    states = []
+    update = supervisor._update
+
+    async def record(sid, **values):
+        if "state" in values:
+            states.append(values["state"])
+        return await update(sid, **values)
+
+    monkeypatch.setattr(supervisor, "_update", record)
+    run(supervise_claimed(supervisor))
+    assert states == ["starting", "running", "stopped"]
+    stopped = row(db, session_id)
+    assert (stopped.state, stopped.stop_reason, stopped.ffmpeg_pid) == ("stopped", "Completed", None)
+    assert stopped.actual_start_at and stopped.actual_end_at and stopped.last_heartbeat_at
+    assert stopped.runner_id == "runner-a"
+
+
+def test_session_stops_at_planned_end(db, job, ffmpeg):
+    (session_id,) = queue_sessions(db, job, planned_end_at=datetime.utcnow() + timedelta(seconds=1))
+    supervisor = Supervisor(Leases("runner-a"), EventWriter())
+    started = time.perf_counter()
+    run(supervise_claimed(supervisor))
+    elapsed = time.perf_counter() - started
+    stopped = row(db, session_id)
+    assert (stopped.state, stopped.stop_reason) == ("stopped", "Planned end reached")
+    assert elapsed < settings.runner_stop_grace_seconds
+    assert not list(ffmpeg.glob("running.*"))
+
+
+def test_auto_recovery_restarts_after_a_failed_exit(db, job, ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "0.2")
+    monkeypatch.setenv("FAKE_FFMPEG_EXIT", "1")
+    job.auto_recovery = True
+    db.add(job)
+    db.commit()
+    (session_id,) = queue_sessions(db, job, planned_end_at=datetime.utcnow() + timedelta(seconds=1.5))
+    events = EventWriter()
+    run(supervise_claimed(Supervisor(Leases("runner-a"), events)))
+    assert starts(ffmpeg) >= 3
+    assert any(event["code"] == "ffmpeg_restart" for event in events.buffer)
+    assert row(db, session_id).stop_reason == "Planned end reached"
+
+
+def test_failed_exit_without_auto_recovery_fails_the_session(db, job, ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "0.1")
+    monkeypatch.setenv("FAKE_FFMPEG_EXIT", "3")
+    (session_id,) = queue_sessions(db, job)
+    run(supervise_claimed(Supervisor(Leases("runner-a"), EventWriter())))
+    assert starts(ffmpeg) == 1
+    failed = row(db, session_id)
+    assert (failed.state, failed.stop_reason) == ("failed", "FFmpeg exited with code 3")
+
+
+def test_concurrent_encodes_are_capped(db, job, ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "0.3")
+    job.loop_enabled = False
+    db.add(job)
+    db.commit()
+    session_ids = queue_sessions(db, job, 5)
+    monkeypatch.setattr(settings, "runner_capacity", 2)
+    supervisor = Supervisor(Leases("runner-a"), EventWriter())
+    # Claims can outnumber the encode slots, e.g. sessions adopted before a capacity change.
+    monkeypatch.setattr(settings, "runner_capacity", 5)
+    run(supervise_claimed(supervisor))
+    assert starts(ffmpeg) == 5
+    assert max(int(line) for line in (ffmpeg / "concurrency").read_text().split()) == 2
+    assert {row(db, sid).state for sid in session_ids} == {"stopped"}
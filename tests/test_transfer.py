@@ -0,0 +1,89 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlmodel import select
+
+from backend.app import models
+from backend.app.pipeline import COPY
+from backend.app.transfer import CONFIG_FIELDS
+
+
+def export(client):
+    response = client.get("/config/export")
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def import_lines(client, records):
+    body = "".join(json.dumps(record) + "\n" for record in records)
+    return client.post("/config/import", content=body, headers={"content-type": "application/x-ndjson"})
+
+
+def notices(db):
+    return {json.loads(notice.payload)["kind"] for notice in db.exec(select(models.ChangeNotice))}
+
+
+def test_export_carries_configuration_only(client, db, job):
+    asset = db.get(models.Asset, job.video_asset_id)
+    asset.probe_status, asset.probe_runner_id = "probing", "runner-a"
+    job.pipeline, job.cpu_cost_estimate = COPY, 0.05
+    now = datetime.utcnow()
+    db.add_all([asset, job, models.Schedule(job_id=job.id, start_at=now, next_fire_at=now, last_fired_at=now)])
+    db.commit()
+
+    records = export(client)
+    assert {record["section"] for record in records} == {"assets", "destinations", "jobs", "schedules"}
+    for record in records:
+        assert set(record["row"]) == set(CONFIG_FIELDS[record["section"]]), record
+
+
+def test_reimport_recomputes_runtime_state_and_notifies(client, db, job):
+    now = datetime.utcnow().replace(microsecond=0)
+    past, future = now - timedelta(days=1), now + timedelta(days=1)
+    fired = models.Schedule(job_id=job.id, start_at=past, end_at=past + timedelta(hours=1), last_fired_at=past)
+    upcoming = models.Schedule(job_id=job.id, start_at=future, end_at=future + timedelta(hours=1), next_fire_at=future)
+    daily = models.Schedule(job_id=job.id, type="rrule", recurrence="FREQ=DAILY", start_at=past, duration_s=60)
+    db.add_all([fired, upcoming, daily])
+    db.commit()
+    records = export(client)
+    assert notices(db) == set()
+
+    response = import_lines(client, records)
+    assert response.status_code == 200, response.text
+    assert response.json()["updated"]["schedules"] == 3
+    db.expire_all()
+    asset = db.get(models.Asset, job.video_asset_id)
+    assert (asset.probe_status, asset.probe_runner_id) == ("pending", None)
+    imported = db.get(models.Job, job.id)
+    assert (imported.status, imported.pipeline) == ("valid", COPY)
+    # The one-time schedule that already ran keeps its history and is not fired again.
+    assert db.get(models.Schedule, fired.id).next_fire_at is None
+    assert db.get(models.Schedule, upcoming.id).next_fire_at == future
+    assert db.get(models.Schedule, daily.id).next_fire_at == past + timedelta(days=2)
+    assert {"asset", "job", "schedule"} <= notices(db)
+
+
+def test_runtime_columns_in_older_exports_are_ignored(client, db, job):
+    start = datetime.utcnow() + timedelta(hours=2)
+    records = [
+        {"section": "jobs", "row": {**job.model_dump(mode="json"), "status": "valid", "pipeline": "full_transcode", "cpu_cost_estimate": 9.0}},
+        {
+            "section": "schedules",
+            "row": {
+                "id": 7,
+                "job_id": job.id,
+                "start_at": start.isoformat(),
+                "end_at": (start + timedelta(hours=1)).isoformat(),
+                "enabled": True,
+                "next_fire_at": "2000-01-01T00:00:00",
+                "last_fired_at": "2000-01-01T00:00:00",
+            },
+        },
+    ]
+
+    response = import_lines(client, records)
+    assert response.status_code == 200, response.text
+    schedule = db.exec(select(models.Schedule)).one()
+    assert (schedule.next_fire_at, schedule.last_fired_at) == (start, None)
+    db.expire_all()
+    assert db.get(models.Job, job.id).pipeline == COPY
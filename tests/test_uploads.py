@@ -0,0 +1,74 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from backend.app import models
+from backend.app.uploads import CLAIM_SECONDS, part_path
+
+PAYLOAD = bytes(range(256)) * 4096
+
+
+def open_upload(client, size=len(PAYLOAD)) -> str:
+    response = client.post("/assets/uploads", json={"type": "video", "filename": "clip.mp4", "size_bytes": size})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def mark(db, upload_id: str, **values) -> None:
+    db.execute(update(models.AssetUpload).where(models.AssetUpload.id == upload_id).values(**values))
+    db.commit()
+
+
+def test_resumed_upload_becomes_hashed_asset(client, db):
+    upload_id = open_upload(client)
+    half = len(PAYLOAD) // 2
+    first = client.put(f"/assets/uploads/{upload_id}", params={"offset": 0}, content=PAYLOAD[:half])
+    assert first.status_code == 200 and first.json()["received_bytes"] == half
+    assert first.json()["status"] == "uploading"
+    stale = client.put(f"/assets/uploads/{upload_id}", params={"offset": 0}, content=PAYLOAD[:half])
+    assert stale.status_code == 409 and f"offset {half}" in stale.json()["detail"]
+    done = client.put(f"/assets/uploads/{upload_id}", params={"offset": half}, content=PAYLOAD[half:])
+    assert done.status_code == 200, done.text
+    assert done.json()["status"] == "complete"
+    asset = db.get(models.Asset, done.json()["asset_id"])
+    assert asset.hash == hashlib.sha256(PAYLOAD).hexdigest()
+    with open(asset.path, "rb") as fh:
+        assert fh.read() == PAYLOAD
+
+
+def test_put_is_refused_while_another_request_holds_the_offset(client, db):
+    # What a PUT on another worker looks like mid-stream: the row is claimed and recently renewed.
+    upload_id = open_upload(client)
+    mark(db, upload_id, status="receiving", updated_at=datetime.utcnow())
+    response = client.put(f"/assets/uploads/{upload_id}", params={"offset": 0}, content=PAYLOAD[:1024])
+    assert response.status_code == 409
+    assert "Another request" in response.json()["detail"]
+    assert not part_path(upload_id).exists() or part_path(upload_id).stat().st_size == 0
+
+
+def test_lapsed_claim_is_taken_over(client, db):
+    upload_id = open_upload(client, size=1024)
+    mark(db, upload_id, status="receiving", updated_at=datetime.utcnow() - timedelta(seconds=CLAIM_SECONDS + 1))
+    response = client.put(f"/assets/uploads/{upload_id}", params={"offset": 0}, content=PAYLOAD[:1024])
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "complete"
+
+
+def test_writer_stops_once_its_claim_is_taken_over(client, db, monkeypatch):
+    monkeypatch.setattr("backend.app.routers.assets.CLAIM_SECONDS", 0)
+    upload_id = open_upload(client)
+    taken_over_at = datetime.utcnow() + timedelta(hours=1)
+
+    def body():
+        yield PAYLOAD[:4096]
+        # Another worker claims the upload between two chunks of this request.
+        mark(db, upload_id, updated_at=taken_over_at, received_bytes=0)
+        yield PAYLOAD[4096:8192]
+
+    response = client.put(f"/assets/uploads/{upload_id}", params={"offset": 0}, content=body())
+    assert response.status_code == 409
+    db.expire_all()
+    upload = db.get(models.AssetUpload, upload_id)
+    assert upload.updated_at == taken_over_at and upload.received_bytes == 0
+    assert upload.status == "receiving" and upload.asset_id is None